@@ -0,0 +1,124 @@
+# Análise clássica de itens por série e por sala
+# Formatador de Dados Escolares - dificuldade, discriminação e distribuição das alternativas
+
+from correcao import matriz_acertos, normalizar_gabarito
+from importacao_tardia import ModuloTardio
+from matriz_respostas import montar_matriz_respostas, nomes_colunas_questoes
+
+np = ModuloTardio('numpy')
+
+# Uma coluna por código da matriz de respostas (0 = em branco, 1-5 = A-E, 6 = asterisco)
+COLUNAS_ALTERNATIVAS = ['Pct_Branco', 'Pct_A', 'Pct_B', 'Pct_C', 'Pct_D', 'Pct_E', 'Pct_Asterisco']
+
+# Agrupamentos exportados: nome da aba -> colunas do agrupamento
+NIVEIS_ANALISE = {
+    'Itens_Serie': ['Serie'],
+    'Itens_Sala': ['Serie', 'Sala']
+}
+
+def _somar_por_grupo(grupos, total_grupos, valores):
+    """Soma uma matriz (alunos x questões) por grupo com um único bincount -> (grupos x questões)."""
+    questoes = valores.shape[1]
+    indice = (grupos[:, None] * questoes + np.arange(questoes)).ravel()
+    somas = np.bincount(indice, weights=valores.ravel(), minlength=total_grupos * questoes)
+    return somas.reshape(total_grupos, questoes)
+
+def _estatisticas_por_grupo(grupos, total_grupos, matriz, acertos=None, corrigidos=None):
+    """
+    Estatísticas de todas as questões de todos os grupos de uma vez.
+    Retorna (alunos, contagens, p_valor, ponto_bisserial):
+    - alunos: (grupos,) quantidade de cartões;
+    - contagens: (grupos x questões x alternativas) marcações de cada código da matriz;
+    - p_valor: (grupos x questões) proporção de acertos (dificuldade);
+    - ponto_bisserial: (grupos x questões) correlação entre o acerto na questão e o
+      escore no restante da prova (item-resto), para não inflar a discriminação.
+    p_valor e ponto_bisserial são None sem a matriz de acertos.
+    """
+    questoes = matriz.shape[1]
+    alternativas = len(COLUNAS_ALTERNATIVAS)
+    alunos = np.bincount(grupos, minlength=total_grupos)
+
+    indice = ((grupos[:, None] * questoes + np.arange(questoes)) * alternativas + matriz).ravel()
+    contagens = np.bincount(indice, minlength=total_grupos * questoes * alternativas)
+    contagens = contagens.reshape(total_grupos, questoes, alternativas)
+
+    if acertos is None:
+        return alunos, contagens, None, None
+
+    grupos = grupos[corrigidos]
+    x = acertos[corrigidos].astype(float)
+    y = x.sum(axis=1, keepdims=True) - x  # escore no restante da prova
+    n = np.bincount(grupos, minlength=total_grupos)[:, None].astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media_x = _somar_por_grupo(grupos, total_grupos, x) / n
+        media_y = _somar_por_grupo(grupos, total_grupos, y) / n
+        covariancia = _somar_por_grupo(grupos, total_grupos, x * y) / n - media_x * media_y
+        variancia_y = _somar_por_grupo(grupos, total_grupos, y * y) / n - media_y ** 2
+        ponto_bisserial = covariancia / np.sqrt(media_x * (1 - media_x) * variancia_y)
+
+    ponto_bisserial[~np.isfinite(ponto_bisserial)] = np.nan
+    return alunos, contagens, media_x, ponto_bisserial
+
+def analisar_itens(df_final, gabaritos=None, coluna='Gabarito_Completo'):
+    """
+    Estatísticas clássicas de cada questão por série (Itens_Serie) e por sala (Itens_Sala),
+    em formato longo (uma linha por grupo e questão):
+    - Alunos e percentual de cada alternativa, de questões em branco e de asteriscos;
+    - com gabaritos (ver correcao.normalizar_gabarito): Gabarito, P_Valor (proporção
+      de acertos) e Ponto_Bisserial (discriminação item-resto).
+    Retorna dict nome_aba -> DataFrame (vazio se não houver alunos).
+    """
+    if df_final.empty:
+        return {}
+
+    largura = max(int(df_final[coluna].str.len().max()), 0)
+    textos_gabarito = {}
+    if gabaritos:
+        textos_gabarito = {serie: normalizar_gabarito(gabarito)[0] for serie, gabarito in gabaritos.items()}
+        largura = max([largura] + [len(texto) for texto in textos_gabarito.values()])
+
+    matriz = montar_matriz_respostas(df_final[coluna], largura)
+    acertos = corrigidos = None
+    if gabaritos:
+        acertos, _, corrigidos = matriz_acertos(df_final, gabaritos, coluna, matriz=matriz)
+    questoes = nomes_colunas_questoes(largura)
+    letras_gabarito = {serie: np.array(list(texto[:largura]) + [''] * (largura - len(texto)), dtype=object)
+                       for serie, texto in textos_gabarito.items()}
+    sem_gabarito = np.full(largura, '', dtype=object)
+
+    tabelas = {}
+    for nome_aba, colunas in NIVEIS_ANALISE.items():
+        agrupado = df_final.groupby(colunas, observed=True, sort=True)
+        grupos = agrupado.ngroup().to_numpy()
+        rotulos = agrupado.size().index.to_frame(index=False)
+        total_grupos = len(rotulos)
+
+        validos = grupos >= 0
+        alunos, contagens, p_valor, ponto_bisserial = _estatisticas_por_grupo(
+            grupos[validos], total_grupos, matriz[validos],
+            None if acertos is None else acertos[validos],
+            None if corrigidos is None else corrigidos[validos]
+        )
+
+        tabela = rotulos.loc[np.repeat(np.arange(total_grupos), largura)].reset_index(drop=True)
+        tabela['Questao'] = np.tile(questoes, total_grupos)
+        tabela['Alunos'] = np.repeat(alunos, largura)
+        if gabaritos:
+            tabela['Gabarito'] = np.concatenate(
+                [letras_gabarito.get(serie, sem_gabarito) for serie in rotulos['Serie']] or [sem_gabarito[:0]]
+            )
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentuais = contagens / alunos[:, None, None] * 100
+        percentuais = np.round(percentuais.reshape(-1, len(COLUNAS_ALTERNATIVAS)), 1)
+        for i, nome_coluna in enumerate(COLUNAS_ALTERNATIVAS):
+            tabela[nome_coluna] = percentuais[:, i]
+
+        if gabaritos:
+            tabela['P_Valor'] = np.round(p_valor.ravel(), 3)
+            tabela['Ponto_Bisserial'] = np.round(ponto_bisserial.ravel(), 3)
+
+        tabelas[nome_aba] = tabela
+
+    return tabelas
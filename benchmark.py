@@ -0,0 +1,264 @@
+# Suíte de benchmark do pipeline do formatador
+# Formatador de Dados Escolares - mede tempo e memória por etapa e compara com um baseline salvo
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from correcao import corrigir_respostas
+from escrita_excel import escrever_planilhas
+from formatador import (processar_nomes_txt_v3, processar_respostas_txt_v4, concatenar_dados,
+                        unificar_dados, preparar_df_final, preparar_reconciliacao, expandir_questoes,
+                        montar_abas_resultado)
+from gerador_dados import gerar_dados
+
+BASELINE_PADRAO = 'benchmark_baseline.json'
+TOLERANCIA_PADRAO = 0.25  # 25% mais lento que o baseline = regressão
+
+# Orçamento de inicialização (ms além do próprio interpretador) e o código medido em cada caso
+ORCAMENTO_INICIALIZACAO_MS = {
+    'formatador --help': 150,
+    'deteccao de arquivos': 150,
+    'import dashboard': 800
+}
+COMANDOS_INICIALIZACAO = {
+    'formatador --help': "import runpy, sys; sys.argv = ['formatador.py', '--help']; "
+                         "runpy.run_path('formatador.py', run_name='__main__')",
+    'deteccao de arquivos': "import formatador; formatador.detectar_arquivos_automaticamente(verbose=False)",
+    'import dashboard': "import dashboard"
+}
+
+def _etapas(arquivos_nomes, arquivos_respostas, motor_excel, questoes):
+    """
+    Etapas do pipeline, na ordem. Cada etapa recebe o estado das anteriores
+    e devolve (estado, linhas processadas).
+    """
+    def parse_nomes(estado):
+        estado['nomes'] = [processar_nomes_txt_v3(arquivo) for arquivo in arquivos_nomes]
+        return sum(len(df) for df in estado['nomes'])
+
+    def parse_respostas(estado):
+        estado['respostas'] = [processar_respostas_txt_v4(arquivo) for arquivo in arquivos_respostas]
+        return sum(len(df) for df in estado['respostas'])
+
+    def merge(estado):
+        estado['df_nomes'] = concatenar_dados(estado['nomes'])
+        estado['df_respostas'] = concatenar_dados(estado['respostas'])
+        df_pareados, estado['sem_cartao'], estado['sem_aluno'] = unificar_dados(
+            estado['df_nomes'], estado['df_respostas']
+        )
+        estado['df_final'] = preparar_df_final(df_pareados)
+        return len(estado['df_final'])
+
+    def correcao(estado):
+        gabaritos = {serie: 'ABCDE' * (questoes // 5) + 'ABCDE'[:questoes % 5]
+                     for serie in estado['df_final']['Serie'].unique()}
+        estado['df_final'], _ = corrigir_respostas(estado['df_final'], gabaritos)
+        return len(estado['df_final'])
+
+    def exportacao_excel(estado):
+        df_final = expandir_questoes(estado['df_final'])
+        df_alunos_sem_cartao, df_cartoes_sem_aluno = preparar_reconciliacao(estado['sem_cartao'], estado['sem_aluno'])
+        abas = montar_abas_resultado(df_final, df_alunos_sem_cartao, df_cartoes_sem_aluno,
+                                     len(estado['df_nomes']), len(estado['df_respostas']))
+        escrever_planilhas(io.BytesIO(), abas, motor=motor_excel)
+        return len(df_final)
+
+    return [('parse_nomes', parse_nomes), ('parse_respostas', parse_respostas),
+            ('merge', merge), ('correcao', correcao), ('exportacao_excel', exportacao_excel)]
+
+def _importar_dependencias(motor_excel):
+    """
+    Importa antes da medição as dependências carregadas sob demanda (ver importacao_tardia);
+    senão a primeira etapa medida pagaria a importação do pandas e do numpy.
+    """
+    modulos = ['numpy', 'pandas', 'openpyxl'] + (['xlsxwriter'] if motor_excel == 'streaming' else [])
+    for modulo in modulos:
+        try:
+            importlib.import_module(modulo)
+        except ImportError:  # xlsxwriter é opcional (o streaming usa o openpyxl sem ele)
+            pass
+
+def _executar(etapas, medir_memoria):
+    """Roda todas as etapas uma vez; devolve {etapa: (segundos, pico_bytes, linhas)}."""
+    estado = {}
+    medidas = {}
+    for nome, etapa in etapas:
+        if medir_memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        # A saída no console não faz parte do que está sendo medido
+        with contextlib.redirect_stdout(io.StringIO()):
+            linhas = etapa(estado)
+        segundos = time.perf_counter() - inicio
+        pico = None
+        if medir_memoria:
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        medidas[nome] = (segundos, pico, linhas)
+    return medidas
+
+def executar_benchmark(alunos_por_sala=35, salas_por_serie=40, questoes=45, repeticoes=3,
+                       motor_excel='openpyxl', semente=42):
+    """
+    Gera dados sintéticos e mede cada etapa do pipeline.
+    O tempo é o melhor de `repeticoes` execuções; o pico de memória vem de uma
+    execução separada com tracemalloc (que deixaria os tempos mais lentos).
+    As dependências pesadas são importadas antes, fora da medição.
+    """
+    _importar_dependencias(motor_excel)
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivos_nomes, arquivos_respostas = gerar_dados(
+            pasta, alunos_por_sala, salas_por_serie, questoes=questoes, semente=semente
+        )
+        bytes_entrada = sum(os.path.getsize(a) for a in arquivos_nomes + arquivos_respostas)
+        etapas = _etapas(arquivos_nomes, arquivos_respostas, motor_excel, questoes)
+
+        tempos = [_executar(etapas, medir_memoria=False) for _ in range(repeticoes)]
+        memoria = _executar(etapas, medir_memoria=True)
+
+    resultados = {}
+    for nome, _ in etapas:
+        resultados[nome] = {
+            'segundos': round(min(execucao[nome][0] for execucao in tempos), 4),
+            'pico_memoria_mb': round(memoria[nome][1] / (1024 * 1024), 2),
+            'linhas': memoria[nome][2]
+        }
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'parametros': {
+            'alunos_por_sala': alunos_por_sala,
+            'salas_por_serie': salas_por_serie,
+            'questoes': questoes,
+            'repeticoes': repeticoes,
+            'motor_excel': motor_excel,
+            'bytes_entrada': bytes_entrada
+        },
+        'etapas': resultados
+    }
+
+def _tempo_processo(codigo):
+    """Tempo de parede (s) de um interpretador novo executando codigo na pasta do projeto."""
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, '-c', codigo], cwd=os.path.dirname(os.path.abspath(__file__)),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - inicio
+
+def medir_inicializacao(repeticoes=5):
+    """
+    Mede a inicialização de cada comando em processos novos (melhor de `repeticoes`),
+    descontando o tempo do interpretador vazio. Retorna {comando: milissegundos}.
+    """
+    vazio = min(_tempo_processo('pass') for _ in range(repeticoes))
+    return {
+        comando: round((min(_tempo_processo(codigo) for _ in range(repeticoes)) - vazio) * 1000, 1)
+        for comando, codigo in COMANDOS_INICIALIZACAO.items()
+    }
+
+def verificar_orcamento(tempos_ms, orcamento=ORCAMENTO_INICIALIZACAO_MS):
+    """Comandos acima do orçamento: lista de (comando, limite_ms, medido_ms)."""
+    return [(comando, orcamento[comando], medido) for comando, medido in tempos_ms.items()
+            if comando in orcamento and medido > orcamento[comando]]
+
+def comparar_com_baseline(resultado, baseline, tolerancia=TOLERANCIA_PADRAO):
+    """
+    Compara os tempos com o baseline. Retorna a lista de regressões
+    (etapa, segundos_baseline, segundos_atual) acima da tolerância.
+    Levanta ValueError se o baseline foi medido com outro motor do Excel.
+    """
+    motor_baseline = baseline.get('parametros', {}).get('motor_excel', 'openpyxl')
+    motor_atual = resultado['parametros']['motor_excel']
+    if motor_baseline != motor_atual:
+        raise ValueError(f"O baseline foi medido com --motor-excel {motor_baseline} e esta execução com "
+                         f"{motor_atual}; gere um baseline com o mesmo motor (--salvar-baseline)")
+    regressoes = []
+    for etapa, medida in resultado['etapas'].items():
+        referencia = baseline.get('etapas', {}).get(etapa)
+        if referencia and medida['segundos'] > referencia['segundos'] * (1 + tolerancia):
+            regressoes.append((etapa, referencia['segundos'], medida['segundos']))
+    return regressoes
+
+def imprimir_resultado(resultado, baseline=None):
+    """Tabela com tempo, memória e variação em relação ao baseline."""
+    print(f"\n📏 BENCHMARK ({resultado['parametros']['bytes_entrada'] / (1024 * 1024):.1f} MB de entrada)")
+    for etapa, medida in resultado['etapas'].items():
+        linha = (f"   {etapa:<18} {medida['segundos']:>9.4f}s  {medida['pico_memoria_mb']:>9.2f} MB"
+                 f"  {medida['linhas']:>8} linhas")
+        referencia = (baseline or {}).get('etapas', {}).get(etapa)
+        if referencia and referencia['segundos']:
+            variacao = (medida['segundos'] / referencia['segundos'] - 1) * 100
+            linha += f"  ({variacao:+.1f}% vs baseline)"
+        print(linha)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline do formatador")
+    parser.add_argument('--alunos-por-sala', type=int, default=35)
+    parser.add_argument('--salas-por-serie', type=int, default=40)
+    parser.add_argument('--questoes', type=int, default=45)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--motor-excel', choices=['openpyxl', 'streaming'], default='openpyxl')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO, help="arquivo JSON do baseline")
+    parser.add_argument('--salvar-baseline', action='store_true', help="grava este resultado como novo baseline")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help="aumento relativo de tempo tolerado antes de acusar regressão")
+    parser.add_argument('--inicializacao', action='store_true',
+                        help="mede só o tempo de inicialização dos comandos e compara com o orçamento")
+    args = parser.parse_args()
+
+    if args.inicializacao:
+        tempos_ms = medir_inicializacao(args.repeticoes)
+        print("\n🚦 INICIALIZAÇÃO (ms além do interpretador)")
+        for comando, medido in tempos_ms.items():
+            print(f"   {comando:<22} {medido:>8.1f} ms  (orçamento: {ORCAMENTO_INICIALIZACAO_MS[comando]} ms)")
+        estouros = verificar_orcamento(tempos_ms)
+        if estouros:
+            print("\n❌ ACIMA DO ORÇAMENTO:")
+            for comando, limite, medido in estouros:
+                print(f"   - {comando}: {medido:.1f} ms > {limite} ms")
+            sys.exit(1)
+        print("\n✅ Inicialização dentro do orçamento")
+        sys.exit(0)
+
+    resultado = executar_benchmark(args.alunos_por_sala, args.salas_por_serie, args.questoes,
+                                   args.repeticoes, args.motor_excel)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('parametros', {}).get('alunos_por_sala') != args.alunos_por_sala or \
+                baseline.get('parametros', {}).get('salas_por_serie') != args.salas_por_serie:
+            print("⚠️ O baseline foi gerado com outra escala; a comparação pode não ser válida")
+
+    imprimir_resultado(resultado, baseline)
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Baseline salvo em '{args.baseline}'")
+    elif baseline:
+        try:
+            regressoes = comparar_com_baseline(resultado, baseline, args.tolerancia)
+        except ValueError as e:
+            print(f"\n❌ {e}")
+            sys.exit(2)
+        if regressoes:
+            print("\n❌ REGRESSÕES DE DESEMPENHO:")
+            for etapa, antes, depois in regressoes:
+                print(f"   - {etapa}: {antes:.4f}s -> {depois:.4f}s")
+            sys.exit(1)
+        print("\n✅ Sem regressões em relação ao baseline")
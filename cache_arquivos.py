@@ -0,0 +1,124 @@
+# Cache em disco dos arquivos de nomes e respostas já processados
+# Formatador de Dados Escolares - reaproveita o resultado dos parsers entre execuções
+
+import hashlib
+import os
+import time
+
+from importacao_tardia import ModuloTardio
+from instrumentacao import mensagem
+
+pd = ModuloTardio('pandas')
+
+PASTA_CACHE_PADRAO = '.cache_formatador'
+TAMANHO_MAXIMO_PADRAO = 512 * 1024 * 1024  # 512 MB
+IDADE_MAXIMA_PADRAO = 30 * 24 * 60 * 60  # 30 dias
+
+def _formato_cache():
+    """
+    Parquet quando o pyarrow está instalado; caso contrário, pickle do pandas.
+    """
+    try:
+        import pyarrow  # noqa: F401
+        return 'parquet'
+    except ImportError:
+        return 'pkl'
+
+def hash_conteudo(file_path, tamanho_bloco=1024 * 1024):
+    """Calcula o SHA-256 do conteúdo do arquivo, lendo em blocos."""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def chave_cache(funcao, file_path, versao):
+    """
+    Chave do cache: conteúdo do arquivo + nome do arquivo (a série vem do nome)
+    + parser + versão do parser.
+    """
+    sha = hashlib.sha256()
+    sha.update(hash_conteudo(file_path).encode())
+    sha.update(str(file_path).encode('utf-8'))
+    sha.update(f"{funcao.__module__}.{funcao.__qualname__}:{versao}".encode())
+    return sha.hexdigest()
+
+def carregar_ou_processar(funcao, file_path, versao, pasta_cache=PASTA_CACHE_PADRAO):
+    """
+    Retorna o DataFrame do cache se o arquivo não mudou; senão executa o parser
+    e grava o resultado. Resultados vazios (erro de leitura) não são guardados.
+    """
+    formato = _formato_cache()
+    caminho = os.path.join(pasta_cache, f"{chave_cache(funcao, file_path, versao)}.{formato}")
+
+    if os.path.exists(caminho):
+        try:
+            df = pd.read_parquet(caminho) if formato == 'parquet' else pd.read_pickle(caminho)
+            os.utime(caminho)  # marca como usado recentemente (LRU)
+            mensagem(f"⚡ Cache: {file_path} ({len(df)} registros)")
+            return df
+        except Exception as e:
+            mensagem(f"⚠️ Cache inválido para {file_path}, reprocessando: {e}")
+
+    df = funcao(file_path)
+    if df.empty:
+        return df
+
+    os.makedirs(pasta_cache, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        if formato == 'parquet':
+            df.to_parquet(temporario, index=False)
+        else:
+            df.to_pickle(temporario)
+        os.replace(temporario, caminho)  # escrita atômica (workers em paralelo)
+    except Exception as e:
+        mensagem(f"⚠️ Não foi possível gravar o cache de {file_path}: {e}")
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return df
+
+def _remover(caminho):
+    """Remove uma entrada; outro processo (ex.: execução em lote) pode tê-la removido antes."""
+    try:
+        os.remove(caminho)
+        return True
+    except FileNotFoundError:
+        return False
+
+def limpar_cache(pasta_cache=PASTA_CACHE_PADRAO, tamanho_maximo=TAMANHO_MAXIMO_PADRAO,
+                 idade_maxima=IDADE_MAXIMA_PADRAO):
+    """
+    Remove entradas não usadas há mais de idade_maxima segundos e, se o cache
+    ainda passar de tamanho_maximo bytes, as menos usadas recentemente (LRU).
+    Retorna a quantidade de arquivos removidos.
+    """
+    if not os.path.isdir(pasta_cache):
+        return 0
+
+    agora = time.time()
+    entradas = []
+    removidos = 0
+    with os.scandir(pasta_cache) as it:
+        for entrada in it:
+            if not entrada.is_file():
+                continue
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            if agora - info.st_mtime > idade_maxima:
+                if _remover(entrada.path):
+                    removidos += 1
+            else:
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        total -= tamanho
+        if _remover(caminho):
+            removidos += 1
+
+    return removidos
@@ -0,0 +1,132 @@
+# Correção automática pelo gabarito de cada série
+# Formatador de Dados Escolares - acertos, nota e percentual por aluno em uma única comparação de matrizes
+
+import json
+
+from importacao_tardia import ModuloTardio
+from matriz_respostas import montar_matriz_respostas
+
+np = ModuloTardio('numpy')
+pd = ModuloTardio('pandas')
+
+# No gabarito, '*' marca uma questão anulada (conta como acerto para todos)
+MARCADOR_ANULADA = '*'
+
+def normalizar_gabarito(gabarito):
+    """
+    Aceita o gabarito como texto ('ABCDE...') ou como dict com as chaves
+    'gabarito', 'pesos' (um por questão) e 'anuladas' (números das questões, a partir de 1).
+    Retorna (alternativas, pesos, anuladas) com pesos em float e anuladas em bool.
+    """
+    if isinstance(gabarito, str):
+        gabarito = {'gabarito': gabarito}
+    if not isinstance(gabarito, dict):
+        raise ValueError(f"Gabarito em formato inválido: {gabarito!r} (use um texto ou um objeto com 'gabarito')")
+
+    alternativas = str(gabarito.get('gabarito', '')).strip().upper().replace(' ', '')
+    invalidas = sorted(set(alternativas) - set('ABCDE' + MARCADOR_ANULADA))
+    if invalidas:
+        raise ValueError(f"Gabarito com alternativas inválidas: {', '.join(invalidas)} (use A-E ou '*')")
+
+    quantidade = len(alternativas)
+    pesos = gabarito.get('pesos')
+    if pesos is None:
+        pesos = np.ones(quantidade)
+    else:
+        pesos = np.asarray(pesos, dtype=float)
+        if len(pesos) != quantidade:
+            raise ValueError(f"O gabarito tem {quantidade} questões mas foram informados {len(pesos)} pesos")
+
+    anuladas = np.array([alternativa == MARCADOR_ANULADA for alternativa in alternativas], dtype=bool)
+    for numero in gabarito.get('anuladas', []):
+        if not str(numero).strip().isdecimal():
+            raise ValueError(f"Questão anulada inválida: {numero!r} (use o número da questão)")
+        if not 1 <= int(numero) <= quantidade:
+            raise ValueError(f"Questão anulada fora do gabarito: {numero}")
+        anuladas[int(numero) - 1] = True
+
+    return alternativas, pesos, anuladas
+
+def carregar_gabaritos(caminho):
+    """
+    Lê os gabaritos de um JSON no formato {serie: gabarito}, em que o gabarito
+    segue o formato aceito por normalizar_gabarito. Ex.:
+    {"9º Ano": "ABCDE...", "1ª Série": {"gabarito": "BCDA...", "pesos": [...], "anuladas": [7]}}
+    """
+    with open(caminho, encoding='utf-8') as f:
+        gabaritos = json.load(f)
+    if not isinstance(gabaritos, dict):
+        raise ValueError("O arquivo de gabaritos deve conter um objeto {série: gabarito}")
+    return gabaritos
+
+def nomes_colunas_correcao(largura):
+    """Nomes das colunas de acerto por questão: C001, C002, ..."""
+    return [f'C{i:03d}' for i in range(1, largura + 1)]
+
+def matriz_acertos(df_final, gabaritos, coluna='Gabarito_Completo', largura=None, matriz=None):
+    """
+    Corrige todos os cartões de uma vez contra o gabarito da série de cada aluno.
+    Monta a matriz de respostas (cartões x questões) e uma matriz de gabaritos
+    (séries x questões); a linha de gabarito de cada cartão é escolhida por
+    indexação e a correção inteira é uma comparação elemento a elemento.
+
+    matriz: matriz de respostas de df_final[coluna] já montada por quem chama (a
+    largura passa a ser a dela), para não montá-la de novo.
+
+    Retorna (acertos, pesos, corrigidos): matriz bool de acertos, matriz de pesos
+    de cada cartão (0 fora do gabarito) e máscara dos alunos cuja série tem gabarito.
+    """
+    normalizados = {serie: normalizar_gabarito(gabarito) for serie, gabarito in gabaritos.items()}
+    series = list(normalizados)
+    if matriz is not None:
+        largura = matriz.shape[1]
+    elif largura is None:
+        largura = max([len(alternativas) for alternativas, _, _ in normalizados.values()], default=0)
+
+    # Linha 0 = série sem gabarito (nenhuma questão vale ponto)
+    chaves = np.zeros((len(series) + 1, largura), dtype=np.uint8)
+    pesos = np.zeros((len(series) + 1, largura))
+    anuladas = np.zeros((len(series) + 1, largura), dtype=bool)
+    for i, (alternativas, pesos_serie, anuladas_serie) in enumerate(normalizados.values(), start=1):
+        quantidade = min(len(alternativas), largura)
+        codigos_gabarito = montar_matriz_respostas([alternativas])[0]
+        chaves[i, :quantidade] = codigos_gabarito[:quantidade]
+        pesos[i, :quantidade] = pesos_serie[:quantidade]
+        anuladas[i, :quantidade] = anuladas_serie[:quantidade]
+
+    codigos = pd.Categorical(np.asarray(df_final['Serie'], dtype=object), categories=series).codes + 1
+    if matriz is None:
+        matriz = montar_matriz_respostas(df_final[coluna], largura)
+
+    # Comparação vetorizada: resposta igual ao gabarito (em branco nunca acerta) ou questão anulada
+    chaves_alunos = chaves[codigos]
+    acertos = ((matriz == chaves_alunos) & (chaves_alunos != 0)) | anuladas[codigos]
+
+    return acertos, pesos[codigos], codigos > 0
+
+def corrigir_respostas(df_final, gabaritos, coluna='Gabarito_Completo'):
+    """
+    Acertos, nota (soma dos pesos das questões certas) e percentual de cada aluno.
+
+    Retorna (df_final, df_correcao):
+    - df_final com as colunas Acertos, Nota e Percentual (vazias para séries sem gabarito);
+    - df_correcao com ID, Nome, Sala, Serie e C001, C002, ... (1 = acerto, 0 = erro/branco),
+      apenas para os alunos corrigidos.
+    """
+    acertos, pesos, corrigidos = matriz_acertos(df_final, gabaritos, coluna)
+
+    nota = np.einsum('ij,ij->i', acertos, pesos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentual = np.round(nota / pesos.sum(axis=1) * 100, 1)
+
+    df_final = df_final.copy()
+    df_final['Acertos'] = pd.Series(acertos.sum(axis=1), index=df_final.index, dtype='Int64').where(corrigidos)
+    df_final['Nota'] = np.where(corrigidos, np.round(nota, 2), np.nan)
+    df_final['Percentual'] = np.where(corrigidos, percentual, np.nan)
+
+    df_correcao = df_final.loc[corrigidos, ['ID', 'Nome', 'Sala', 'Serie']].copy()
+    df_questoes = pd.DataFrame(acertos[corrigidos].astype(np.uint8), columns=nomes_colunas_correcao(acertos.shape[1]),
+                               index=df_correcao.index)
+    df_correcao = pd.concat([df_correcao, df_questoes], axis=1)
+
+    return df_final, df_correcao
@@ -0,0 +1,118 @@
+# Cubo de respostas pré-calculado para o painel interativo do dashboard
+# Formatador de Dados Escolares - marcações por série x sala x questão x alternativa, montadas uma vez
+
+from analise_itens import COLUNAS_ALTERNATIVAS
+from importacao_tardia import ModuloTardio
+from matriz_respostas import montar_matriz_respostas, nomes_colunas_questoes
+
+np = ModuloTardio('numpy')
+pd = ModuloTardio('pandas')
+
+# Dimensões das células do cubo, além de questão e alternativa
+DIMENSOES_CUBO = ['Serie', 'Sala']
+
+# Rótulo de cada código da matriz de respostas: Branco, A, B, C, D, E, Asterisco
+ROTULOS_ALTERNATIVAS = [coluna.removeprefix('Pct_') for coluna in COLUNAS_ALTERNATIVAS]
+
+class CuboRespostas:
+    """
+    Contagens de marcações por (série, sala) x questão x alternativa.
+    Os filtros do painel somam apenas as linhas do cubo (algumas dezenas de salas),
+    sem reagrupar a tabela de alunos a cada interação.
+    """
+
+    def __init__(self, grupos, alunos, contagens):
+        self.grupos = grupos        # DataFrame com DIMENSOES_CUBO, uma linha por célula
+        self.alunos = alunos        # (células,) cartões em cada célula
+        self.contagens = contagens  # (células x questões x alternativas)
+        self.questoes = nomes_colunas_questoes(contagens.shape[1])
+
+    @property
+    def series(self):
+        return list(dict.fromkeys(self.grupos['Serie']))
+
+    def salas(self, series=None):
+        """Salas das séries escolhidas (todas se series for vazio)."""
+        return list(dict.fromkeys(self.grupos.loc[self._selecao(series), 'Sala']))
+
+    def _selecao(self, series=None, salas=None):
+        """Máscara das células do cubo; filtro vazio = sem filtro."""
+        selecao = np.ones(len(self.grupos), dtype=bool)
+        if series:
+            selecao &= self.grupos['Serie'].isin(series).to_numpy()
+        if salas:
+            selecao &= self.grupos['Sala'].isin(salas).to_numpy()
+        return selecao
+
+    def _fatia_questoes(self, questoes=None):
+        """questoes: (primeira, última), ex.: ('Q001', 'Q020'); None = todas."""
+        if not questoes:
+            return slice(None)
+        return slice(self.questoes.index(questoes[0]), self.questoes.index(questoes[1]) + 1)
+
+    def total_alunos(self, series=None, salas=None):
+        return int(self.alunos[self._selecao(series, salas)].sum())
+
+    def distribuicao(self, series=None, salas=None, questoes=None):
+        """
+        Distribuição das alternativas em cada questão para a seleção, em formato longo:
+        Questao, Alternativa, Marcacoes e Percentual (sobre os cartões selecionados).
+        """
+        fatia = self._fatia_questoes(questoes)
+        marcacoes = self.contagens[self._selecao(series, salas), fatia].sum(axis=0)
+        nomes_questoes = self.questoes[fatia]
+        alunos = self.total_alunos(series, salas)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentuais = np.round(marcacoes / alunos * 100, 1)
+        return pd.DataFrame({
+            'Questao': np.repeat(nomes_questoes, len(ROTULOS_ALTERNATIVAS)),
+            'Alternativa': np.tile(ROTULOS_ALTERNATIVAS, len(nomes_questoes)),
+            'Marcacoes': marcacoes.ravel(),
+            'Percentual': percentuais.ravel()
+        })
+
+    def mapa_taxas(self, alternativa='Branco', series=None, salas=None, questoes=None):
+        """
+        Percentual de uma alternativa (ex.: Branco) por sala e questão, para o mapa de calor.
+        Retorna um DataFrame com índice 'Série - Sala' e uma coluna por questão.
+        """
+        selecao = self._selecao(series, salas)
+        fatia = self._fatia_questoes(questoes)
+        codigo = ROTULOS_ALTERNATIVAS.index(alternativa)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            taxas = self.contagens[selecao, fatia, codigo] / self.alunos[selecao, None] * 100
+        grupos = self.grupos[selecao]
+        rotulos = grupos['Serie'].astype(str) + ' - ' + grupos['Sala'].astype(str)
+        return pd.DataFrame(np.round(taxas, 1), index=rotulos.to_numpy(), columns=self.questoes[fatia])
+
+    def em_tabela(self):
+        """O cubo em formato longo (só as células com marcações), para exportação."""
+        celula, questao, codigo = np.nonzero(self.contagens)
+        tabela = self.grupos.iloc[celula].reset_index(drop=True)
+        tabela['Questao'] = np.asarray(self.questoes, dtype=object)[questao]
+        tabela['Alternativa'] = np.asarray(ROTULOS_ALTERNATIVAS, dtype=object)[codigo]
+        tabela['Marcacoes'] = self.contagens[celula, questao, codigo]
+        return tabela
+
+def montar_cubo(df_final, coluna='Gabarito_Completo'):
+    """
+    Monta o cubo com um único groupby (série, sala) e um único bincount sobre a
+    matriz de respostas (ver matriz_respostas). Feito uma vez por resultado.
+    """
+    alternativas = len(ROTULOS_ALTERNATIVAS)
+    if df_final.empty:
+        return CuboRespostas(pd.DataFrame(columns=DIMENSOES_CUBO), np.zeros(0, dtype=np.int64),
+                             np.zeros((0, 0, alternativas), dtype=np.int64))
+
+    matriz = montar_matriz_respostas(df_final[coluna])
+    questoes = matriz.shape[1]
+    agrupado = df_final.groupby(DIMENSOES_CUBO, observed=True, sort=True)
+    grupos = agrupado.ngroup().to_numpy()
+    rotulos = agrupado.size().index.to_frame(index=False)
+    validos = grupos >= 0
+    grupos, matriz = grupos[validos], matriz[validos]
+
+    alunos = np.bincount(grupos, minlength=len(rotulos))
+    indice = ((grupos[:, None] * questoes + np.arange(questoes)) * alternativas + matriz).ravel()
+    contagens = np.bincount(indice, minlength=len(rotulos) * questoes * alternativas)
+    return CuboRespostas(rotulos, alunos, contagens.reshape(len(rotulos), questoes, alternativas))
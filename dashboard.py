@@ -1,21 +1,51 @@
 import streamlit as st
-import pandas as pd
 import os
-import zipfile
 from datetime import datetime
 import io
-from formatador import processar_nomes_txt_v3, processar_respostas_txt_v4, extrair_serie_do_nome_arquivo
+import json
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from formatador import (extrair_serie_do_nome_arquivo, expandir_questoes, concatenar_dados,
+                        processar_arquivos_paralelo, unificar_dados, preparar_df_final, dividir_por_serie,
+                        preparar_reconciliacao, NOMES_ABAS_SERIES)
+from analise_itens import analisar_itens
+from correcao import corrigir_respostas, normalizar_gabarito
+from cubo_respostas import ROTULOS_ALTERNATIVAS, montar_cubo
+from duplicados import POLITICA_PADRAO, POLITICAS_DUPLICADOS, deduplicar
+from escrita_excel import escrever_planilhas
+from exportacao_colunar import MIME_FORMATOS, exportar_tabela, formatos_disponiveis
+from exportacao_particionada import PARTICOES, exportar_particionado
+from historico import ARQUIVO_HISTORICO_PADRAO, evolucao_salas, gravar_rodada, historico_aluno, listar_rodadas
+from importacao_tardia import ModuloTardio
+from instrumentacao import configurar, etapa
+from matriz_respostas import largura_respostas
+from recuperacao_pares import sugerir_pareamentos
+from tarefas import gerenciador
 
-# Configuração da página
-st.set_page_config(
-    page_title="Formatador de Dados Escolares",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+# pandas só é carregado quando há resultados para mostrar (abertura mais rápida da página)
+pd = ModuloTardio('pandas')
+px = ModuloTardio('plotly.express')
+
+# Etapas contadas no progresso depois da leitura dos arquivos: consolidação, merge, correção e análise
+PASSOS_APOS_LEITURA = 4
+
+# Intervalo (segundos) de atualização do painel de andamento
+INTERVALO_ATUALIZACAO = 1.0
+
+# Resultados mantidos por sessão (conjuntos de arquivos e opções diferentes)
+MAX_RESULTADOS_SESSAO = 3
+
+# Limite dos arquivos gerados para download guardados por sessão (Excel, ZIP e exportações)
+LIMITE_ARTEFATOS_SESSAO = 256 * 1024 * 1024
+
+# Pasta do servidor com os históricos; no navegador só se escolhe o nome do arquivo, dentro dela
+PASTA_HISTORICOS = os.environ.get('FORMATADOR_PASTA_HISTORICOS', 'historicos')
+NOME_HISTORICO_PADRAO = os.path.splitext(ARQUIVO_HISTORICO_PADRAO)[0]
 
 # CSS customizado
-st.markdown("""
+CSS_PAGINA = """
 <style>
 .main-header {
     font-size: 2.5rem;
@@ -54,95 +84,354 @@ st.markdown("""
     border-top: 1px solid #e9ecef;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-def processar_arquivos_upload(arquivos_nomes, arquivos_respostas):
-    """Processa arquivos enviados pelo usuário"""
-    todos_nomes = []
-    todas_respostas = []
-    
-    # Processar arquivos de nomes
-    for arquivo in arquivos_nomes:
-        # Salvar temporariamente
-        with open(f"temp_{arquivo.name}", "wb") as f:
-            f.write(arquivo.getbuffer())
-        
-        df_nomes = processar_nomes_txt_v3(f"temp_{arquivo.name}")
-        if not df_nomes.empty:
-            todos_nomes.append(df_nomes)
-        
-        # Remover arquivo temporário
-        os.remove(f"temp_{arquivo.name}")
-    
-    # Processar arquivos de respostas
-    for arquivo in arquivos_respostas:
-        # Salvar temporariamente
-        with open(f"temp_{arquivo.name}", "wb") as f:
-            f.write(arquivo.getbuffer())
-        
-        df_respostas = processar_respostas_txt_v4(f"temp_{arquivo.name}")
-        if not df_respostas.empty:
-            todas_respostas.append(df_respostas)
+def configurar_pagina():
+    """Configuração da página e CSS; precisa ser repetida a cada execução do script"""
+    # Sem mensagens de progresso no console do servidor; métricas das etapas vão para o logger 'formatador'
+    configurar(silencioso=True, saida='logging')
+    st.set_page_config(
+        page_title="Formatador de Dados Escolares",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    st.markdown(CSS_PAGINA, unsafe_allow_html=True)
+
+class ArtefatosSessao:
+    """
+    Arquivos para download gerados sob demanda e guardados na sessão, com descarte dos
+    menos usados acima de limite_bytes. obter() também é chamado pelo download adiado,
+    que roda em outra thread, por isso a trava.
+    """
+    
+    def __init__(self, limite_bytes=LIMITE_ARTEFATOS_SESSAO):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+    
+    def obter(self, chave, gerar):
+        """Bytes guardados em chave; na primeira vez, gerados por gerar()."""
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                return self._itens[chave]
+        conteudo = gerar()
+        with self._trava:
+            self._itens[chave] = conteudo
+            total = sum(len(item) for item in self._itens.values())
+            while total > self.limite_bytes and len(self._itens) > 1:
+                _, removido = self._itens.popitem(last=False)
+                total -= len(removido)
+        return conteudo
+    
+    def adiado(self, chave, gerar):
+        """Função sem argumentos para o data do st.download_button: só gera ao clicar."""
+        return lambda: self.obter(chave, gerar)
+    
+    def descartar(self, resultado_id):
+        """Remove os arquivos de um resultado (chaves que começam pelo id)."""
+        with self._trava:
+            for chave in [chave for chave in self._itens if chave[0] == resultado_id]:
+                del self._itens[chave]
+
+def estado_sessao():
+    """
+    Caches da sessão: resultados (impressão digital dos uploads -> id da tarefa, do mais
+    antigo para o mais recente) e os arquivos gerados para download.
+    """
+    if 'resultados_sessao' not in st.session_state:
+        st.session_state['resultados_sessao'] = OrderedDict()
+        st.session_state['artefatos_sessao'] = ArtefatosSessao()
+    return st.session_state['resultados_sessao'], st.session_state['artefatos_sessao']
+
+def impressao_digital(arquivos_nomes, arquivos_respostas, compacto=False, gabaritos=None, analise_itens=False,
+                      politica_duplicados=POLITICA_PADRAO):
+    """Identifica o conteúdo enviado e as opções: mesma impressão digital, mesmo resultado"""
+    resumo = hashlib.blake2b(digest_size=16)
+    for tipo, arquivos in (('nomes', arquivos_nomes), ('respostas', arquivos_respostas)):
+        for arquivo in arquivos:
+            resumo.update(f"{tipo}\0{arquivo.name}\0{arquivo.size}\0".encode('utf-8'))
+            resumo.update(arquivo.getbuffer())
+    opcoes = json.dumps([compacto, gabaritos, analise_itens, politica_duplicados], sort_keys=True, ensure_ascii=False)
+    resumo.update(opcoes.encode('utf-8'))
+    return resumo.hexdigest()
+
+def processar_arquivos_upload(arquivos_nomes, arquivos_respostas, workers=1, progresso=None, cancelamento=None):
+    """Processa arquivos enviados pelo usuário direto da memória, sem arquivos temporários"""
+    return processar_arquivos_paralelo(
+        [(arquivo.name, arquivo.getbuffer()) for arquivo in arquivos_nomes],
+        [(arquivo.name, arquivo.getbuffer()) for arquivo in arquivos_respostas],
+        max_workers=workers,
+        progresso=progresso,
+        cancelamento=cancelamento
+    )
+
+def caminho_historico(nome):
+    """
+    Caminho do histórico chamado `nome` na PASTA_HISTORICOS do servidor, ou None
+    (nome vazio ou inválido: só letras, números, - e _, sem pastas nem '..').
+    """
+    nome = nome.strip().removesuffix('.sqlite')
+    if not nome:
+        return None
+    if not re.fullmatch(r'[\w-]{1,64}', nome):
+        st.sidebar.error(f"❌ Nome de histórico inválido: '{nome}' (use letras, números, - e _)")
+        return None
+    return os.path.join(PASTA_HISTORICOS, f"{nome}.sqlite")
+
+def ler_gabaritos_sidebar():
+    """
+    Gabaritos informados na barra lateral: um JSON {série: gabarito} enviado pelo
+    usuário ou, para cada série, o gabarito digitado e as questões anuladas.
+    """
+    with st.sidebar.expander("📝 Correção pelo gabarito"):
+        arquivo_json = st.file_uploader(
+            "Gabaritos em JSON (opcional)",
+            type=['json'],
+            key="gabaritos",
+            help='Formato: {"9º Ano": "ABCDE...", "1ª Série": {"gabarito": "...", "pesos": [...], "anuladas": [3]}}'
+        )
+        if arquivo_json is not None:
+            try:
+                gabaritos = json.loads(arquivo_json.getvalue().decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                st.error(f"❌ '{arquivo_json.name}' não é um JSON válido ({e}); arquivo ignorado")
+                return {}
+            if not isinstance(gabaritos, dict):
+                st.error(f"❌ '{arquivo_json.name}' deve conter um objeto {{série: gabarito}}; arquivo ignorado")
+                return {}
+            return gabaritos
         
-        # Remover arquivo temporário
-        os.remove(f"temp_{arquivo.name}")
+        gabaritos = {}
+        for serie in NOMES_ABAS_SERIES:
+            gabarito = st.text_input(f"Gabarito - {serie}", key=f"gabarito_{serie}", placeholder="ABCDE...")
+            if not gabarito.strip():
+                continue
+            anuladas = st.text_input(f"Questões anuladas - {serie}", key=f"anuladas_{serie}", placeholder="3, 17")
+            numeros = re.split(r'[\s,;]+', anuladas.strip()) if anuladas.strip() else []
+            invalidos = [numero for numero in numeros if not numero.isdecimal()]
+            if invalidos:
+                st.error(f"❌ Questões anuladas de {serie} que não são números: {', '.join(invalidos)} (campo ignorado)")
+                numeros = []
+            gabaritos[serie] = {'gabarito': gabarito, 'anuladas': [int(numero) for numero in numeros]}
+        return gabaritos
+
+def executar_processamento(tarefa, arquivos_nomes, arquivos_respostas, workers=1, compacto=False,
+                           gabaritos=None, analise_itens=False, politica_duplicados=POLITICA_PADRAO):
+    """
+    Pipeline completo do dashboard, executado em segundo plano (ver tarefas.py).
+    Informa o andamento na tarefa a cada arquivo lido e a cada etapa, e para entre
+    etapas se o cancelamento for pedido. Retorna o dict usado por mostrar_resultados.
+    """
+    spans = []
+    
+    def arquivo_lido(nome, tipo, registros, segundos):
+        tarefa.avancar(f"Lendo arquivos ({tipo})")
+        tarefa.registrar(f"📄 {nome}: {registros} registros em {segundos:.2f}s")
+    
+    tarefa.avancar("Lendo arquivos", passos=0)
+    with etapa('parsing', spans) as span:
+        todos_nomes, todas_respostas, tempos = processar_arquivos_upload(
+            arquivos_nomes, arquivos_respostas, workers, progresso=arquivo_lido, cancelamento=tarefa.cancelamento
+        )
+        span['bytes_lidos'] = sum(tempo['Bytes'] for tempo in tempos)
+        span['linhas_saida'] = sum(tempo['Registros'] for tempo in tempos)
+    
+    if not todos_nomes or not todas_respostas:
+        raise ValueError("Nenhum registro válido nos arquivos de nomes ou de respostas")
+    
+    # Consolidar dados
+    tarefa.verificar_cancelamento()
+    tarefa.avancar("Consolidando", passos=0)
+    with etapa('consolidacao', spans) as span:
+        df_nomes = concatenar_dados(todos_nomes, compacto)
+        df_respostas = concatenar_dados(todas_respostas, compacto)
+        span['linhas_saida'] = len(df_nomes) + len(df_respostas)
+    
+    # Códigos repetidos (cartão relido, aluno em dois arquivos) não podem multiplicar linhas no join
+    with etapa('duplicados', spans, linhas_entrada=len(df_nomes) + len(df_respostas),
+               politica=politica_duplicados) as span:
+        df_nomes, df_respostas, df_duplicados = deduplicar(df_nomes, df_respostas, politica_duplicados)
+        span['linhas_saida'] = len(df_nomes) + len(df_respostas)
+    if not df_duplicados.empty:
+        tarefa.registrar(f"⚠️ {df_duplicados['ID_Normalizado'].nunique()} códigos repetidos ({politica_duplicados})")
+    tarefa.avancar()
     
-    return todos_nomes, todas_respostas
+    # Unificar (join por chaves inteiras) e preparar dados finais
+    tarefa.verificar_cancelamento()
+    tarefa.avancar("Unificando nomes e respostas", passos=0)
+    with etapa('merge', spans, linhas_entrada=len(df_nomes) + len(df_respostas)) as span:
+        df_pareados, df_sem_cartao, df_sem_aluno = unificar_dados(df_nomes, df_respostas)
+        df_final = preparar_df_final(df_pareados)
+        span['linhas_saida'] = len(df_final)
+    tarefa.avancar()
+    tarefa.registrar(f"🔗 {len(df_final)} alunos unificados")
+    
+    # Pares prováveis entre as sobras (código com dígito trocado)
+    with etapa('sugestoes', spans, linhas_entrada=len(df_sem_cartao) + len(df_sem_aluno)) as span:
+        df_sugestoes = sugerir_pareamentos(df_sem_cartao, df_sem_aluno)
+        span['linhas_saida'] = len(df_sugestoes)
+    if not df_sugestoes.empty:
+        tarefa.registrar(f"💡 {len(df_sugestoes)} sugestões de pareamento")
+    
+    # Correção vetorizada pelo gabarito de cada série
+    tarefa.verificar_cancelamento()
+    df_correcao = None
+    if gabaritos:
+        tarefa.avancar("Corrigindo", passos=0)
+        with etapa('correcao', spans, linhas_entrada=len(df_final)) as span:
+            df_final, df_correcao = corrigir_respostas(df_final, gabaritos)
+            span['linhas_saida'] = len(df_correcao)
+        tarefa.registrar(f"📝 {len(df_correcao)} alunos corrigidos")
+    tarefa.avancar()
+    
+    tarefa.verificar_cancelamento()
+    tabelas_itens = None
+    if analise_itens:
+        tarefa.avancar("Analisando as questões", passos=0)
+        with etapa('analise_itens', spans, linhas_entrada=len(df_final)) as span:
+            tabelas_itens = analisar_itens(df_final, gabaritos)
+            span['linhas_saida'] = sum(len(df) for df in tabelas_itens.values())
+    
+    # Cubo série x sala x questão x alternativa: os filtros do painel só leem o cubo
+    with etapa('cubo', spans, linhas_entrada=len(df_final)) as span:
+        cubo = montar_cubo(df_final)
+        span['linhas_saida'] = len(cubo.grupos)
+    tarefa.avancar("Concluído")
+    
+    return {
+        'df_final': df_final,
+        'df_sem_cartao': df_sem_cartao,
+        'df_sem_aluno': df_sem_aluno,
+        'df_sugestoes': df_sugestoes,
+        'df_duplicados': df_duplicados,
+        'compacto': compacto,
+        'workers': workers,
+        'df_correcao': df_correcao,
+        'tabelas_itens': tabelas_itens,
+        'cubo': cubo,
+        'spans': spans,
+        'tempos': tempos
+    }
+
+@st.fragment(run_every=INTERVALO_ATUALIZACAO)
+def acompanhar_tarefa(tarefa_id):
+    """Painel de andamento, atualizado sozinho sem reexecutar o restante da página"""
+    tarefa = gerenciador().obter(tarefa_id)
+    if tarefa is None or tarefa.finalizada:
+        st.rerun()  # mostra o resultado na página inteira
+    
+    resumo = tarefa.resumo()
+    if resumo['estado'] == 'na_fila':
+        st.info(f"⏳ Na fila: {gerenciador().ativas()} processamento(s) em andamento no servidor")
+    st.progress(resumo['progresso'], text=f"⚙️ {resumo['etapa']} ({resumo['segundos']:.0f}s)")
+    
+    if resumo['cancelamento_pedido']:
+        st.caption("⏹️ Cancelando após o arquivo atual...")
+    elif st.button("⏹️ Cancelar processamento"):
+        tarefa.cancelar()
+    
+    with st.expander(f"📋 {resumo['descricao']}", expanded=True):
+        st.text("\n".join(resumo['eventos'][-15:]) or "Aguardando...")
 
-def gerar_excel_final(df_final):
+def mostrar_tarefa_finalizada(tarefa, motor_excel='openpyxl', historico=None):
+    """Resultado, cancelamento ou erro de uma tarefa já encerrada"""
+    if tarefa.estado == 'cancelada':
+        st.warning("⏹️ Processamento cancelado.")
+        return
+    if tarefa.estado == 'erro':
+        st.error(f"❌ Erro ao processar arquivos: {tarefa.erro.splitlines()[0]}")
+        with st.expander("Detalhes do erro"):
+            st.code(tarefa.erro)
+        return
+    
+    resultado = tarefa.resultado
+    with st.expander(f"⏱️ Tempos por etapa e por arquivo ({tarefa.resumo()['segundos']:.1f}s)"):
+        st.dataframe(pd.DataFrame(resultado['spans']), use_container_width=True)
+        st.dataframe(pd.DataFrame(resultado['tempos']), use_container_width=True)
+    
+    _, artefatos = estado_sessao()
+    mostrar_resultados(resultado['df_final'], resultado['df_sem_cartao'], resultado['df_sem_aluno'],
+                       resultado['compacto'], motor_excel, resultado['df_correcao'], resultado['tabelas_itens'],
+                       resultado['workers'], artefatos, tarefa.id,
+                       datetime.fromtimestamp(tarefa.finalizada_em).strftime("%d-%m-%Y_%H-%M"),
+                       resultado['df_sugestoes'], resultado['df_duplicados'], resultado['cubo'], historico)
+
+def gerar_excel_final(df_final, compacto=False, motor_excel='openpyxl', df_correcao=None, tabelas_itens=None,
+                      timestamp=None, df_sugestoes=None, df_duplicados=None):
     """Gera o arquivo Excel final"""
-    timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M")
+    timestamp = timestamp or datetime.now().strftime("%d-%m-%Y_%H-%M")
+    
+    # Colunas Q001, Q002, ... geradas apenas aqui, na exportação
+    df_final = expandir_questoes(df_final, compacto=compacto)
     
     # Criar buffer em memória
     output = io.BytesIO()
     
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Aba principal
-        df_final.to_excel(writer, sheet_name='Dados_Completos', index=False)
-        
-        # Abas por série
-        series_disponiveis = df_final['Serie'].unique()
-        series_ordem = ['8º Ano', '9º Ano', '1ª Série', '2ª Série']
-        nomes_abas_series = {
-            '8º Ano': '8_Ano',
-            '9º Ano': '9_Ano', 
-            '1ª Série': '1_Serie',
-            '2ª Série': '2_Serie'
-        }
-        
-        for serie in series_ordem:
-            if serie in series_disponiveis:
-                df_serie = df_final[df_final['Serie'] == serie]
-                nome_aba = nomes_abas_series[serie]
-                df_serie.to_excel(writer, sheet_name=nome_aba, index=False)
-        
-        # Aba de estatísticas
-        stats_data = {
-            'Métrica': [
-                'Total de Alunos',
-                'Séries Processadas',
-                'Salas Identificadas',
-                'Questões Processadas'
-            ],
-            'Valor': [
-                len(df_final),
-                len(df_final['Serie'].unique()),
-                len(df_final['Sala'].unique()),
-                len([col for col in df_final.columns if col.startswith('Q')])
-            ]
-        }
-        pd.DataFrame(stats_data).to_excel(writer, sheet_name='Estatisticas', index=False)
-        
-        # Aba de resumo por sala
-        resumo_salas = df_final.groupby(['Sala', 'Serie']).agg({
-            'ID': 'count'
-        }).rename(columns={'ID': 'Quantidade_Alunos'}).reset_index()
-        resumo_salas.to_excel(writer, sheet_name='Resumo_Salas', index=False)
+    # Aba principal
+    abas = [('Dados_Completos', df_final)]
+    
+    # Abas por série (um único groupby)
+    abas.extend(dividir_por_serie(df_final))
+    
+    # Aba de estatísticas
+    stats_data = {
+        'Métrica': [
+            'Total de Alunos',
+            'Séries Processadas',
+            'Salas Identificadas',
+            'Questões Processadas'
+        ],
+        'Valor': [
+            len(df_final),
+            len(df_final['Serie'].unique()),
+            len(df_final['Sala'].unique()),
+            len([col for col in df_final.columns if col.startswith('Q')])
+        ]
+    }
+    abas.append(('Estatisticas', pd.DataFrame(stats_data)))
+    
+    # Aba de resumo por sala
+    resumo_salas = df_final.groupby(['Sala', 'Serie'], observed=True).agg({
+        'ID': 'count'
+    }).rename(columns={'ID': 'Quantidade_Alunos'}).reset_index()
+    abas.append(('Resumo_Salas', resumo_salas))
+    
+    # Aba de correção por questão
+    if df_correcao is not None and not df_correcao.empty:
+        abas.append(('Correcao_Questoes', df_correcao))
+    
+    # Abas de análise de itens
+    abas.extend((tabelas_itens or {}).items())
+    
+    # Aba de pares prováveis entre alunos sem cartão e cartões sem aluno
+    if df_sugestoes is not None and not df_sugestoes.empty:
+        abas.append(('Sugestoes_Pareamento', df_sugestoes))
+    
+    # Aba com as ocorrências dos códigos repetidos
+    if df_duplicados is not None and not df_duplicados.empty:
+        abas.append(('Duplicados', df_duplicados))
+    
+    escrever_planilhas(output, abas, motor=motor_excel)
     
     output.seek(0)
     return output, f"Resultados_{timestamp}.xlsx"
 
+def gerar_zip_particoes(df_final, por='Sala', compacto=False, motor_excel='openpyxl', workers=1,
+                        df_correcao=None, tabelas_itens=None, timestamp=None):
+    """Gera o ZIP com um Excel por sala ou por série (gravados em paralelo)"""
+    timestamp = timestamp or datetime.now().strftime("%d-%m-%Y_%H-%M")
+    output = io.BytesIO()
+    nomes = exportar_particionado(output, expandir_questoes(df_final, compacto=compacto), por, motor_excel,
+                                  max_workers=workers, df_correcao=df_correcao, tabelas_itens=tabelas_itens,
+                                  prefixo=f"Resultados_{timestamp}")
+    output.seek(0)
+    return output, f"Resultados_{timestamp}_por_{por.lower()}.zip", len(nomes)
+
 def main():
+    configurar_pagina()
+    
     # Header
     st.markdown('<h1 class="main-header">📊 Formatador de Dados Escolares</h1>', unsafe_allow_html=True)
     
@@ -152,6 +441,40 @@ def main():
     
     # Upload Manual de Arquivos
     st.sidebar.info("📤 **Upload Manual**: Faça upload dos seus arquivos de nomes e respostas para processamento.")
+    compacto = st.sidebar.checkbox(
+        "🗜️ Modo compacto de memória",
+        help="Usa tipos categóricos para Série, Sala, arquivo de origem e questões. Recomendado para lotes grandes."
+    )
+    workers = st.sidebar.number_input(
+        "⚙️ Processos paralelos",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=1,
+        help="Quantidade de arquivos lidos ao mesmo tempo"
+    )
+    motor_excel = 'streaming' if st.sidebar.checkbox(
+        "📄 Excel em streaming",
+        help="Grava o Excel linha a linha com memória constante. Recomendado para dezenas de milhares de alunos."
+    ) else 'openpyxl'
+    gabaritos = ler_gabaritos_sidebar()
+    analise_itens = st.sidebar.checkbox(
+        "📐 Análise de itens",
+        help="Distribuição das alternativas por questão, série e sala; com gabarito, também dificuldade e discriminação."
+    )
+    historico = caminho_historico(st.sidebar.text_input(
+        "🗂️ Histórico",
+        value=NOME_HISTORICO_PADRAO,
+        key="historico_arquivo",
+        help=f"Nome do histórico SQLite com os resultados de cada rodada, guardado na pasta "
+             f"'{PASTA_HISTORICOS}' do servidor (letras, números, - e _). Deixe vazio para não usar."
+    ))
+    politica_duplicados = st.sidebar.selectbox(
+        "♊ Códigos repetidos",
+        list(POLITICAS_DUPLICADOS),
+        index=list(POLITICAS_DUPLICADOS).index(POLITICA_PADRAO),
+        format_func=lambda politica: politica.replace('_', ' ').capitalize(),
+        help="\n\n".join(f"**{nome}**: {descricao}" for nome, descricao in POLITICAS_DUPLICADOS.items())
+    )
     
     st.markdown('<div class="info-box">', unsafe_allow_html=True)
     st.info("📤 **Modo Manual**: Faça upload dos seus arquivos de nomes e respostas.")
@@ -177,54 +500,80 @@ def main():
             key="respostas"
         )
     
+    tarefa_id = st.session_state.get('tarefa_id')
+    tarefa = gerenciador().obter(tarefa_id) if tarefa_id else None
+    em_andamento = tarefa is not None and not tarefa.finalizada
+    
     if arquivos_nomes and arquivos_respostas:
-        if st.button("🚀 Processar Arquivos", type="primary"):
-            with st.spinner("Processando dados..."):
-                todos_nomes, todas_respostas = processar_arquivos_upload(arquivos_nomes, arquivos_respostas)
-                
-                if not todos_nomes or not todas_respostas:
-                    st.error("❌ Erro ao processar arquivos")
-                    return
-                
-                # Consolidar dados
-                df_nomes = pd.concat(todos_nomes, ignore_index=True)
-                df_respostas = pd.concat(todas_respostas, ignore_index=True)
-                
-                # Unificar
-                df_unificado = pd.merge(
-                    df_nomes,
-                    df_respostas,
-                    on='ID_Normalizado',
-                    how='outer',
-                    suffixes=('_nomes', '_respostas')
+        if st.button("🚀 Processar Arquivos", type="primary", disabled=em_andamento):
+            try:
+                for gabarito in gabaritos.values():
+                    normalizar_gabarito(gabarito)
+            except ValueError as e:
+                st.error(f"❌ Gabarito inválido: {e}")
+                return
+            
+            # Mesmos arquivos e opções já processados nesta sessão: reaproveita o resultado
+            resultados, artefatos = estado_sessao()
+            chave = impressao_digital(arquivos_nomes, arquivos_respostas, compacto, gabaritos, analise_itens,
+                                      politica_duplicados)
+            anterior = gerenciador().obter(resultados.get(chave, ''))
+            if anterior is not None and anterior.estado not in ('cancelada', 'erro'):
+                tarefa = anterior
+                resultados.move_to_end(chave)
+                st.toast("♻️ Arquivos já processados nesta sessão: resultado reaproveitado")
+            else:
+                # O processamento roda em segundo plano; a página só acompanha o andamento
+                tarefa = gerenciador().submeter(
+                    executar_processamento, list(arquivos_nomes), list(arquivos_respostas), int(workers),
+                    compacto, gabaritos, analise_itens, politica_duplicados,
+                    descricao=f"{len(arquivos_nomes)} arquivos de nomes e {len(arquivos_respostas)} de respostas",
+                    total_passos=len(arquivos_nomes) + len(arquivos_respostas) + PASSOS_APOS_LEITURA
                 )
+                if anterior is not None:
+                    gerenciador().descartar(anterior.id)
+                    artefatos.descartar(anterior.id)
+                resultados[chave] = tarefa.id
+                resultados.move_to_end(chave)
                 
-                df_unificado['Serie'] = df_unificado['Serie_nomes'].fillna(df_unificado['Serie_respostas'])
-                
-                # Preparar dados finais
-                colunas_basicas = ['ID_Nome', 'Nome', 'Sala', 'Serie', 'Respostas_String']
-                colunas_questoes = [col for col in df_unificado.columns if col.startswith('Q')]
-                colunas_questoes.sort()
-                
-                df_final = df_unificado.dropna(subset=['ID_Nome', 'ID_Resposta'])[colunas_basicas + colunas_questoes].copy()
-                df_final = df_final.rename(columns={
-                    'ID_Nome': 'ID',
-                    'Nome': 'Nome',
-                    'Sala': 'Sala',
-                    'Serie': 'Serie',
-                    'Respostas_String': 'Gabarito_Completo'
-                })
-                
-                df_final['Sala'] = df_final['Sala'].fillna('Sala_Não_Identificada')
-            
-            # Mostrar resultados
-            mostrar_resultados(df_final, df_unificado)
+                # Resultados mais antigos da sessão liberam a memória
+                while len(resultados) > MAX_RESULTADOS_SESSAO:
+                    _, tarefa_antiga = resultados.popitem(last=False)
+                    gerenciador().descartar(tarefa_antiga)
+                    artefatos.descartar(tarefa_antiga)
+            st.session_state['tarefa_id'] = tarefa.id
+            em_andamento = not tarefa.finalizada
+    
+    if em_andamento:
+        acompanhar_tarefa(tarefa.id)
+    elif tarefa is not None:
+        mostrar_tarefa_finalizada(tarefa, motor_excel, historico)
+    
+    # Consultas entre rodadas, mesmo sem arquivos novos
+    if historico and os.path.exists(historico):
+        mostrar_historico(historico)
     
     # Rodapé
     st.markdown('<div class="footer">Desenvolvido por Caio Murakami</div>', unsafe_allow_html=True)
 
-def mostrar_resultados(df_final, df_unificado):
-    """Mostra os resultados do processamento"""
+def exportar_em_bytes(df, formato):
+    """Conteúdo de uma exportação colunar (ver exportacao_colunar.exportar_tabela)"""
+    buffer = io.BytesIO()
+    exportar_tabela(df, buffer, formato)
+    return buffer.getvalue()
+
+def mostrar_resultados(df_final, df_sem_cartao, df_sem_aluno, compacto=False, motor_excel='openpyxl',
+                       df_correcao=None, tabelas_itens=None, workers=1, artefatos=None, resultado_id='',
+                       timestamp=None, df_sugestoes=None, df_duplicados=None, cubo=None, historico=None):
+    """
+    Mostra os resultados do processamento. Os arquivos para download só são gerados
+    quando o botão é clicado e ficam guardados em artefatos (ver ArtefatosSessao).
+    Com historico (arquivo SQLite), oferece gravar o resultado como uma rodada.
+    """
+    if artefatos is None:
+        artefatos = ArtefatosSessao()
+    timestamp = timestamp or datetime.now().strftime("%d-%m-%Y_%H-%M")
+    prefixo = f"Resultados_{timestamp}"
     st.markdown('<div class="success-box">', unsafe_allow_html=True)
     st.success("✅ Processamento concluído com sucesso!")
     st.markdown('</div>', unsafe_allow_html=True)
@@ -242,23 +591,47 @@ def mostrar_resultados(df_final, df_unificado):
         st.metric("🏫 Salas", len(df_final['Sala'].unique()))
     
     with col4:
-        questoes = len([col for col in df_final.columns if col.startswith('Q')])
+        questoes = int(df_final['Gabarito_Completo'].str.len().max()) if not df_final.empty else 0
         st.metric("❓ Questões", questoes)
     
     # Distribuição por série
     st.subheader("📊 Distribuição por Série")
     serie_counts = df_final['Serie'].value_counts()
+    serie_counts = serie_counts[serie_counts > 0]  # Categorical lista também as séries ausentes
     st.bar_chart(serie_counts)
     
+    # Painel interativo sobre o cubo pré-calculado
+    if cubo is not None and cubo.questoes:
+        mostrar_painel_respostas(cubo)
+    
+    # Resultado da correção
+    if df_correcao is not None and not df_correcao.empty:
+        st.subheader("🎯 Correção")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("✔️ Alunos Corrigidos", len(df_correcao))
+        with col2:
+            st.metric("📈 Média (%)", f"{df_final['Percentual'].mean():.1f}")
+        with col3:
+            st.metric("🏆 Maior Nota (%)", f"{df_final['Percentual'].max():.1f}")
+        st.bar_chart(df_final.groupby('Sala', observed=True)['Percentual'].mean().dropna())
+    
+    # Análise de itens
+    if tabelas_itens:
+        mostrar_analise_itens(tabelas_itens)
+    
     # Preview dos dados
     st.subheader("👁️ Preview dos Dados")
-    st.dataframe(df_final.head(10), use_container_width=True)
+    # Mesma quantidade de colunas Q da exportação: a largura vem de todos os cartões, não só das 10 linhas
+    st.dataframe(expandir_questoes(df_final.head(10), largura=largura_respostas(df_final['Gabarito_Completo'])),
+                 use_container_width=True)
     
     # Problemas encontrados
-    nomes_sem_resposta = len(df_unificado[df_unificado['ID_Resposta'].isnull()])
-    respostas_sem_nome = len(df_unificado[df_unificado['ID_Nome'].isnull()])
+    nomes_sem_resposta = len(df_sem_cartao)
+    respostas_sem_nome = len(df_sem_aluno)
+    tem_duplicados = df_duplicados is not None and not df_duplicados.empty
     
-    if nomes_sem_resposta > 0 or respostas_sem_nome > 0:
+    if nomes_sem_resposta > 0 or respostas_sem_nome > 0 or tem_duplicados:
         st.subheader("⚠️ Problemas Encontrados")
         col1, col2 = st.columns(2)
         
@@ -269,22 +642,211 @@ def mostrar_resultados(df_final, df_unificado):
         with col2:
             if respostas_sem_nome > 0:
                 st.warning(f"👤 {respostas_sem_nome} cartões sem nome correspondente")
+        
+        if df_sugestoes is not None and not df_sugestoes.empty:
+            pares_mutuos = int(df_sugestoes['Par_Mutuo'].sum())
+            with st.expander(f"💡 {len(df_sugestoes)} sugestões de pareamento ({pares_mutuos} pares mútuos)"):
+                st.caption("Códigos a até 2 dígitos de diferença (trocado, faltando, sobrando ou invertido). "
+                           "Par_Mutuo indica que o cartão e o aluno são a melhor opção um do outro.")
+                st.dataframe(df_sugestoes, use_container_width=True)
+        
+        if tem_duplicados:
+            codigos_repetidos = df_duplicados['ID_Normalizado'].nunique()
+            with st.expander(f"♊ {codigos_repetidos} códigos repetidos em nomes ou cartões"):
+                st.caption("Cada código entra na unificação no máximo uma vez; Situacao indica qual "
+                           "ocorrência foi mantida.")
+                st.dataframe(df_duplicados, use_container_width=True)
     
     # Download do arquivo
     st.subheader("💾 Download do Resultado")
     
-    excel_buffer, nome_arquivo = gerar_excel_final(df_final)
-    
     st.download_button(
         label="📥 Baixar Arquivo Excel",
-        data=excel_buffer,
-        file_name=nome_arquivo,
+        data=artefatos.adiado(
+            (resultado_id, 'excel', motor_excel),
+            lambda: gerar_excel_final(df_final, compacto, motor_excel, df_correcao, tabelas_itens,
+                                      timestamp, df_sugestoes, df_duplicados)[0].getvalue()
+        ),
+        file_name=f"{prefixo}.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        type="primary"
+        type="primary",
+        on_click='ignore'
     )
     
     st.info(f"📋 **Abas criadas**: Dados_Completos, 8_Ano, 9_Ano, 1_Serie, 2_Serie, Estatisticas, Resumo_Salas")
-    st.info(f"📝 **Suporte expandido**: Agora processa até 200 questões (Q001-Q200) com preservação de asteriscos")
+    st.info(f"📝 **Questões**: Colunas Q001 até Q{questoes:03d} (maior cartão) com preservação de asteriscos")
+    
+    # Um arquivo por turma (ou por série), empacotados em ZIP
+    st.subheader("📦 Um Arquivo por Sala ou Série")
+    por = st.radio("Separar por", list(PARTICOES), horizontal=True, key="particao",
+                   format_func=lambda particao: 'Série' if particao == 'Serie' else particao)
+    quantidade = df_final.groupby(PARTICOES[por], observed=True).ngroups
+    st.download_button(
+        label=f"📥 Baixar ZIP ({quantidade} arquivos)",
+        data=artefatos.adiado(
+            (resultado_id, 'zip', por, motor_excel),
+            lambda: gerar_zip_particoes(df_final, por, compacto, motor_excel, workers, df_correcao,
+                                        tabelas_itens, timestamp)[0].getvalue()
+        ),
+        file_name=f"{prefixo}_por_{por.lower()}.zip",
+        mime="application/zip",
+        key="download_zip",
+        on_click='ignore'
+    )
+    
+    # Exportações colunares (sem openpyxl) para análises em lote; cada tabela só é
+    # montada e convertida quando o download é pedido
+    st.subheader("📦 Exportações Colunares")
+    tabelas = {
+        'Dados_Completos': lambda: expandir_questoes(df_final, compacto=compacto),
+        'Alunos_Sem_Cartao': lambda: preparar_reconciliacao(df_sem_cartao, df_sem_aluno)[0],
+        'Cartoes_Sem_Aluno': lambda: preparar_reconciliacao(df_sem_cartao, df_sem_aluno)[1]
+    }
+    if df_correcao is not None:
+        tabelas['Correcao_Questoes'] = lambda: df_correcao
+    if df_sugestoes is not None and not df_sugestoes.empty:
+        tabelas['Sugestoes_Pareamento'] = lambda: df_sugestoes
+    if tem_duplicados:
+        tabelas['Duplicados'] = lambda: df_duplicados
+    if cubo is not None:
+        tabelas['Cubo_Respostas'] = cubo.em_tabela
+    for nome, df_itens in (tabelas_itens or {}).items():
+        tabelas[nome] = lambda df_itens=df_itens: df_itens
+    formatos = formatos_disponiveis()
+    
+    for aba, formato in zip(st.tabs([formato.upper() for formato in formatos]), formatos):
+        with aba:
+            colunas = st.columns(len(tabelas))
+            for coluna, (nome, montar_tabela) in zip(colunas, tabelas.items()):
+                coluna.download_button(
+                    label=f"📥 {nome}",
+                    data=artefatos.adiado((resultado_id, formato, nome),
+                                          lambda montar_tabela=montar_tabela, formato=formato:
+                                          exportar_em_bytes(montar_tabela(), formato)),
+                    file_name=f"{prefixo}_{nome}.{formato}",
+                    mime=MIME_FORMATOS[formato],
+                    key=f"download_{formato}_{nome}",
+                    on_click='ignore'
+                )
+    
+    # Histórico entre rodadas
+    if historico:
+        st.subheader("🗂️ Gravar no Histórico")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            rodada = st.text_input("Nome da rodada", key="historico_rodada", placeholder="automático (data e hora)",
+                                   help="Sem nome, a rodada recebe um nome único")
+            substituir = st.checkbox("Substituir se a rodada já existir", key="historico_substituir")
+        with col2:
+            st.write("")
+            gravar = st.button("🗂️ Gravar rodada", key="historico_gravar")
+        if gravar:
+            try:
+                rodada, gravados = gravar_rodada(df_final, rodada.strip() or None, historico, origem='dashboard',
+                                                 substituir=substituir)
+                st.success(f"✅ Rodada '{rodada}' gravada no histórico ({gravados} alunos)")
+            except ValueError as e:
+                st.error(f"❌ {e}")
+    
+    if 'parquet' not in formatos:
+        st.caption("Instale o pacote pyarrow para habilitar Parquet e Feather.")
+
+@st.fragment
+def mostrar_painel_respostas(cubo):
+    """
+    Distribuição das respostas e mapa de calor filtrados por série, sala e questões.
+    Lê só o cubo (ver cubo_respostas) e, como fragmento, reexecuta apenas o painel.
+    """
+    st.subheader("🔎 Explorar Respostas")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        series = st.multiselect("Séries", cubo.series, key="cubo_series", placeholder="Todas")
+    with col2:
+        salas = st.multiselect("Salas", cubo.salas(series), key="cubo_salas", placeholder="Todas")
+    questoes = st.select_slider("Questões", options=cubo.questoes, value=(cubo.questoes[0], cubo.questoes[-1]),
+                                key="cubo_questoes")
+    
+    alunos = cubo.total_alunos(series, salas)
+    st.caption(f"👥 {alunos} cartões na seleção")
+    if alunos == 0:
+        st.info("Nenhum cartão para os filtros escolhidos.")
+        return
+    
+    # Distribuição das alternativas em cada questão
+    df_distribuicao = cubo.distribuicao(series, salas, questoes)
+    figura = px.bar(df_distribuicao, x='Questao', y='Percentual', color='Alternativa',
+                    category_orders={'Alternativa': ROTULOS_ALTERNATIVAS}, hover_data=['Marcacoes'],
+                    labels={'Questao': 'Questão', 'Percentual': '% dos cartões'})
+    figura.update_layout(barmode='stack', legend_traceorder='normal')
+    st.plotly_chart(figura, use_container_width=True)
+    
+    # Mapa de calor por sala: onde as questões ficaram em branco (ou com asterisco)
+    alternativa = st.radio("Mapa de calor", ['Branco', 'Asterisco'], horizontal=True, key="cubo_mapa",
+                           format_func=lambda rotulo: 'Em branco' if rotulo == 'Branco' else rotulo)
+    df_mapa = cubo.mapa_taxas(alternativa, series, salas, questoes)
+    figura = px.imshow(df_mapa, aspect='auto', color_continuous_scale='Reds', zmin=0,
+                       labels={'x': 'Questão', 'y': 'Sala', 'color': f"% {alternativa.lower()}"})
+    figura.update_layout(height=max(300, 28 * len(df_mapa) + 120))
+    st.plotly_chart(figura, use_container_width=True)
+
+@st.fragment
+def mostrar_historico(historico):
+    """Evolução de um aluno ou das salas entre as rodadas gravadas no histórico"""
+    st.subheader("📈 Histórico de Rodadas")
+    rodadas = listar_rodadas(historico)
+    if rodadas.empty:
+        st.info("Nenhuma rodada gravada ainda.")
+        return
+    with st.expander(f"🗂️ {len(rodadas)} rodadas gravadas"):
+        st.dataframe(rodadas, use_container_width=True, hide_index=True)
+    
+    aba_aluno, aba_salas = st.tabs(["👤 Aluno", "🏫 Salas"])
+    with aba_aluno:
+        id_aluno = st.text_input("Código do aluno", key="historico_aluno", placeholder="268359").strip()
+        if id_aluno:
+            df_aluno = historico_aluno(id_aluno, historico)
+            if df_aluno.empty:
+                st.info("Aluno não encontrado no histórico.")
+            else:
+                if df_aluno['Percentual'].notna().any():
+                    st.line_chart(df_aluno.set_index('Rodada')['Percentual'])
+                st.dataframe(df_aluno, use_container_width=True, hide_index=True)
+    
+    with aba_salas:
+        df_salas = evolucao_salas(caminho=historico)
+        serie = st.selectbox("Série", list(df_salas['Serie'].dropna().unique()), key="historico_serie")
+        df_salas = df_salas[df_salas['Serie'] == serie]
+        if df_salas['Media_Percentual'].notna().any():
+            figura = px.line(df_salas, x='Rodada', y='Media_Percentual', color='Sala', markers=True,
+                             category_orders={'Rodada': list(rodadas['Rodada'])},
+                             labels={'Media_Percentual': 'Média (%)'})
+            st.plotly_chart(figura, use_container_width=True)
+        st.dataframe(df_salas, use_container_width=True, hide_index=True)
+
+def mostrar_analise_itens(tabelas_itens):
+    """Tabela de estatísticas por questão, com filtro de série/sala e gráfico por questão"""
+    st.subheader("📐 Análise de Itens")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        nivel = st.radio("Agrupar por", ['Série', 'Sala'], horizontal=True, key="itens_nivel")
+    df_itens = tabelas_itens['Itens_Serie' if nivel == 'Série' else 'Itens_Sala']
+    
+    with col2:
+        series = list(df_itens['Serie'].unique())
+        serie = st.selectbox("Série", series, key="itens_serie")
+    df_itens = df_itens[df_itens['Serie'] == serie]
+    if nivel == 'Sala':
+        sala = st.selectbox("Sala", list(df_itens['Sala'].unique()), key="itens_sala")
+        df_itens = df_itens[df_itens['Sala'] == sala]
+    
+    # Com gabarito: dificuldade por questão; sem gabarito: asteriscos e brancos
+    if 'P_Valor' in df_itens.columns:
+        st.bar_chart(df_itens.set_index('Questao')[['P_Valor', 'Ponto_Bisserial']])
+    else:
+        st.bar_chart(df_itens.set_index('Questao')[['Pct_Asterisco', 'Pct_Branco']])
+    st.dataframe(df_itens, use_container_width=True, hide_index=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,121 @@
+# Descoberta dos arquivos de nomes e respostas em uma única varredura
+# Formatador de Dados Escolares - os.scandir com regras de exclusão, profundidade máxima e índice em cache
+
+import fnmatch
+import json
+import os
+
+from cache_arquivos import PASTA_CACHE_PADRAO
+
+# Pastas que não são visitadas (ocultas, ambientes virtuais, resultados antigos)
+PODAR_PADRAO = ('.*', '__pycache__', 'venv', 'node_modules', 'site-packages', 'Resultados_*')
+
+# Arquivos ignorados mesmo com nome de nomes/respostas
+IGNORAR_PADRAO = ('.*',)
+
+ARQUIVO_INDICE_PADRAO = os.path.join(PASTA_CACHE_PADRAO, 'indice_arquivos.json')
+VERSAO_INDICE = 1
+
+def classificar_arquivo(nome):
+    """
+    'nomes' para nome*.txt, 'respostas' para resposta*.txt, None para os demais.
+    Diferencia maiúsculas de minúsculas conforme o sistema (como o glob).
+    """
+    nome = os.path.normcase(nome)
+    if not nome.endswith('.txt'):
+        return None
+    if nome.startswith('nome'):
+        return 'nomes'
+    if nome.startswith('resposta'):
+        return 'respostas'
+    return None
+
+def _corresponde(nome, padroes):
+    """True se o nome casa com algum dos padrões fnmatch."""
+    return any(fnmatch.fnmatch(nome, padrao) for padrao in padroes)
+
+def _listar_pasta(caminho):
+    """Uma leitura da pasta: arquivos candidatos [(nome, tipo)] e subpastas (sem seguir links)."""
+    arquivos = []
+    subpastas = []
+    with os.scandir(caminho) as it:
+        for entrada in it:
+            if entrada.is_dir(follow_symlinks=False):
+                subpastas.append(entrada.name)
+            else:
+                tipo = classificar_arquivo(entrada.name)
+                if tipo:
+                    arquivos.append((entrada.name, tipo))
+    return arquivos, subpastas
+
+def carregar_indice(caminho=ARQUIVO_INDICE_PADRAO):
+    """Lê o índice de pastas salvo; retorna um índice vazio se não existir ou for de outra versão."""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if dados.get('versao') != VERSAO_INDICE:
+        return {}
+    return dados.get('pastas', {})
+
+def salvar_indice(indice, caminho=ARQUIVO_INDICE_PADRAO):
+    """Grava o índice de pastas de forma atômica."""
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({'versao': VERSAO_INDICE, 'pastas': indice}, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+def varrer_arquivos(raiz='.', profundidade_maxima=None, podar=PODAR_PADRAO, ignorar=IGNORAR_PADRAO, indice=None):
+    """
+    Percorre raiz e subpastas uma única vez, classificando os arquivos em nomes e respostas.
+    - podar: padrões fnmatch de pastas que não são visitadas;
+    - ignorar: padrões fnmatch de arquivos descartados;
+    - profundidade_maxima: 0 = só a raiz, 1 = raiz e subpastas diretas, None = sem limite;
+    - indice: dict (ver carregar_indice) atualizado no lugar. Uma pasta cujo mtime não
+      mudou é reaproveitada do índice com um único stat, sem listar o conteúdo de novo.
+    Retorna (arquivos_nomes, arquivos_respostas) ordenados, com caminhos relativos a raiz
+    quando raiz = '.'.
+    """
+    arquivos = {'nomes': [], 'respostas': []}
+    visitadas = set()
+    pendentes = [(raiz, 0)]
+
+    while pendentes:
+        caminho, profundidade = pendentes.pop()
+        try:
+            mtime = os.stat(caminho).st_mtime_ns
+        except OSError:
+            continue
+        visitadas.add(caminho)
+
+        entrada_indice = indice.get(caminho) if indice is not None else None
+        if entrada_indice and entrada_indice[0] == mtime:
+            candidatos, subpastas = entrada_indice[1], entrada_indice[2]
+        else:
+            try:
+                candidatos, subpastas = _listar_pasta(caminho)
+            except OSError:
+                continue
+            if indice is not None:
+                indice[caminho] = [mtime, candidatos, subpastas]
+
+        prefixo = '' if caminho == '.' else caminho
+        for nome, tipo in candidatos:
+            if not _corresponde(nome, ignorar):
+                arquivos[tipo].append(os.path.join(prefixo, nome))
+
+        if profundidade_maxima is None or profundidade < profundidade_maxima:
+            for nome in subpastas:
+                if not _corresponde(nome, podar):
+                    pendentes.append((os.path.join(prefixo, nome), profundidade + 1))
+
+    # Pastas que sumiram (ou ficaram fora das regras) saem do índice
+    if indice is not None:
+        for caminho in [caminho for caminho in indice if caminho not in visitadas]:
+            del indice[caminho]
+
+    return sorted(arquivos['nomes']), sorted(arquivos['respostas'])
@@ -0,0 +1,120 @@
+# Detecção e resolução de códigos duplicados antes da unificação
+# Formatador de Dados Escolares - uma passada com tabela hash sobre ID_Normalizado
+
+from importacao_tardia import ModuloTardio
+
+np = ModuloTardio('numpy')
+pd = ModuloTardio('pandas')
+
+# Políticas de resolução: nome -> descrição (usada na ajuda da linha de comando e no dashboard)
+POLITICAS_DUPLICADOS = {
+    'mais_completo': "mantém a ocorrência mais completa (maior Total_Questoes_Real; nos nomes, com sala "
+                     "identificada), a última em caso de empate",
+    'ultimo': "mantém a última ocorrência (a releitura mais recente)",
+    'sinalizar': "não escolhe: retira o código da unificação (nos dois lados) e lista todas as ocorrências "
+                 "para conferência"
+}
+POLITICA_PADRAO = 'mais_completo'
+SITUACAO_RETIDO = 'Retido para conferência'
+
+COLUNAS_DUPLICADOS = ['Lado', 'ID_Normalizado', 'Ocorrencia', 'Codigo', 'Nome', 'Sala', 'Serie',
+                      'Total_Questoes_Real', 'Arquivo_Origem', 'Situacao']
+
+# Lado -> coluna com o código original do registro
+_CODIGO_ORIGINAL = {'Nomes': 'ID_Nome', 'Cartoes': 'ID_Resposta'}
+
+def localizar_duplicados(df, coluna='ID_Normalizado'):
+    """
+    Uma passada com tabela hash (factorize) sobre a coluna de códigos.
+    Retorna (codigos, duplicado): o inteiro de cada código (-1 para vazio) e a
+    máscara das linhas cujo código aparece mais de uma vez.
+    """
+    codigos, _ = pd.factorize(df[coluna])
+    validos = codigos >= 0
+    contagem = np.bincount(codigos[validos])
+    duplicado = np.zeros(len(df), dtype=bool)
+    duplicado[validos] = contagem[codigos[validos]] > 1
+    return codigos, duplicado
+
+def _completude(df):
+    """Quanto maior, mais completo o registro: questões do cartão ou sala identificada no nome."""
+    if 'Total_Questoes_Real' in df.columns:
+        return df['Total_Questoes_Real'].to_numpy(dtype=np.int64)
+    return (df['Sala'].astype(str) != 'Sala_Não_Identificada').to_numpy(dtype=np.int64)
+
+def resolver_duplicados(df, lado, politica=POLITICA_PADRAO):
+    """
+    Deixa no máximo uma linha por ID_Normalizado, segundo a política (ver POLITICAS_DUPLICADOS).
+    lado: 'Nomes' ou 'Cartoes', usado no relatório.
+    Retorna (df_resolvido, df_relatorio); o relatório tem COLUNAS_DUPLICADOS e uma
+    linha por ocorrência dos códigos repetidos, com a Situacao de cada uma.
+    """
+    if politica not in POLITICAS_DUPLICADOS:
+        raise ValueError(f"Política de duplicados inválida: {politica} (use {', '.join(POLITICAS_DUPLICADOS)})")
+    if df.empty:
+        return df, pd.DataFrame(columns=COLUNAS_DUPLICADOS)
+
+    codigos, duplicado = localizar_duplicados(df)
+    if not duplicado.any():
+        return df, pd.DataFrame(columns=COLUNAS_DUPLICADOS)
+
+    linhas = np.flatnonzero(duplicado)
+    if politica == 'sinalizar':
+        manter = linhas[:0]
+    else:
+        # Ordena por código, completude e posição: a última linha de cada código é a escolhida
+        completude = _completude(df)[linhas] if politica == 'mais_completo' else np.zeros(len(linhas))
+        ordenadas = linhas[np.lexsort((linhas, completude, codigos[linhas]))]
+        grupos = codigos[ordenadas]
+        manter = ordenadas[np.append(grupos[1:] != grupos[:-1], True)]
+
+    mascara = np.ones(len(df), dtype=bool)
+    mascara[linhas] = False
+    mascara[manter] = True
+
+    situacao = np.where(np.isin(linhas, manter), 'Mantido',
+                        SITUACAO_RETIDO if politica == 'sinalizar' else 'Descartado')
+    return df.loc[mascara].reset_index(drop=True), _relatorio(df.iloc[linhas], lado, situacao)
+
+def _relatorio(df_linhas, lado, situacao):
+    """Linhas do relatório (COLUNAS_DUPLICADOS), numeradas por código na ordem de leitura."""
+    df_relatorio = df_linhas.reset_index(drop=True).rename(columns={_CODIGO_ORIGINAL[lado]: 'Codigo'})
+    df_relatorio['Lado'] = lado
+    df_relatorio['Situacao'] = situacao
+    df_relatorio['Ocorrencia'] = df_relatorio.groupby('ID_Normalizado', sort=False).cumcount() + 1
+    df_relatorio = df_relatorio.sort_values(['ID_Normalizado', 'Ocorrencia'], kind='stable')
+    return df_relatorio.reindex(columns=COLUNAS_DUPLICADOS)
+
+def _reter(df, lado, codigos):
+    """Retira da unificação as linhas com os códigos retidos do outro lado (política 'sinalizar')."""
+    retida = df['ID_Normalizado'].isin(codigos).to_numpy()
+    if not retida.any():
+        return df, pd.DataFrame(columns=COLUNAS_DUPLICADOS)
+    return df.loc[~retida].reset_index(drop=True), _relatorio(df.loc[retida], lado, SITUACAO_RETIDO)
+
+def deduplicar(df_nomes, df_respostas, politica=POLITICA_PADRAO):
+    """
+    Resolve os códigos repetidos dos dois lados antes da unificação, para que o
+    join continue um para um (sem multiplicar linhas).
+    Retorna (df_nomes, df_respostas, df_duplicados).
+    """
+    df_nomes, relatorio_nomes = resolver_duplicados(df_nomes, 'Nomes', politica)
+    df_respostas, relatorio_respostas = resolver_duplicados(df_respostas, 'Cartoes', politica)
+    relatorios = [relatorio_nomes, relatorio_respostas]
+    if politica == 'sinalizar':
+        # O código retido sai dos dois lados; senão o registro único do outro lado viraria sobra
+        df_respostas, retidos_respostas = _reter(df_respostas, 'Cartoes', relatorio_nomes['ID_Normalizado'])
+        df_nomes, retidos_nomes = _reter(df_nomes, 'Nomes', relatorio_respostas['ID_Normalizado'])
+        relatorios += [retidos_nomes, retidos_respostas]
+
+    relatorios = [df for df in relatorios if not df.empty]
+    if not relatorios:
+        return df_nomes, df_respostas, pd.DataFrame(columns=COLUNAS_DUPLICADOS)
+    # Categorias diferentes entre os lados (modo compacto) voltam a texto no relatório
+    relatorios = [df.astype({coluna: object for coluna in ('Sala', 'Serie', 'Arquivo_Origem')})
+                  for df in relatorios]
+    df_duplicados = pd.concat(relatorios, ignore_index=True).sort_values(
+        ['ID_Normalizado', 'Lado', 'Ocorrencia'], ascending=[True, False, True], kind='stable'
+    ).reset_index(drop=True)
+    df_duplicados['Total_Questoes_Real'] = df_duplicados['Total_Questoes_Real'].astype('Int64')
+    return df_nomes, df_respostas, df_duplicados
@@ -0,0 +1,75 @@
+# Escrita das planilhas Excel com motores intercambiáveis
+# Formatador de Dados Escolares - 'openpyxl' (padrão) ou 'streaming' (memória constante)
+
+from importacao_tardia import ModuloTardio
+
+pd = ModuloTardio('pandas')
+
+MOTORES_EXCEL = ('openpyxl', 'streaming')
+
+# Linhas convertidas por vez no modo streaming
+LINHAS_POR_BLOCO = 5000
+
+def _blocos_de_linhas(df, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Gera as linhas do DataFrame como listas Python, bloco a bloco (vazios viram None)."""
+    for inicio in range(0, len(df), linhas_por_bloco):
+        bloco = df.iloc[inicio:inicio + linhas_por_bloco].astype(object)
+        bloco = bloco.where(bloco.notna(), None)
+        yield from zip(*(bloco[coluna].tolist() for coluna in bloco.columns))
+
+def _escrever_xlsxwriter(destino, abas):
+    """xlsxwriter em constant_memory: cada linha vai para o disco assim que é escrita."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True})
+    negrito = workbook.add_format({'bold': True})
+    try:
+        for nome_aba, df in abas:
+            worksheet = workbook.add_worksheet(nome_aba)
+            worksheet.write_row(0, 0, [str(coluna) for coluna in df.columns], negrito)
+            for numero, linha in enumerate(_blocos_de_linhas(df), start=1):
+                worksheet.write_row(numero, 0, linha)
+    finally:
+        workbook.close()
+
+def _escrever_openpyxl_write_only(destino, abas):
+    """openpyxl em modo write-only (usado quando o xlsxwriter não está instalado)."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    for nome_aba, df in abas:
+        worksheet = workbook.create_sheet(nome_aba)
+        cabecalho = []
+        for coluna in df.columns:
+            celula = WriteOnlyCell(worksheet, value=str(coluna))
+            celula.font = Font(bold=True)
+            cabecalho.append(celula)
+        worksheet.append(cabecalho)
+        for linha in _blocos_de_linhas(df):
+            worksheet.append(linha)
+    workbook.save(destino)
+
+def escrever_planilhas(destino, abas, motor='openpyxl'):
+    """
+    Grava as abas (pares nome_aba, DataFrame) em um arquivo .xlsx ou buffer.
+    motor='openpyxl': pd.ExcelWriter, monta a pasta de trabalho inteira em memória.
+    motor='streaming': escreve linha a linha com memória praticamente constante
+    (xlsxwriter constant_memory, ou openpyxl write-only como alternativa).
+    """
+    if motor not in MOTORES_EXCEL:
+        raise ValueError(f"Motor de Excel inválido: {motor} (use {', '.join(MOTORES_EXCEL)})")
+
+    if motor == 'openpyxl':
+        with pd.ExcelWriter(destino, engine='openpyxl') as writer:
+            for nome_aba, df in abas:
+                df.to_excel(writer, sheet_name=nome_aba, index=False)
+        return
+
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        _escrever_openpyxl_write_only(destino, abas)
+    else:
+        _escrever_xlsxwriter(destino, abas)
@@ -0,0 +1,63 @@
+# Exportação colunar dos resultados (Parquet, Feather e CSV compactado)
+# Formatador de Dados Escolares - alternativa rápida ao Excel para análises em lote
+
+import os
+
+FORMATOS_COLUNARES = ('parquet', 'feather', 'csv.gz')
+
+# Linhas gravadas por vez no CSV compactado
+LINHAS_POR_BLOCO_CSV = 50000
+
+MIME_FORMATOS = {
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+    'csv.gz': 'application/gzip'
+}
+
+def pyarrow_disponivel():
+    """Parquet e Feather dependem do pyarrow (opcional)."""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def formatos_disponiveis():
+    """Formatos que podem ser gerados neste ambiente."""
+    if pyarrow_disponivel():
+        return FORMATOS_COLUNARES
+    return ('csv.gz',)
+
+def exportar_tabela(df, destino, formato):
+    """
+    Grava um DataFrame em destino (caminho ou buffer binário) no formato pedido,
+    sem passar pelo openpyxl.
+    """
+    if formato not in FORMATOS_COLUNARES:
+        raise ValueError(f"Formato inválido: {formato} (use {', '.join(FORMATOS_COLUNARES)})")
+    if formato != 'csv.gz' and not pyarrow_disponivel():
+        raise ImportError(f"O formato {formato} requer o pacote pyarrow (pip install pyarrow)")
+
+    # Parquet/Feather exigem nomes de coluna em texto e índice simples
+    df = df.reset_index(drop=True)
+    df.columns = [str(coluna) for coluna in df.columns]
+
+    if formato == 'parquet':
+        df.to_parquet(destino, index=False)
+    elif formato == 'feather':
+        df.to_feather(destino)
+    else:
+        df.to_csv(destino, index=False, compression='gzip', chunksize=LINHAS_POR_BLOCO_CSV)
+
+def exportar_colunar(tabelas, pasta, prefixo, formatos):
+    """
+    Exporta cada tabela (dict nome -> DataFrame) em cada formato pedido.
+    Os arquivos seguem o padrão <prefixo>_<nome>.<formato>. Retorna os caminhos gerados.
+    """
+    caminhos = []
+    for formato in formatos:
+        for nome, df in tabelas.items():
+            caminho = os.path.join(pasta, f"{prefixo}_{nome}.{formato}")
+            exportar_tabela(df, caminho, formato)
+            caminhos.append(caminho)
+    return caminhos
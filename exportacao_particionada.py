@@ -0,0 +1,94 @@
+# Exportação de uma pasta de trabalho por sala ou por série, empacotadas em ZIP
+# Formatador de Dados Escolares - partição com um único groupby e arquivos gravados em paralelo
+
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from escrita_excel import escrever_planilhas
+from processos import contexto_processos
+
+# Partições disponíveis: nome -> colunas do agrupamento (a sala é sempre separada por série)
+PARTICOES = {
+    'Sala': ['Serie', 'Sala'],
+    'Serie': ['Serie']
+}
+
+def _agrupar(df, colunas):
+    """Particiona o DataFrame com um único groupby -> dict chave (tupla) -> DataFrame."""
+    return {chave if isinstance(chave, tuple) else (chave,): grupo
+            for chave, grupo in df.groupby(colunas, observed=True, sort=True)}
+
+def nome_arquivo_particao(chave, prefixo='Resultados'):
+    """Nome seguro do arquivo de uma partição: Resultados_9º_Ano_1CM.xlsx"""
+    partes = [re.sub(r'[^\w-]+', '_', str(valor)).strip('_') for valor in chave]
+    return f"{prefixo}_{'_'.join(parte for parte in partes if parte)}.xlsx"
+
+def montar_particoes(df_final, por='Sala', df_correcao=None, tabelas_itens=None, prefixo='Resultados'):
+    """
+    Divide os resultados em uma pasta de trabalho por partição (ver PARTICOES).
+    Cada uma tem os dados dos seus alunos (Dados_Completos), a correção por questão
+    (Correcao_Questoes) e as tabelas de análise de itens que têm as colunas da partição.
+    Retorna uma lista de (nome_arquivo, abas), com abas em pares (nome_aba, DataFrame).
+    """
+    if por not in PARTICOES:
+        raise ValueError(f"Partição inválida: {por} (use {', '.join(PARTICOES)})")
+    colunas = PARTICOES[por]
+
+    # Cada tabela é particionada uma única vez; as partições são montadas por chave
+    tabelas = [('Dados_Completos', _agrupar(df_final, colunas))]
+    if df_correcao is not None and not df_correcao.empty:
+        tabelas.append(('Correcao_Questoes', _agrupar(df_correcao, colunas)))
+    for nome_aba, df_itens in (tabelas_itens or {}).items():
+        if set(colunas) <= set(df_itens.columns):
+            tabelas.append((nome_aba, _agrupar(df_itens, colunas)))
+
+    particoes = []
+    for chave, df_particao in tabelas[0][1].items():
+        abas = [('Dados_Completos', df_particao)]
+        abas.extend((nome_aba, grupos[chave]) for nome_aba, grupos in tabelas[1:] if chave in grupos)
+        particoes.append((nome_arquivo_particao(chave, prefixo), abas))
+    return particoes
+
+def _gravar_pasta_trabalho(nome_arquivo, abas, motor_excel):
+    """Worker: grava uma pasta de trabalho em memória e devolve (nome_arquivo, bytes)."""
+    buffer = io.BytesIO()
+    escrever_planilhas(buffer, abas, motor=motor_excel)
+    return nome_arquivo, buffer.getvalue()
+
+def exportar_particionado(destino, df_final, por='Sala', motor_excel='openpyxl', max_workers=None,
+                          df_correcao=None, tabelas_itens=None, prefixo='Resultados', progresso=None):
+    """
+    Grava um .xlsx por sala (ou série) dentro de um ZIP em destino (caminho ou buffer).
+    As pastas de trabalho são geradas em processos separados (max_workers: None = todos
+    os núcleos, 1 = sequencial) e cada uma entra no ZIP assim que fica pronta.
+    progresso: chamada com (nome_arquivo, concluidos, total) a cada arquivo gravado.
+    Retorna os nomes dos arquivos gravados no ZIP, em ordem alfabética.
+    """
+    particoes = montar_particoes(df_final, por, df_correcao, tabelas_itens, prefixo)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(particoes)))
+
+    nomes = []
+    # .xlsx já é compactado; ZIP_STORED evita comprimir de novo
+    with zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+        def guardar(nome_arquivo, conteudo):
+            arquivo_zip.writestr(nome_arquivo, conteudo)
+            nomes.append(nome_arquivo)
+            if progresso:
+                progresso(nome_arquivo, len(nomes), len(particoes))
+
+        if max_workers == 1:
+            for nome_arquivo, abas in particoes:
+                guardar(*_gravar_pasta_trabalho(nome_arquivo, abas, motor_excel))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto_processos()) as executor:
+                futuros = [executor.submit(_gravar_pasta_trabalho, nome_arquivo, abas, motor_excel)
+                           for nome_arquivo, abas in particoes]
+                for futuro in as_completed(futuros):
+                    guardar(*futuro.result())
+
+    return sorted(nomes)
@@ -1,42 +1,78 @@
-import pandas as pd
 import re
 import os
-import glob
+import gzip
+import io
+import mmap
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
+from contextlib import contextmanager
 from datetime import datetime
 
-def detectar_arquivos_automaticamente():
+from importacao_tardia import ModuloTardio
+
+from analise_itens import analisar_itens
+from cache_arquivos import PASTA_CACHE_PADRAO, carregar_ou_processar, limpar_cache
+from correcao import carregar_gabaritos, corrigir_respostas
+from duplicados import POLITICA_PADRAO, POLITICAS_DUPLICADOS, deduplicar
+from descoberta_arquivos import (ARQUIVO_INDICE_PADRAO, IGNORAR_PADRAO, PODAR_PADRAO, carregar_indice,
+                                 salvar_indice, varrer_arquivos)
+from escrita_excel import MOTORES_EXCEL, escrever_planilhas
+from historico import ARQUIVO_HISTORICO_PADRAO, gravar_rodada, nome_rodada_padrao
+from exportacao_colunar import FORMATOS_COLUNARES, exportar_colunar, exportar_tabela
+from exportacao_particionada import PARTICOES, exportar_particionado
+from instrumentacao import (SAIDAS_METRICAS, configuracao_atual, configurar, etapa, mensagem,
+                            registrar_span)
+from matriz_respostas import expandir_questoes
+from processos import contexto_processos
+from recuperacao_pares import sugerir_pareamentos
+
+# numpy e pandas só são importados no primeiro uso (--help e a detecção de arquivos não precisam deles)
+np = ModuloTardio('numpy')
+pd = ModuloTardio('pandas')
+
+# Esquema compacto (opcional): colunas com poucos valores distintos viram Categorical
+COLUNAS_CATEGORICAS = ('Serie', 'Sala', 'Arquivo_Origem')
+CATEGORIAS_SERIE = ['8º Ano', '9º Ano', '1ª Série', '2ª Série', 'Série não identificada']
+
+# Abas separadas por série, na ordem em que aparecem no Excel
+NOMES_ABAS_SERIES = {
+    '8º Ano': '8_Ano',
+    '9º Ano': '9_Ano',
+    '1ª Série': '1_Serie',
+    '2ª Série': '2_Serie'
+}
+
+def detectar_arquivos_automaticamente(verbose=True, raiz='.', profundidade_maxima=None, podar=PODAR_PADRAO,
+                                      ignorar=IGNORAR_PADRAO, indice=None, arquivo_indice=None):
     """
-    Detecta automaticamente todos os arquivos de nomes e respostas na pasta atual e subpastas.
+    Detecta automaticamente todos os arquivos de nomes e respostas na pasta atual e subpastas,
+    em uma única varredura (ver descoberta_arquivos.varrer_arquivos).
+    indice: dict reaproveitado entre chamadas (modo observação); arquivo_indice: índice
+    salvo em disco entre execuções, revalidado pelo mtime de cada pasta.
     """
-    print("🔍 DETECTANDO ARQUIVOS AUTOMATICAMENTE...")
-    
-    # Padrões para detectar arquivos
-    padroes_nomes = ['**/nomes*.txt', '**/nome*.txt', 'nomes*.txt', 'nome*.txt']
-    padroes_respostas = ['**/respostas*.txt', '**/resposta*.txt', 'respostas*.txt', 'resposta*.txt']
-    
-    arquivos_nomes = []
-    arquivos_respostas = []
+    if verbose:
+        mensagem("🔍 DETECTANDO ARQUIVOS AUTOMATICAMENTE...")
     
-    # Buscar arquivos de nomes
-    for padrao in padroes_nomes:
-        arquivos_nomes.extend(glob.glob(padrao, recursive=True))
+    if arquivo_indice and indice is None:
+        indice = carregar_indice(arquivo_indice)
     
-    # Buscar arquivos de respostas
-    for padrao in padroes_respostas:
-        arquivos_respostas.extend(glob.glob(padrao, recursive=True))
+    arquivos_nomes, arquivos_respostas = varrer_arquivos(raiz, profundidade_maxima, podar, ignorar, indice)
     
-    # Remover duplicatas e ordenar
-    arquivos_nomes = sorted(list(set(arquivos_nomes)))
-    arquivos_respostas = sorted(list(set(arquivos_respostas)))
+    if arquivo_indice:
+        try:
+            salvar_indice(indice, arquivo_indice)
+        except OSError as e:
+            mensagem(f"⚠️ Não foi possível gravar o índice de pastas: {e}")
     
-    print(f"📁 Arquivos de nomes encontrados: {len(arquivos_nomes)}")
-    for arquivo in arquivos_nomes:
-        print(f"   - {arquivo}")
-    
-    print(f"📁 Arquivos de respostas encontrados: {len(arquivos_respostas)}")
-    for arquivo in arquivos_respostas:
-        print(f"   - {arquivo}")
+    if verbose:
+        mensagem(f"📁 Arquivos de nomes encontrados: {len(arquivos_nomes)}")
+        for arquivo in arquivos_nomes:
+            mensagem(f"   - {arquivo}")
+        
+        mensagem(f"📁 Arquivos de respostas encontrados: {len(arquivos_respostas)}")
+        for arquivo in arquivos_respostas:
+            mensagem(f"   - {arquivo}")
     
     return arquivos_nomes, arquivos_respostas
 
@@ -62,17 +98,61 @@ def extrair_serie_do_nome_arquivo(nome_arquivo):
 
 # Função de gráficos removida conforme solicitação do usuário
 
-def processar_nomes_txt_v3(file_path):
+# Versão da saída dos parsers (invalida o cache de arquivos quando muda)
+VERSAO_PARSER = '4.1'
+
+# Abaixo deste volume total (bytes) o modo 'auto' usa threads em vez de processos
+LIMITE_BYTES_THREADS = 2 * 1024 * 1024
+
+# Tamanho padrão dos lotes na leitura em streaming (linhas por DataFrame)
+TAMANHO_LOTE_PADRAO = 50000
+
+def _nome_fonte(fonte, nome_arquivo=None):
+    """Nome usado para detectar a série e preencher Arquivo_Origem."""
+    if nome_arquivo:
+        return nome_arquivo
+    if isinstance(fonte, (str, os.PathLike)):
+        return os.fspath(fonte)
+    return getattr(fonte, 'name', '<memória>')
+
+@contextmanager
+def _abrir_texto(fonte):
     """
-    Processa o arquivo de nomes, extraindo Código, Nome e Sala (incluindo todas as salas especificadas).
-    Agora com suporte a detecção automática de série.
+    Abre a fonte como texto UTF-8, sem passar pelo disco quando já está em memória.
+    Aceita caminho, bytes/bytearray/memoryview (ex.: UploadedFile.getbuffer()),
+    buffer binário ou stream de texto. Streams recebidos não são fechados.
     """
-    dados_nomes = []
+    if isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, 'r', encoding='utf-8') as f:
+            yield f
+    elif isinstance(fonte, (bytes, bytearray, memoryview)):
+        yield io.TextIOWrapper(io.BytesIO(fonte), encoding='utf-8')
+    elif isinstance(fonte, io.TextIOBase):
+        yield fonte
+    else:
+        texto = io.TextIOWrapper(fonte, encoding='utf-8')
+        try:
+            yield texto
+        finally:
+            texto.detach()  # devolve o buffer ao chamador sem fechá-lo
+
+def _em_lotes(registros, tamanho_lote):
+    """Agrupa registros (dicts) em DataFrames de no máximo tamanho_lote linhas."""
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamanho_lote:
+            yield pd.DataFrame(lote)
+            lote = []
+    if lote:
+        yield pd.DataFrame(lote)
+
+def _registros_nomes(fonte, nome_arquivo=None):
+    """Lê o arquivo de nomes linha a linha, gerando um registro por aluno."""
     sala_atual = ""
+    file_path = _nome_fonte(fonte, nome_arquivo)
     serie_arquivo = extrair_serie_do_nome_arquivo(file_path)
     
-    print(f"\n📖 Processando nomes: {file_path} ({serie_arquivo})")
-    
     # Padrões de salas suportadas
     padroes_salas = [
         r'(\d+CM)\s*-\s*9º\s*Ano',
@@ -88,116 +168,236 @@ def processar_nomes_txt_v3(file_path):
         r'(\d+EM)'
     ]
     
+    with _abrir_texto(fonte) as f:
+        for linha in f:
+            linha = linha.strip()
+            
+            # Procura por linhas de Sala usando todos os padrões
+            sala_encontrada = False
+            for padrao in padroes_salas:
+                sala_match = re.search(padrao, linha, re.IGNORECASE)
+                if sala_match:
+                    sala_atual = sala_match.group(1).upper()
+                    mensagem(f"🏫 Sala encontrada: {sala_atual}")
+                    sala_encontrada = True
+                    break
+            
+            if sala_encontrada:
+                continue
+            
+            # Procura por linhas de cabeçalho
+            if 'Código Aluno' in linha or 'Código' in linha:
+                continue
+            
+            # Procura por linhas com o código do aluno
+            if re.match(r'^\d+\.\d+', linha):
+                parts = linha.split('\t')
+                codigo = parts[0].strip()
+                # A coluna do nome pode variar, vamos encontrar a mais provável
+                nome_parts = [p.strip() for p in parts if p.strip() and not re.match(r'^\d+\.?\d*$', p)]
+                if nome_parts:
+                    nome = nome_parts[0]
+                    if codigo and nome:
+                        # Remover pontos - só números
+                        codigo_sem_ponto = codigo.replace('.', '')
+                        yield {
+                            'ID_Nome': codigo_sem_ponto,
+                            'Nome': nome,
+                            'Sala': sala_atual if sala_atual else 'Sala_Não_Identificada',
+                            'Serie': serie_arquivo,
+                            'ID_Normalizado': codigo_sem_ponto.strip(),
+                            'Arquivo_Origem': file_path
+                        }
+
+def _registros_respostas(fonte, nome_arquivo=None):
+    """Lê o arquivo de respostas linha a linha, gerando um registro por cartão."""
+    file_path = _nome_fonte(fonte, nome_arquivo)
+    serie_arquivo = extrair_serie_do_nome_arquivo(file_path)
+    
+    with _abrir_texto(fonte) as f:
+        for linha in f:
+            linha = linha.strip()
+            if linha:
+                # Padrão modificado para incluir asteriscos e outros caracteres
+                match = re.search(r'N\s*(\d+)\s*([A-E*]+)', linha)
+                if match:
+                    codigo_completo = match.group(1).strip()
+                    respostas_string = match.group(2).strip()
+                    
+                    # Normalizar código (remove último dígito e zeros à esquerda)
+                    codigo_normalizado = codigo_completo[:-1].lstrip('0')
+                    
+                    # As respostas ficam só na string; as colunas Q001, Q002, ... são
+                    # geradas na exportação a partir da matriz compacta (expandir_questoes)
+                    yield {
+                        'ID_Resposta': codigo_completo,
+                        'Respostas_String': respostas_string,
+                        'ID_Normalizado': codigo_normalizado,
+                        'Serie': serie_arquivo,
+                        'Total_Questoes_Real': len(respostas_string),  # Quantas questões realmente tem
+                        'Arquivo_Origem': file_path
+                    }
+
+# Leitura rápida das respostas direto dos bytes (arquivos ASCII): equivale a aplicar
+# r'N\s*(\d+)\s*([A-E*]+)' em cada linha. O ^ com MULTILINE e o prefixo sem quebra de
+# linha mantêm uma busca por linha (primeira ocorrência); \s e \d viram as classes ASCII
+# equivalentes sem \r/\n, para o casamento não atravessar linhas.
+_ESPACO_LINHA = rb'[ \t\f\v\x1c-\x1f]*'
+PADRAO_RESPOSTAS_BYTES = re.compile(
+    rb'^[^\r\n]*?N' + _ESPACO_LINHA + rb'([0-9]+)' + _ESPACO_LINHA + rb'([A-E*]+)', re.MULTILINE
+)
+_PADRAO_CR_ISOLADO = re.compile(rb'\r(?!\n)')
+_BLOCO_VERIFICACAO = 1 << 20
+
+def _leitura_bytes_segura(buffer):
+    """
+    True se o buffer pode ser lido pelo atalho em bytes: só ASCII e sem \r sozinho
+    como quebra de linha (que o modo texto trataria como fim de linha).
+    Verificado em blocos de 1 MB com bytes.isascii, bem mais rápido que uma regex.
+    """
+    tem_cr = False
+    for inicio in range(0, len(buffer), _BLOCO_VERIFICACAO):
+        bloco = bytes(buffer[inicio:inicio + _BLOCO_VERIFICACAO])
+        if not bloco.isascii():
+            return False
+        tem_cr = tem_cr or b'\r' in bloco
+    return not (tem_cr and _PADRAO_CR_ISOLADO.search(buffer))
+
+@contextmanager
+def _abrir_bytes(fonte):
+    """
+    Conteúdo da fonte como buffer de bytes sem cópia: arquivo mapeado em memória
+    (mmap) ou o próprio bytes/memoryview. None para streams e arquivos vazios.
+    """
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        yield fonte
+    elif isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield None
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer
+    else:
+        yield None
+
+def _lotes_respostas_bytes(buffer, file_path, tamanho_lote):
+    """
+    Extrai os cartões com um único finditer sobre o buffer inteiro e monta os
+    DataFrames por coluna, sem decodificar nem criar um dict por linha.
+    """
+    serie_arquivo = extrair_serie_do_nome_arquivo(file_path)
+    codigos = []
+    respostas = []
+    for match in PADRAO_RESPOSTAS_BYTES.finditer(buffer):
+        codigo, resposta = match.group(1, 2)
+        codigos.append(codigo)
+        respostas.append(resposta)
+        if len(codigos) >= tamanho_lote:
+            yield _df_respostas_bytes(codigos, respostas, serie_arquivo, file_path)
+            codigos = []
+            respostas = []
+    if codigos:
+        yield _df_respostas_bytes(codigos, respostas, serie_arquivo, file_path)
+
+def _df_respostas_bytes(codigos, respostas, serie_arquivo, file_path):
+    """Mesmas colunas de _registros_respostas; a decodificação é feita em bloco."""
+    codigos = b'\n'.join(codigos).decode('ascii').split('\n')
+    respostas = b'\n'.join(respostas).decode('ascii').split('\n')
+    return pd.DataFrame({
+        'ID_Resposta': codigos,
+        'Respostas_String': respostas,
+        'ID_Normalizado': [codigo[:-1].lstrip('0') for codigo in codigos],
+        'Serie': serie_arquivo,
+        'Total_Questoes_Real': [len(resposta) for resposta in respostas],
+        'Arquivo_Origem': file_path
+    })
+
+def iterar_nomes_txt(fonte, tamanho_lote=TAMANHO_LOTE_PADRAO, nome_arquivo=None):
+    """
+    Versão em streaming de processar_nomes_txt_v3: gera DataFrames de até
+    tamanho_lote alunos enquanto o arquivo é lido, com memória limitada.
+    """
+    return _em_lotes(_registros_nomes(fonte, nome_arquivo), tamanho_lote)
+
+def iterar_respostas_txt(fonte, tamanho_lote=TAMANHO_LOTE_PADRAO, nome_arquivo=None):
+    """
+    Versão em streaming de processar_respostas_txt_v4: gera DataFrames de até
+    tamanho_lote cartões enquanto o arquivo é lido, com memória limitada.
+    Caminhos e bytes ASCII são lidos direto do buffer (mmap); o restante,
+    linha a linha como texto.
+    """
+    file_path = _nome_fonte(fonte, nome_arquivo)
+    with _abrir_bytes(fonte) as buffer:
+        if buffer is not None and _leitura_bytes_segura(buffer):
+            yield from _lotes_respostas_bytes(buffer, file_path, tamanho_lote)
+            return
+        if buffer is None and isinstance(fonte, (str, os.PathLike)):
+            return  # arquivo vazio
+    yield from _em_lotes(_registros_respostas(fonte, file_path), tamanho_lote)
+
+def consumir_lotes(lotes, destino=None, compacto=False):
+    """
+    Consome os lotes gerados por iterar_nomes_txt / iterar_respostas_txt.
+    Sem destino, concatena tudo em um DataFrame. Com destino (.csv ou .csv.gz),
+    grava cada lote assim que chega e retorna o total de linhas gravadas.
+    """
+    if destino is None:
+        frames = list(lotes)
+        if not frames:
+            return pd.DataFrame()
+        return concatenar_dados(frames, compacto)
+    
+    abrir = gzip.open if str(destino).endswith('.gz') else open
+    total_linhas = 0
+    with abrir(destino, 'wt', encoding='utf-8', newline='') as f:
+        for lote in lotes:
+            lote.to_csv(f, header=(total_linhas == 0), index=False)
+            total_linhas += len(lote)
+    return total_linhas
+
+def processar_nomes_txt_v3(fonte, nome_arquivo=None):
+    """
+    Processa o arquivo de nomes, extraindo Código, Nome e Sala (incluindo todas as salas especificadas).
+    Agora com suporte a detecção automática de série.
+    fonte: caminho, bytes, buffer ou stream de texto (nome_arquivo define a série quando não é caminho).
+    """
+    file_path = _nome_fonte(fonte, nome_arquivo)
+    serie_arquivo = extrair_serie_do_nome_arquivo(file_path)
+    
+    mensagem(f"\n📖 Processando nomes: {file_path} ({serie_arquivo})")
+    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for linha in f:
-                linha = linha.strip()
-                
-                # Procura por linhas de Sala usando todos os padrões
-                sala_encontrada = False
-                for padrao in padroes_salas:
-                    sala_match = re.search(padrao, linha, re.IGNORECASE)
-                    if sala_match:
-                        sala_atual = sala_match.group(1).upper()
-                        print(f"🏫 Sala encontrada: {sala_atual}")
-                        sala_encontrada = True
-                        break
-                
-                if sala_encontrada:
-                    continue
-                
-                # Procura por linhas de cabeçalho
-                if 'Código Aluno' in linha or 'Código' in linha:
-                    continue
-                
-                # Procura por linhas com o código do aluno
-                if re.match(r'^\d+\.\d+', linha):
-                    parts = linha.split('\t')
-                    codigo = parts[0].strip()
-                    # A coluna do nome pode variar, vamos encontrar a mais provável
-                    nome_parts = [p.strip() for p in parts if p.strip() and not re.match(r'^\d+\.?\d*$', p)]
-                    if nome_parts:
-                        nome = nome_parts[0]
-                        if codigo and nome:
-                            # Remover pontos - só números
-                            codigo_sem_ponto = codigo.replace('.', '')
-                            dados_nomes.append({
-                                'ID_Nome': codigo_sem_ponto,
-                                'Nome': nome,
-                                'Sala': sala_atual if sala_atual else 'Sala_Não_Identificada',
-                                'Serie': serie_arquivo,
-                                'ID_Normalizado': codigo_sem_ponto.strip(),
-                                'Arquivo_Origem': file_path
-                            })
-        
-        df_nomes = pd.DataFrame(dados_nomes)
-        print(f"✅ nomes.txt processado: {len(df_nomes)} registros")
+        df_nomes = consumir_lotes(iterar_nomes_txt(fonte, nome_arquivo=file_path))
+        mensagem(f"✅ nomes.txt processado: {len(df_nomes)} registros")
         
         # Mostrar resumo das salas
         if not df_nomes.empty:
-            print(f"📊 Resumo das salas encontradas:")
+            mensagem(f"📊 Resumo das salas encontradas:")
             salas_count = df_nomes['Sala'].value_counts()
             for sala, count in salas_count.items():
-                print(f"   {sala}: {count} alunos")
+                mensagem(f"   {sala}: {count} alunos")
         
         return df_nomes
         
     except Exception as e:
-        print(f"❌ Erro ao processar nomes.txt: {e}")
+        mensagem(f"❌ Erro ao processar nomes.txt: {e}")
         return pd.DataFrame()
 
-def processar_respostas_txt_v4(file_path):
+def processar_respostas_txt_v4(fonte, nome_arquivo=None):
     """
     Processa o arquivo de respostas, extraindo o código e separando cada resposta.
     Agora com suporte a detecção automática de série.
+    fonte: caminho, bytes, buffer ou stream de texto (nome_arquivo define a série quando não é caminho).
     """
-    dados_respostas = []
-    max_questoes = 200  # AJUSTE AQUI: Máximo de questões a processar (expandido para 200)
+    file_path = _nome_fonte(fonte, nome_arquivo)
     serie_arquivo = extrair_serie_do_nome_arquivo(file_path)
     
-    print(f"\n📝 Processando respostas: {file_path} ({serie_arquivo})")
+    mensagem(f"\n📝 Processando respostas: {file_path} ({serie_arquivo})")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for linha in f:
-                linha = linha.strip()
-                if linha:
-                    # Padrão modificado para incluir asteriscos e outros caracteres
-                    match = re.search(r'N\s*(\d+)\s*([A-E*]+)', linha)
-                    if match:
-                        codigo_completo = match.group(1).strip()
-                        respostas_string = match.group(2).strip()
-                        
-                        # Normalizar código (remove último dígito e zeros à esquerda)
-                        codigo_normalizado = codigo_completo[:-1].lstrip('0')
-                        
-                        # Separar cada resposta individual PRESERVANDO ASTERISCOS
-                        respostas_lista = list(respostas_string)
-                        
-                        # Criar dicionário com todas as respostas
-                        registro = {
-                            'ID_Resposta': codigo_completo,
-                            'Respostas_String': respostas_string,
-                            'ID_Normalizado': codigo_normalizado,
-                            'Serie': serie_arquivo,
-                            'Total_Questoes_Real': len(respostas_lista),  # Quantas questões realmente tem
-                            'Arquivo_Origem': file_path
-                        }
-                        
-                        # Adicionar cada resposta como uma coluna (Q001, Q002, Q003, ...) ATÉ O MÁXIMO
-                        # PRESERVANDO ASTERISCOS nas posições exatas
-                        for i in range(1, max_questoes + 1):
-                            if i <= len(respostas_lista):
-                                # Se existe a resposta, usa ela (incluindo asteriscos)
-                                registro[f'Q{i:03d}'] = respostas_lista[i-1]
-                            else:
-                                # Se não existe, deixa vazio
-                                registro[f'Q{i:03d}'] = ''
-                        
-                        dados_respostas.append(registro)
-        
-        df_respostas = pd.DataFrame(dados_respostas)
-        print(f"✅ respostas.txt processado: {len(df_respostas)} registros")
+        df_respostas = consumir_lotes(iterar_respostas_txt(fonte, nome_arquivo=file_path))
+        mensagem(f"✅ respostas.txt processado: {len(df_respostas)} registros")
         
         if not df_respostas.empty:
             # Mostrar estatísticas das questões
@@ -205,105 +405,237 @@ def processar_respostas_txt_v4(file_path):
             questoes_min = df_respostas['Total_Questoes_Real'].min()
             questoes_media = round(df_respostas['Total_Questoes_Real'].mean(), 1)
             
-            print(f"📝 Questões encontradas:")
-            print(f"   Máximo: {questoes_reais} questões")
-            print(f"   Mínimo: {questoes_min} questões") 
-            print(f"   Média: {questoes_media} questões")
-            print(f"   Colunas criadas: Q001 até Q{max_questoes:03d} (máximo configurado: {max_questoes})")
-            
-            if questoes_reais > max_questoes:
-                print(f"⚠️  ATENÇÃO: Alguns cartões têm mais questões ({questoes_reais}) do que o configurado ({max_questoes})")
-                print(f"   Para processar todas, altere 'max_questoes = {questoes_reais}' no código")
+            mensagem(f"📝 Questões encontradas:")
+            mensagem(f"   Máximo: {questoes_reais} questões")
+            mensagem(f"   Mínimo: {questoes_min} questões") 
+            mensagem(f"   Média: {questoes_media} questões")
+            mensagem(f"   Colunas na exportação: Q001 até Q{questoes_reais:03d}")
         
         return df_respostas
         
     except Exception as e:
-        print(f"❌ Erro ao processar respostas.txt: {e}")
+        mensagem(f"❌ Erro ao processar respostas.txt: {e}")
         return pd.DataFrame()
 
-# Função separar_por_salas removida conforme solicitação do usuário
+def _processar_com_tempo(funcao, arquivo, pasta_cache=None, configuracao=None):
+    """
+    Executa o parser (ou lê do cache) em um worker e mede o tempo gasto no arquivo.
+    arquivo: caminho ou tupla (nome_arquivo, conteúdo em memória).
+    configuracao: instrumentação do processo principal (workers não a herdam no Windows).
+    """
+    if configuracao:
+        configurar(**configuracao)
+    inicio = time.perf_counter()
+    if isinstance(arquivo, tuple):
+        nome_arquivo, conteudo = arquivo
+        df = funcao(conteudo, nome_arquivo=nome_arquivo)
+    elif pasta_cache:
+        df = carregar_ou_processar(funcao, arquivo, VERSAO_PARSER, pasta_cache)
+    else:
+        df = funcao(arquivo)
+    return df, time.perf_counter() - inicio
+
+def _tamanho_arquivo(arquivo):
+    """Tamanho em bytes de um caminho ou de uma tupla (nome_arquivo, conteúdo)."""
+    if isinstance(arquivo, tuple):
+        return memoryview(arquivo[1]).nbytes
+    return os.path.getsize(arquivo)
 
-def main():
-    print("🚀 FORMATADOR UNIFICADO - DETECÇÃO AUTOMÁTICA E ANÁLISES AVANÇADAS")
-    print("=" * 80)
+class ProcessamentoCancelado(Exception):
+    """O processamento foi interrompido a pedido do usuário."""
+
+def _nome_entrada(arquivo):
+    """Nome de exibição de um caminho ou de uma tupla (nome_arquivo, conteúdo)."""
+    return arquivo[0] if isinstance(arquivo, tuple) else arquivo
+
+def executar_parsers(arquivos_nomes, arquivos_respostas, max_workers=None, modo='auto', pasta_cache=None,
+                     progresso=None, cancelamento=None):
+    """
+    Executa os parsers de nomes e respostas em paralelo, mantendo a ordem de entrada.
+    max_workers: número de workers (None = todos os núcleos, 1 = sequencial).
+    modo: 'processos', 'threads' ou 'auto' (threads para volumes pequenos).
+    Cada arquivo pode ser um caminho ou uma tupla (nome_arquivo, conteúdo em bytes).
+    pasta_cache: se informada, arquivos sem alteração são lidos do cache em disco.
+    progresso: chamada a cada arquivo concluído, na ordem de conclusão, com
+    (nome_arquivo, tipo, registros, segundos).
+    cancelamento: threading.Event; quando acionado, os arquivos ainda não iniciados são
+    descartados e ProcessamentoCancelado é lançada.
+    Retorna uma lista de (nome_arquivo, tipo, DataFrame, segundos, bytes), um item por arquivo.
+    """
+    tarefas = [(processar_nomes_txt_v3, arquivo, 'nomes') for arquivo in arquivos_nomes]
+    tarefas += [(processar_respostas_txt_v4, arquivo, 'respostas') for arquivo in arquivos_respostas]
+    if not tarefas:
+        return []
     
-    # Detectar arquivos automaticamente
-    arquivos_nomes, arquivos_respostas = detectar_arquivos_automaticamente()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(tarefas)))
     
-    if not arquivos_nomes or not arquivos_respostas:
-        print("❌ Nenhum arquivo encontrado. Verifique se existem arquivos com 'nomes' e 'respostas' no nome.")
-        return
+    if modo == 'auto':
+        total_bytes = sum(_tamanho_arquivo(arquivo) for _, arquivo, _ in tarefas)
+        modo = 'threads' if total_bytes < LIMITE_BYTES_THREADS else 'processos'
     
-    # Processar todos os arquivos
-    todos_nomes = []
-    todas_respostas = []
+    funcoes = [funcao for funcao, _, _ in tarefas]
+    arquivos = [arquivo for _, arquivo, _ in tarefas]
+    if modo == 'processos' and max_workers > 1:
+        # memoryview não é serializável entre processos
+        arquivos = [(a[0], bytes(a[1])) if isinstance(a, tuple) else a for a in arquivos]
     
-    # Processar arquivos de nomes
-    for arquivo in arquivos_nomes:
-        df_nomes = processar_nomes_txt_v3(arquivo)
-        if not df_nomes.empty:
-            todos_nomes.append(df_nomes)
+    def avisar(indice, resultado):
+        if progresso is not None:
+            df, segundos = resultado
+            progresso(_nome_entrada(arquivos[indice]), tarefas[indice][2], len(df), segundos)
     
-    # Processar arquivos de respostas
-    for arquivo in arquivos_respostas:
-        df_respostas = processar_respostas_txt_v4(arquivo)
-        if not df_respostas.empty:
-            todas_respostas.append(df_respostas)
+    def ao_concluir(indice, futuro):
+        if not futuro.cancelled() and futuro.exception() is None:
+            avisar(indice, futuro.result())
     
-    if not todos_nomes or not todas_respostas:
-        print("❌ Erro ao processar arquivos")
-        return
+    def verificar_cancelamento():
+        if cancelamento is not None and cancelamento.is_set():
+            raise ProcessamentoCancelado("Processamento cancelado")
     
-    # Consolidar todos os dados
-    print("\n🔗 CONSOLIDANDO TODOS OS DADOS...")
-    df_nomes = pd.concat(todos_nomes, ignore_index=True)
-    df_respostas = pd.concat(todas_respostas, ignore_index=True)
+    if max_workers == 1:
+        resultados = []
+        for indice, (funcao, arquivo) in enumerate(zip(funcoes, arquivos)):
+            verificar_cancelamento()
+            resultados.append(_processar_com_tempo(funcao, arquivo, pasta_cache))
+            avisar(indice, resultados[-1])
+    else:
+        executor_cls = ThreadPoolExecutor if modo == 'threads' else ProcessPoolExecutor
+        configuracao = configuracao_atual() if executor_cls is ProcessPoolExecutor else None
+        opcoes = {'mp_context': contexto_processos()} if executor_cls is ProcessPoolExecutor else {}
+        with executor_cls(max_workers=max_workers, **opcoes) as executor:
+            futuros = [executor.submit(_processar_com_tempo, funcao, arquivo, pasta_cache, configuracao)
+                       for funcao, arquivo in zip(funcoes, arquivos)]
+            for indice, futuro in enumerate(futuros):
+                futuro.add_done_callback(lambda f, indice=indice: ao_concluir(indice, f))
+            
+            # Espera em fatias curtas para atender a um pedido de cancelamento
+            pendentes = set(futuros)
+            while pendentes:
+                if cancelamento is not None and cancelamento.is_set():
+                    for futuro in pendentes:
+                        futuro.cancel()
+                    verificar_cancelamento()
+                _, pendentes = wait(pendentes, timeout=None if cancelamento is None else 0.2,
+                                    return_when=FIRST_COMPLETED)
+            
+            # Resultados na ordem de entrada
+            resultados = [futuro.result() for futuro in futuros]
     
-    if df_nomes.empty or df_respostas.empty:
-        print("❌ Erro ao processar arquivos")
-        return
+    if pasta_cache:
+        limpar_cache(pasta_cache)
+    
+    return [
+        (_nome_entrada(arquivo), tipo, df, segundos, _tamanho_arquivo(arquivo))
+        for (_, arquivo, tipo), (df, segundos) in zip(tarefas, resultados)
+    ]
 
-    # Unificação dos dados
-    print("\n🔗 UNIFICANDO OS DADOS...")
-    df_unificado = pd.merge(
-        df_nomes, 
-        df_respostas, 
-        on='ID_Normalizado', 
-        how='outer',
-        suffixes=('_nomes', '_respostas')
-    )
+def processar_arquivos_paralelo(arquivos_nomes, arquivos_respostas, max_workers=None, modo='auto',
+                                pasta_cache=None, progresso=None, cancelamento=None):
+    """
+    Processa os arquivos de nomes e respostas em paralelo (ver executar_parsers).
+    Retorna (todos_nomes, todas_respostas, tempos), com tempos por arquivo.
+    """
+    todos_nomes = []
+    todas_respostas = []
+    tempos = []
+    for nome, tipo, df, segundos, tamanho in executar_parsers(arquivos_nomes, arquivos_respostas, max_workers, modo,
+                                                             pasta_cache, progresso, cancelamento):
+        tempos.append({'Arquivo': nome, 'Tipo': tipo, 'Registros': len(df), 'Segundos': round(segundos, 3),
+                       'Bytes': tamanho})
+        if df.empty:
+            continue
+        if tipo == 'nomes':
+            todos_nomes.append(df)
+        else:
+            todas_respostas.append(df)
     
-    # Limpar e organizar dados de série
-    df_unificado['Serie'] = df_unificado['Serie_nomes'].fillna(df_unificado['Serie_respostas'])
+    return todos_nomes, todas_respostas, tempos
+
+def compactar_tipos(df):
+    """
+    Converte Serie, Sala e Arquivo_Origem para Categorical (modo compacto).
+    Serie usa categorias fixas para que os dois lados do merge sejam compatíveis.
+    """
+    df = df.copy()
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna not in df.columns:
+            continue
+        if coluna == 'Serie':
+            df[coluna] = pd.Categorical(df[coluna], categories=CATEGORIAS_SERIE)
+        else:
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+def concatenar_dados(frames, compacto=False):
+    """
+    Consolida os DataFrames de vários arquivos.
+    No modo compacto as categorias são unificadas antes do concat para não voltar a object.
+    """
+    if not compacto:
+        return pd.concat(frames, ignore_index=True)
     
-    # Estatísticas
-    print("\n📊 GERANDO O RESUMO")
-    nomes_sem_resposta = df_unificado[df_unificado['ID_Resposta'].isnull()]['ID_Nome'].count()
-    respostas_sem_nome = df_unificado[df_unificado['ID_Nome'].isnull()]['ID_Resposta'].count()
-    total_unificados = df_unificado.dropna(subset=['ID_Nome', 'ID_Resposta']).shape[0]
+    frames = [compactar_tipos(df) for df in frames]
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna == 'Serie':
+            continue
+        presentes = [df for df in frames if coluna in df.columns]
+        if not presentes:
+            continue
+        categorias = set().union(*(df[coluna].cat.categories for df in presentes))
+        if coluna == 'Sala':
+            categorias.add('Sala_Não_Identificada')
+        categorias = sorted(categorias)
+        for df in presentes:
+            df[coluna] = df[coluna].cat.set_categories(categorias)
+    return pd.concat(frames, ignore_index=True)
 
-    print(f"✅ Registros unificados com sucesso: {total_unificados}")
-    print(f"❌ Nomes sem cartão de resposta: {nomes_sem_resposta}")
-    print(f"❌ Cartões de resposta sem nome: {respostas_sem_nome}")
+def unificar_dados(df_nomes, df_respostas):
+    """
+    Une nomes e respostas por ID_Normalizado em uma única passada.
+    Os IDs são convertidos em chaves int64 (factorize em ordem lexicográfica) e
+    o join é feito só sobre chave + posição das linhas; as colunas largas
+    (incluindo as respostas) são anexadas apenas no final.
+    Retorna (df_pareados, df_sem_cartao, df_sem_aluno), na ordem das chaves,
+    igual ao merge outer original.
+    """
+    chaves = pd.concat([df_nomes['ID_Normalizado'], df_respostas['ID_Normalizado']], ignore_index=True)
+    codigos, _ = pd.factorize(chaves.astype(str), sort=True)
+    codigos = codigos.astype(np.int64)
     
-    # Preparar o DataFrame final
-    print("\n🎯 PREPARANDO ARQUIVO FINAL...")
+    lado_nomes = pd.DataFrame({'_chave': codigos[:len(df_nomes)], '_linha_nome': np.arange(len(df_nomes))})
+    lado_respostas = pd.DataFrame({'_chave': codigos[len(df_nomes):], '_linha_resposta': np.arange(len(df_respostas))})
+    pares = lado_nomes.merge(lado_respostas, on='_chave', how='outer', sort=True)
+    
+    # Partição em uma passada: 0 = pareado, 1 = só nome, 2 = só cartão
+    linha_nome = pares['_linha_nome'].to_numpy()
+    linha_resposta = pares['_linha_resposta'].to_numpy()
+    particao = np.where(np.isnan(linha_resposta), 1, np.where(np.isnan(linha_nome), 2, 0))
     
-    # Colunas básicas
-    colunas_basicas = ['ID_Nome', 'Nome', 'Sala', 'Serie', 'Respostas_String']
+    pareados = particao == 0
+    df_sem_cartao = df_nomes.take(linha_nome[particao == 1].astype(np.int64)).reset_index(drop=True)
+    df_sem_aluno = df_respostas.take(linha_resposta[particao == 2].astype(np.int64)).reset_index(drop=True)
     
-    # Colunas das questões (agora com 3 dígitos: Q001, Q002, etc.)
-    colunas_questoes = [col for col in df_unificado.columns if col.startswith('Q')]
-    colunas_questoes.sort()  # Ordenar Q001, Q002, Q003, etc.
+    # Anexar as colunas largas apenas das linhas pareadas
+    comuns = (set(df_nomes.columns) & set(df_respostas.columns)) - {'ID_Normalizado'}
+    esquerda = df_nomes.take(linha_nome[pareados].astype(np.int64)).reset_index(drop=True)
+    direita = df_respostas.take(linha_resposta[pareados].astype(np.int64)).reset_index(drop=True)
+    esquerda = esquerda.rename(columns={c: f'{c}_nomes' for c in comuns})
+    direita = direita.drop(columns='ID_Normalizado').rename(columns={c: f'{c}_respostas' for c in comuns})
+    df_pareados = pd.concat([esquerda, direita], axis=1)
     
-    # Colunas finais
-    colunas_finais = colunas_basicas + colunas_questoes
+    # Limpar e organizar dados de série
+    df_pareados['Serie'] = df_pareados['Serie_nomes'].fillna(df_pareados['Serie_respostas'])
     
-    # Selecionar apenas registros que têm nome E resposta
-    df_final = df_unificado.dropna(subset=['ID_Nome', 'ID_Resposta'])[colunas_finais].copy()
+    return df_pareados, df_sem_cartao, df_sem_aluno
+
+def preparar_df_final(df_pareados):
+    """Seleciona e renomeia as colunas do arquivo final (alunos com nome E resposta)."""
+    # Colunas básicas (as questões Q001, Q002, ... são geradas só na exportação)
+    colunas_finais = ['ID_Nome', 'Nome', 'Sala', 'Serie', 'Respostas_String']
     
-    # Renomear colunas
-    df_final = df_final.rename(columns={
+    df_final = df_pareados[colunas_finais].rename(columns={
         'ID_Nome': 'ID',
         'Nome': 'Nome',
         'Sala': 'Sala',
@@ -313,113 +645,581 @@ def main():
     
     # Preencher valores vazios
     df_final['Sala'] = df_final['Sala'].fillna('Sala_Não_Identificada')
+    return df_final
+
+def dividir_por_serie(df_final):
+    """
+    Particiona df_final por série com um único groupby.
+    Retorna pares (nome_aba, DataFrame) na ordem de NOMES_ABAS_SERIES.
+    """
+    grupos = dict(tuple(df_final.groupby('Serie', observed=True, sort=False)))
+    return [(nome_aba, grupos[serie]) for serie, nome_aba in NOMES_ABAS_SERIES.items() if serie in grupos]
+
+def preparar_reconciliacao(df_sem_cartao, df_sem_aluno):
+    """Tabelas de conferência: alunos sem cartão e cartões sem aluno."""
+    df_alunos_sem_cartao = df_sem_cartao[['ID_Nome', 'Nome', 'Sala']].rename(columns={
+        'ID_Nome': 'ID',
+        'Nome': 'Nome',
+        'Sala': 'Sala'
+    })
+    df_cartoes_sem_aluno = df_sem_aluno[['ID_Resposta', 'Respostas_String']].rename(columns={
+        'ID_Resposta': 'ID_Cartao',
+        'Respostas_String': 'Respostas'
+    })
+    return df_alunos_sem_cartao, df_cartoes_sem_aluno
+
+def montar_abas_resultado(df_final, df_alunos_sem_cartao, df_cartoes_sem_aluno, total_nomes, total_respostas,
+                          df_correcao=None, tabelas_itens=None, df_sugestoes=None, df_duplicados=None):
+    """
+    Monta as abas do Excel de resultados, na ordem de gravação.
+    Com df_correcao (ver correcao.corrigir_respostas) inclui a aba Correcao_Questoes,
+    com tabelas_itens (ver analise_itens.analisar_itens) as abas de análise de itens,
+    com df_sugestoes (ver recuperacao_pares.sugerir_pareamentos) a aba Sugestoes_Pareamento
+    e com df_duplicados (ver duplicados.deduplicar) a aba Duplicados.
+    total_nomes e total_respostas contam os registros já sem duplicados.
+    Retorna uma lista de pares (nome_aba, DataFrame).
+    """
+    colunas_questoes = [col for col in df_final.columns if col.startswith('Q')]
+    total_unificados = len(df_final)
+    
+    # Aba principal com dados unificados
+    abas = [('Dados_Completos', df_final)]
+    
+    # Aba com alunos SEM cartão de resposta
+    if not df_alunos_sem_cartao.empty:
+        abas.append(('Alunos_Sem_Cartao', df_alunos_sem_cartao))
+        mensagem(f"   - Alunos_Sem_Cartao: {len(df_alunos_sem_cartao)} alunos sem cartão")
+    
+    # Aba com cartões SEM aluno
+    if not df_cartoes_sem_aluno.empty:
+        abas.append(('Cartoes_Sem_Aluno', df_cartoes_sem_aluno))
+        mensagem(f"   - Cartoes_Sem_Aluno: {len(df_cartoes_sem_aluno)} cartões sem aluno")
+    
+    # Pares prováveis entre as duas listas acima (código com dígito trocado)
+    if df_sugestoes is not None and not df_sugestoes.empty:
+        abas.append(('Sugestoes_Pareamento', df_sugestoes))
+        mensagem(f"   - Sugestoes_Pareamento: {len(df_sugestoes)} sugestões para conferir")
+    
+    # Ocorrências dos códigos repetidos e o que foi feito com cada uma
+    if df_duplicados is not None and not df_duplicados.empty:
+        abas.append(('Duplicados', df_duplicados))
+        mensagem(f"   - Duplicados: {df_duplicados['ID_Normalizado'].nunique()} códigos repetidos")
+    
+    # Aba de estatísticas
+    stats_data = {
+        'Métrica': [
+            'Total de Alunos com Nome',
+            'Total de Cartões de Resposta', 
+            'Alunos com Nome E Resposta',
+            'Nomes sem Cartão',
+            'Cartões sem Nome',
+            'Taxa de Correspondência (%)',
+            'Total de Questões'
+        ],
+        'Valor': [
+            total_nomes,
+            total_respostas,
+            total_unificados,
+            len(df_alunos_sem_cartao),
+            len(df_cartoes_sem_aluno),
+            round((total_unificados / max(total_nomes, total_respostas)) * 100, 1),
+            len(colunas_questoes)
+        ]
+    }
+    if df_duplicados is not None and not df_duplicados.empty:
+        stats_data['Métrica'].append('Registros Duplicados Fora da Unificação')
+        stats_data['Valor'].append(int((df_duplicados['Situacao'] != 'Mantido').sum()))
+    abas.append(('Estatisticas', pd.DataFrame(stats_data)))
+    
+    # Abas separadas por série (um único groupby)
+    for nome_aba, df_serie in dividir_por_serie(df_final):
+        abas.append((nome_aba, df_serie))
+        mensagem(f"   - {nome_aba}: {len(df_serie)} alunos")
+    
+    # Aba de resumo das salas
+    if not df_final.empty:
+        df_resumo_salas = df_final.groupby('Sala', observed=True).agg({
+            'ID': 'count'
+        }).rename(columns={'ID': 'Quantidade_Alunos'}).reset_index()
+        abas.append(('Resumo_Salas', df_resumo_salas))
+    
+    # Acerto por questão de cada aluno corrigido
+    if df_correcao is not None and not df_correcao.empty:
+        abas.append(('Correcao_Questoes', df_correcao))
+        mensagem(f"   - Correcao_Questoes: {len(df_correcao)} alunos corrigidos")
+    
+    # Estatísticas das questões por série e por sala
+    for nome_aba, df_itens in (tabelas_itens or {}).items():
+        abas.append((nome_aba, df_itens))
+        mensagem(f"   - {nome_aba}: {len(df_itens)} linhas (grupo x questão)")
+    
+    return abas
+
+# Função separar_por_salas removida conforme solicitação do usuário
+
+def main(compacto=False, workers=1, pasta_cache=None, motor_excel='openpyxl', formatos=(), gabaritos=None,
+         analise_itens=False, descoberta=None, pasta_saida='.', resumo=None, particionar=None, sugestoes=True,
+         politica_duplicados=POLITICA_PADRAO, historico=None, rodada=None):
+    """
+    Processa os arquivos encontrados (ver detectar_arquivos_automaticamente, que recebe
+    as opções de `descoberta`) e grava Resultados_<timestamp>.xlsx em pasta_saida.
+    particionar: 'Sala' ou 'Serie' grava também um ZIP com um .xlsx por sala/série,
+    gerados em paralelo com `workers` processos.
+    sugestoes: sugere pares entre alunos sem cartão e cartões sem aluno com códigos parecidos.
+    politica_duplicados: como resolver códigos repetidos antes da unificação (ver POLITICAS_DUPLICADOS).
+    historico: arquivo SQLite onde os resultados são acrescentados como a rodada `rodada`
+    (padrão: um nome único; uma rodada nomeada que já existe é substituída); ver historico.py
+    para as consultas entre rodadas.
+    resumo: dict opcional preenchido com as contagens, o arquivo gerado e os spans das etapas.
+    Retorna (nome_arquivo_excel, df_final), ou None se não houver o que processar.
+    """
+    if resumo is None:
+        resumo = {}
+    mensagem("🚀 FORMATADOR UNIFICADO - DETECÇÃO AUTOMÁTICA E ANÁLISES AVANÇADAS")
+    mensagem("=" * 80)
+    spans = []
+    resumo['spans'] = spans
+    
+    # Detectar arquivos automaticamente
+    with etapa('deteccao', spans) as span:
+        arquivos_nomes, arquivos_respostas = detectar_arquivos_automaticamente(**(descoberta or {}))
+        span['linhas_saida'] = len(arquivos_nomes) + len(arquivos_respostas)
+    resumo.update(arquivos_nomes=len(arquivos_nomes), arquivos_respostas=len(arquivos_respostas))
+    
+    if not arquivos_nomes or not arquivos_respostas:
+        mensagem("❌ Nenhum arquivo encontrado. Verifique se existem arquivos com 'nomes' e 'respostas' no nome.")
+        return
+    
+    # Processar todos os arquivos (em paralelo quando workers != 1)
+    with etapa('parsing', spans) as span:
+        todos_nomes, todas_respostas, tempos = processar_arquivos_paralelo(
+            arquivos_nomes, arquivos_respostas, max_workers=workers, pasta_cache=pasta_cache
+        )
+        span['bytes_lidos'] = sum(tempo['Bytes'] for tempo in tempos)
+        span['linhas_saida'] = sum(tempo['Registros'] for tempo in tempos)
+    
+    mensagem("\n⏱️ TEMPOS POR ARQUIVO:")
+    for tempo in tempos:
+        registrar_span({
+            'etapa': f"parsing:{tempo['Arquivo']}",
+            'linhas_entrada': None,
+            'linhas_saida': tempo['Registros'],
+            'bytes_lidos': tempo['Bytes'],
+            'duracao_s': tempo['Segundos'],
+            'pico_processo_mb': None
+        })
+    
+    if not todos_nomes or not todas_respostas:
+        mensagem("❌ Erro ao processar arquivos")
+        return
+    
+    # Consolidar todos os dados
+    mensagem("\n🔗 CONSOLIDANDO TODOS OS DADOS...")
+    with etapa('consolidacao', spans) as span:
+        df_nomes = concatenar_dados(todos_nomes, compacto)
+        df_respostas = concatenar_dados(todas_respostas, compacto)
+        span['linhas_saida'] = len(df_nomes) + len(df_respostas)
+    
+    if df_nomes.empty or df_respostas.empty:
+        mensagem("❌ Erro ao processar arquivos")
+        return
+    
+    # Códigos repetidos multiplicariam as linhas no join: no máximo uma linha por código de cada lado
+    with etapa('duplicados', spans, linhas_entrada=len(df_nomes) + len(df_respostas),
+               politica=politica_duplicados) as span:
+        df_nomes, df_respostas, df_duplicados = deduplicar(df_nomes, df_respostas, politica_duplicados)
+        span['linhas_saida'] = len(df_nomes) + len(df_respostas)
+    resumo['duplicados'] = df_duplicados['ID_Normalizado'].nunique()
+    if not df_duplicados.empty:
+        fora = int((df_duplicados['Situacao'] != 'Mantido').sum())
+        mensagem(f"⚠️ {resumo['duplicados']} códigos repetidos ({politica_duplicados}): "
+                 f"{fora} registros fora da unificação")
+
+    # Unificação dos dados
+    mensagem("\n🔗 UNIFICANDO OS DADOS...")
+    with etapa('merge', spans, linhas_entrada=len(df_nomes) + len(df_respostas)) as span:
+        df_pareados, df_sem_cartao, df_sem_aluno = unificar_dados(df_nomes, df_respostas)
+        span['linhas_saida'] = len(df_pareados)
+    
+    # Estatísticas
+    mensagem("\n📊 GERANDO O RESUMO")
+    nomes_sem_resposta = len(df_sem_cartao)
+    respostas_sem_nome = len(df_sem_aluno)
+    total_unificados = len(df_pareados)
+
+    mensagem(f"✅ Registros unificados com sucesso: {total_unificados}")
+    mensagem(f"❌ Nomes sem cartão de resposta: {nomes_sem_resposta}")
+    mensagem(f"❌ Cartões de resposta sem nome: {respostas_sem_nome}")
+    resumo.update(total_nomes=len(df_nomes), total_respostas=len(df_respostas), unificados=total_unificados,
+                  sem_cartao=nomes_sem_resposta, sem_aluno=respostas_sem_nome)
+    
+    # Preparar o DataFrame final
+    mensagem("\n🎯 PREPARANDO ARQUIVO FINAL...")
+    with etapa('preparacao', spans, linhas_entrada=len(df_pareados)) as span:
+        df_final = preparar_df_final(df_pareados)
+        
+        # Correção pelo gabarito de cada série (antes de abrir as questões em colunas)
+        df_correcao = None
+        if gabaritos:
+            df_final, df_correcao = corrigir_respostas(df_final, gabaritos)
+            mensagem(f"📝 {len(df_correcao)} alunos corrigidos | média: {df_final['Percentual'].mean():.1f}%")
+        
+        # Colunas das questões (3 dígitos: Q001, Q002, etc.) até o maior cartão real
+        df_final = expandir_questoes(df_final, compacto=compacto)
+        colunas_questoes = [col for col in df_final.columns if col.startswith('Q')]
+        span['linhas_saida'] = len(df_final)
+    
+    tabelas_itens = None
+    if analise_itens:
+        mensagem("\n📐 ANALISANDO AS QUESTÕES...")
+        with etapa('analise_itens', spans, linhas_entrada=len(df_final)) as span:
+            tabelas_itens = analisar_itens(df_final, gabaritos)
+            span['linhas_saida'] = sum(len(df) for df in tabelas_itens.values())
+    
+    with etapa('reconciliacao', spans, linhas_entrada=nomes_sem_resposta + respostas_sem_nome) as span:
+        df_alunos_sem_cartao, df_cartoes_sem_aluno = preparar_reconciliacao(df_sem_cartao, df_sem_aluno)
+        span['linhas_saida'] = len(df_alunos_sem_cartao) + len(df_cartoes_sem_aluno)
+    
+    df_sugestoes = None
+    if sugestoes and nomes_sem_resposta and respostas_sem_nome:
+        mensagem("\n🔎 PROCURANDO PARES PROVÁVEIS ENTRE AS SOBRAS...")
+        with etapa('sugestoes', spans, linhas_entrada=nomes_sem_resposta + respostas_sem_nome) as span:
+            df_sugestoes = sugerir_pareamentos(df_sem_cartao, df_sem_aluno)
+            span['linhas_saida'] = len(df_sugestoes)
+        mensagem(f"💡 {len(df_sugestoes)} sugestões | {int(df_sugestoes['Par_Mutuo'].sum())} pares mútuos")
+    resumo['sugestoes'] = 0 if df_sugestoes is None else len(df_sugestoes)
     
     # Gerar timestamp para nomenclatura dos arquivos
     timestamp = datetime.now().strftime("%d-%m-%Y_%H-%M")
-    nome_arquivo_excel = f"Resultados_{timestamp}.xlsx"
+    nome_arquivo_excel = os.path.normpath(os.path.join(pasta_saida, f"Resultados_{timestamp}.xlsx"))
+    os.makedirs(pasta_saida, exist_ok=True)
+    resumo['arquivo_excel'] = nome_arquivo_excel
     
     # Salvar resultados
-    print(f"\n💾 SALVANDO ARQUIVO EXCEL:")
+    mensagem(f"\n💾 SALVANDO ARQUIVO EXCEL:")
     
     # Excel com múltiplas abas
-    with pd.ExcelWriter(nome_arquivo_excel, engine='openpyxl') as writer:
-        # Aba principal com dados unificados
-        df_final.to_excel(writer, sheet_name='Dados_Completos', index=False)
-        
-        # Aba com alunos SEM cartão de resposta
-        df_sem_cartao = df_unificado[df_unificado['ID_Resposta'].isnull()][['ID_Nome', 'Nome', 'Sala']].copy()
-        if not df_sem_cartao.empty:
-            df_sem_cartao = df_sem_cartao.rename(columns={
-                'ID_Nome': 'ID',
-                'Nome': 'Nome',
-                'Sala': 'Sala'
-            })
-            df_sem_cartao.to_excel(writer, sheet_name='Alunos_Sem_Cartao', index=False)
-            print(f"   - Alunos_Sem_Cartao: {len(df_sem_cartao)} alunos sem cartão")
-        
-        # Aba com cartões SEM aluno
-        df_sem_aluno = df_unificado[df_unificado['ID_Nome'].isnull()][['ID_Resposta', 'Respostas_String']].copy()
-        if not df_sem_aluno.empty:
-            df_sem_aluno = df_sem_aluno.rename(columns={
-                'ID_Resposta': 'ID_Cartao',
-                'Respostas_String': 'Respostas'
-            })
-            df_sem_aluno.to_excel(writer, sheet_name='Cartoes_Sem_Aluno', index=False)
-            print(f"   - Cartoes_Sem_Aluno: {len(df_sem_aluno)} cartões sem aluno")
-        
-        # Aba de estatísticas
-        stats_data = {
-            'Métrica': [
-                'Total de Alunos com Nome',
-                'Total de Cartões de Resposta', 
-                'Alunos com Nome E Resposta',
-                'Nomes sem Cartão',
-                'Cartões sem Nome',
-                'Taxa de Correspondência (%)',
-                'Total de Questões'
-            ],
-            'Valor': [
-                len(df_nomes),
-                len(df_respostas),
-                total_unificados,
-                nomes_sem_resposta,
-                respostas_sem_nome,
-                round((total_unificados / max(len(df_nomes), len(df_respostas))) * 100, 1),
-                len(colunas_questoes)
-            ]
-        }
-        
-        df_stats = pd.DataFrame(stats_data)
-        df_stats.to_excel(writer, sheet_name='Estatisticas', index=False)
-        
-        # Abas separadas por série
-        series_disponiveis = df_final['Serie'].unique()
-        series_ordem = ['8º Ano', '9º Ano', '1ª Série', '2ª Série']
-        nomes_abas_series = {
-            '8º Ano': '8_Ano',
-            '9º Ano': '9_Ano', 
-            '1ª Série': '1_Serie',
-            '2ª Série': '2_Serie'
+    with etapa('exportacao_excel', spans, motor=motor_excel) as span:
+        abas = montar_abas_resultado(df_final, df_alunos_sem_cartao, df_cartoes_sem_aluno,
+                                     len(df_nomes), len(df_respostas), df_correcao, tabelas_itens, df_sugestoes,
+                                     df_duplicados)
+        escrever_planilhas(nome_arquivo_excel, abas, motor=motor_excel)
+        span['linhas_saida'] = sum(len(df) for _, df in abas)
+    
+    mensagem(f"✅ Excel salvo: '{nome_arquivo_excel}'")
+    mensagem(f"   📋 Abas criadas:")
+    mensagem(f"   - Dados_Completos: Todos os dados unificados")
+    if not df_sem_cartao.empty:
+        mensagem(f"   - Alunos_Sem_Cartao: Alunos que não têm cartão de resposta")
+    if not df_sem_aluno.empty:
+        mensagem(f"   - Cartoes_Sem_Aluno: Cartões que não têm aluno correspondente") 
+    if df_sugestoes is not None and not df_sugestoes.empty:
+        mensagem(f"   - Sugestoes_Pareamento: Pares prováveis entre alunos sem cartão e cartões sem aluno")
+    if not df_duplicados.empty:
+        mensagem(f"   - Duplicados: Ocorrências de códigos repetidos e qual foi mantida")
+    mensagem(f"   - Estatisticas: Resumo geral")
+    mensagem(f"   - Resumo_Salas: Quantidade de alunos por sala")
+    if df_correcao is not None:
+        mensagem(f"   - Correcao_Questoes: Acerto (1) ou erro (0) de cada questão por aluno")
+    if tabelas_itens:
+        mensagem(f"   - Itens_Serie / Itens_Sala: Dificuldade, discriminação e alternativas por questão")
+    
+    # Um arquivo por sala (ou série), empacotados em ZIP
+    if particionar:
+        nome_arquivo_zip = os.path.join(pasta_saida, f"Resultados_{timestamp}_por_{particionar.lower()}.zip")
+        mensagem(f"\n📦 SALVANDO UM ARQUIVO POR {particionar.upper()}:")
+        with etapa('exportacao_particionada', spans, motor=motor_excel, particao=particionar) as span:
+            nomes_particoes = exportar_particionado(
+                nome_arquivo_zip, df_final, particionar, motor_excel, max_workers=workers,
+                df_correcao=df_correcao, tabelas_itens=tabelas_itens, prefixo=f"Resultados_{timestamp}"
+            )
+            span['linhas_saida'] = len(df_final)
+        resumo['arquivo_zip'] = os.path.normpath(nome_arquivo_zip)
+        mensagem(f"✅ ZIP salvo: '{os.path.normpath(nome_arquivo_zip)}' ({len(nomes_particoes)} arquivos)")
+    
+    # Exportações colunares (sem openpyxl) para consumo em lote
+    if formatos:
+        mensagem(f"\n💾 SALVANDO EXPORTAÇÕES COLUNARES ({', '.join(formatos)}):")
+        tabelas = {
+            'Dados_Completos': df_final,
+            'Alunos_Sem_Cartao': df_alunos_sem_cartao,
+            'Cartoes_Sem_Aluno': df_cartoes_sem_aluno
         }
-        
-        for serie in series_ordem:
-            if serie in series_disponiveis:
-                df_serie = df_final[df_final['Serie'] == serie]
-                nome_aba = nomes_abas_series[serie]
-                df_serie.to_excel(writer, sheet_name=nome_aba, index=False)
-                print(f"   - {nome_aba}: {len(df_serie)} alunos")
-        
-        # Aba de resumo das salas
-        if not df_final.empty:
-            df_resumo_salas = df_final.groupby('Sala').agg({
-                'ID': 'count'
-            }).rename(columns={'ID': 'Quantidade_Alunos'}).reset_index()
-            df_resumo_salas.to_excel(writer, sheet_name='Resumo_Salas', index=False)
-    
-    print(f"✅ Excel salvo: '{nome_arquivo_excel}'")
-    print(f"   📋 Abas criadas:")
-    print(f"   - Dados_Completos: Todos os dados unificados")
-    if not df_unificado[df_unificado['ID_Resposta'].isnull()].empty:
-        print(f"   - Alunos_Sem_Cartao: Alunos que não têm cartão de resposta")
-    if not df_unificado[df_unificado['ID_Nome'].isnull()].empty:
-        print(f"   - Cartoes_Sem_Aluno: Cartões que não têm aluno correspondente") 
-    print(f"   - Estatisticas: Resumo geral")
-    print(f"   - Resumo_Salas: Quantidade de alunos por sala")
+        if df_correcao is not None:
+            tabelas['Correcao_Questoes'] = df_correcao
+        if df_sugestoes is not None and not df_sugestoes.empty:
+            tabelas['Sugestoes_Pareamento'] = df_sugestoes
+        if not df_duplicados.empty:
+            tabelas['Duplicados'] = df_duplicados
+        tabelas.update(tabelas_itens or {})
+        with etapa('exportacao_colunar', spans, formatos=list(formatos)) as span:
+            for caminho in exportar_colunar(tabelas, pasta_saida, f"Resultados_{timestamp}", formatos):
+                mensagem(f"   - {caminho}")
+            span['linhas_saida'] = sum(len(df) for df in tabelas.values()) * len(formatos)
+    
+    # Histórico entre rodadas (SQLite local)
+    if historico:
+        mensagem(f"\n🗂️ GRAVANDO NO HISTÓRICO:")
+        with etapa('historico', spans, linhas_entrada=len(df_final)) as span:
+            rodada, gravados = gravar_rodada(df_final, rodada, historico,
+                                             origem=os.path.abspath((descoberta or {}).get('raiz', '.')),
+                                             substituir=rodada is not None)
+            span['linhas_saida'] = gravados
+        resumo['rodada'] = rodada
+        mensagem(f"✅ Rodada '{rodada}' gravada em '{historico}' ({gravados} alunos)")
     
     # Preview
-    print(f"\n👁️ PREVIEW DOS DADOS FINAIS:")
-    print(f"Colunas: {list(df_final.columns)}")
-    print(f"\nPrimeiros registros:")
-    print(df_final.head())
-    
-    print(f"\n🎉 PROCESSAMENTO UNIFICADO CONCLUÍDO COM SUCESSO!")
-    print(f"📊 {total_unificados} alunos processados com nome e respostas")
-    print(f"📝 {len(colunas_questoes)} questões separadas em colunas individuais")
-    print(f"📚 Abas criadas por série: 8º Ano, 9º Ano, 1ª Série, 2ª Série")
-    print(f"📅 Arquivo Excel salvo com timestamp: {timestamp}")
-    print(f"🔍 {len(arquivos_nomes)} arquivos de nomes e {len(arquivos_respostas)} de respostas processados automaticamente")
+    mensagem(f"\n👁️ PREVIEW DOS DADOS FINAIS:")
+    mensagem(f"Colunas: {list(df_final.columns)}")
+    mensagem(f"\nPrimeiros registros:")
+    mensagem(df_final.head())
+    
+    mensagem(f"\n🎉 PROCESSAMENTO UNIFICADO CONCLUÍDO COM SUCESSO!")
+    mensagem(f"📊 {total_unificados} alunos processados com nome e respostas")
+    mensagem(f"📝 {len(colunas_questoes)} questões separadas em colunas individuais")
+    mensagem(f"📚 Abas criadas por série: 8º Ano, 9º Ano, 1ª Série, 2ª Série")
+    mensagem(f"📅 Arquivo Excel salvo com timestamp: {timestamp}")
+    mensagem(f"🔍 {len(arquivos_nomes)} arquivos de nomes e {len(arquivos_respostas)} de respostas processados automaticamente")
+    mensagem(f"⏱️ Tempo total das etapas: {sum(span['duracao_s'] for span in spans):.2f}s")
     
     return nome_arquivo_excel, df_final
 
+def _assinatura_arquivo(caminho):
+    """Identifica uma versão do arquivo pelo mtime e tamanho."""
+    info = os.stat(caminho)
+    return info.st_mtime_ns, info.st_size
+
+def _hash_tabela(df):
+    """Impressão digital do conteúdo de uma tabela (colunas + valores)."""
+    return (tuple(df.columns), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+def _gravar_atomico(caminho, gravar):
+    """Grava em um arquivo temporário e troca de uma vez, para quem estiver lendo a saída."""
+    pasta, nome = os.path.split(caminho)
+    temporario = os.path.join(pasta, f"~tmp_{nome}")  # mantém a extensão (o ExcelWriter exige)
+    gravar(temporario)
+    try:
+        os.replace(temporario, caminho)
+    except OSError:  # ex.: destino aberto no Excel (Windows)
+        os.remove(temporario)
+        raise
+
+def modo_observacao(intervalo=5.0, compacto=False, workers=1, motor_excel='openpyxl', formatos=(),
+                    prefixo='Resultados_incremental', max_ciclos=None, gabaritos=None, analise_itens=False,
+                    descoberta=None, sugestoes=True, politica_duplicados=POLITICA_PADRAO, historico=None,
+                    rodada=None):
+    """
+    Modo incremental: observa a pasta atual e reprocessa apenas os arquivos de
+    nomes e respostas novos ou alterados, mantendo os demais em memória.
+    O resultado unificado é refeito a partir dos arquivos já lidos e somente as
+    saídas cujo conteúdo mudou são regravadas (<prefixo>.xlsx e exportações colunares).
+    Com historico, cada atualização substitui a mesma rodada (padrão: um nome único por observação).
+    Um erro em um ciclo (arquivo apagado durante a leitura, saída aberta em outro programa)
+    é mostrado e o ciclo é refeito na verificação seguinte, sem encerrar a observação.
+    Limitação: só a leitura é incremental. Consolidação, duplicados, unificação, sugestões,
+    análise de itens e o Excel são refeitos sobre todos os alunos a cada mudança, porque
+    dependem do conjunto inteiro (um código novo pode criar um duplicado ou parear uma sobra).
+    Encerre com Ctrl+C.
+    """
+    mensagem("👀 MODO OBSERVAÇÃO - PROCESSAMENTO INCREMENTAL")
+    mensagem(f"   Verificando a pasta a cada {intervalo}s (Ctrl+C para encerrar)")
+    mensagem("=" * 80)
+    
+    arquivos_lidos = {}  # caminho -> (assinatura, tipo, DataFrame)
+    hashes_saidas = {}   # saída -> impressão digital do último conteúdo gravado
+    descoberta = dict(descoberta or {})
+    descoberta.setdefault('indice', {})  # pastas sem alteração não são listadas de novo a cada ciclo
+    rodada = rodada or nome_rodada_padrao()
+    pendente = False     # último ciclo falhou: refazer mesmo sem arquivos alterados
+    ciclo = 0
+    
+    try:
+        while max_ciclos is None or ciclo < max_ciclos:
+            if ciclo:
+                time.sleep(intervalo)
+            ciclo += 1
+            
+            try:
+                arquivos_nomes, arquivos_respostas = detectar_arquivos_automaticamente(verbose=False, **descoberta)
+                tipos = {arquivo: 'nomes' for arquivo in arquivos_nomes}
+                tipos.update({arquivo: 'respostas' for arquivo in arquivos_respostas})
+                assinaturas = {}
+                for arquivo in list(tipos):
+                    try:
+                        assinaturas[arquivo] = _assinatura_arquivo(arquivo)
+                    except FileNotFoundError:  # apagado depois da busca: tratado como removido
+                        del tipos[arquivo]
+                
+                removidos = [arquivo for arquivo in arquivos_lidos if arquivo not in tipos]
+                alterados = [arquivo for arquivo in tipos
+                             if arquivo not in arquivos_lidos or arquivos_lidos[arquivo][0] != assinaturas[arquivo]]
+                if not removidos and not alterados and not pendente:
+                    continue
+                pendente = False
+                
+                mensagem(f"\n🔄 {datetime.now().strftime('%H:%M:%S')} - "
+                         f"{len(alterados)} arquivo(s) novo(s)/alterado(s), {len(removidos)} removido(s)")
+                for arquivo in removidos:
+                    mensagem(f"   ➖ {arquivo}")
+                    del arquivos_lidos[arquivo]
+                
+                resultados = executar_parsers(
+                    [arquivo for arquivo in alterados if tipos[arquivo] == 'nomes'],
+                    [arquivo for arquivo in alterados if tipos[arquivo] == 'respostas'],
+                    max_workers=workers
+                )
+                for arquivo, tipo, df, _, _ in resultados:
+                    arquivos_lidos[arquivo] = (assinaturas[arquivo], tipo, df)
+                
+                todos_nomes = [df for _, tipo, df in arquivos_lidos.values() if tipo == 'nomes' and not df.empty]
+                todas_respostas = [df for _, tipo, df in arquivos_lidos.values()
+                                   if tipo == 'respostas' and not df.empty]
+                if not todos_nomes or not todas_respostas:
+                    mensagem("⏳ Aguardando arquivos de nomes e de respostas...")
+                    continue
+                
+                df_nomes = concatenar_dados(todos_nomes, compacto)
+                df_respostas = concatenar_dados(todas_respostas, compacto)
+                df_nomes, df_respostas, df_duplicados = deduplicar(df_nomes, df_respostas, politica_duplicados)
+                df_pareados, df_sem_cartao, df_sem_aluno = unificar_dados(df_nomes, df_respostas)
+                df_final = preparar_df_final(df_pareados)
+                df_correcao = None
+                if gabaritos:
+                    df_final, df_correcao = corrigir_respostas(df_final, gabaritos)
+                tabelas_itens = analisar_itens(df_final, gabaritos) if analise_itens else None
+                df_final = expandir_questoes(df_final, compacto=compacto)
+                df_alunos_sem_cartao, df_cartoes_sem_aluno = preparar_reconciliacao(df_sem_cartao, df_sem_aluno)
+                df_sugestoes = sugerir_pareamentos(df_sem_cartao, df_sem_aluno) if sugestoes else None
+                mensagem(f"✅ {len(df_final)} alunos unificados | {len(df_sem_cartao)} sem cartão | "
+                      f"{len(df_sem_aluno)} cartões sem aluno")
+                
+                # Excel: regravado apenas se alguma aba mudou
+                abas = montar_abas_resultado(df_final, df_alunos_sem_cartao, df_cartoes_sem_aluno,
+                                             len(df_nomes), len(df_respostas), df_correcao, tabelas_itens,
+                                             df_sugestoes, df_duplicados)
+                hash_excel = tuple((nome_aba, _hash_tabela(df)) for nome_aba, df in abas)
+                caminho_excel = f"{prefixo}.xlsx"
+                if hashes_saidas.get(caminho_excel) != hash_excel:
+                    _gravar_atomico(caminho_excel, lambda destino: escrever_planilhas(destino, abas, motor=motor_excel))
+                    mensagem(f"💾 Excel atualizado: '{caminho_excel}'")
+                    if historico:
+                        gravar_rodada(df_final, rodada, historico, origem=os.path.abspath(descoberta.get('raiz', '.')),
+                                      substituir=True)
+                        mensagem(f"🗂️ Rodada '{rodada}' atualizada no histórico")
+                    hashes_saidas[caminho_excel] = hash_excel
+                
+                # Exportações colunares: cada tabela só é regravada se mudou
+                tabelas = {
+                    'Dados_Completos': df_final,
+                    'Alunos_Sem_Cartao': df_alunos_sem_cartao,
+                    'Cartoes_Sem_Aluno': df_cartoes_sem_aluno
+                }
+                if df_correcao is not None:
+                    tabelas['Correcao_Questoes'] = df_correcao
+                if df_sugestoes is not None and not df_sugestoes.empty:
+                    tabelas['Sugestoes_Pareamento'] = df_sugestoes
+                if not df_duplicados.empty:
+                    tabelas['Duplicados'] = df_duplicados
+                tabelas.update(tabelas_itens or {})
+                exportadas = set()
+                for formato in formatos:
+                    for nome, df in tabelas.items():
+                        caminho = f"{prefixo}_{nome}.{formato}"
+                        exportadas.add(caminho)
+                        hash_tabela = _hash_tabela(df)
+                        if hashes_saidas.get(caminho) != hash_tabela:
+                            _gravar_atomico(caminho, lambda destino: exportar_tabela(df, destino, formato))
+                            hashes_saidas[caminho] = hash_tabela
+                            mensagem(f"💾 Atualizado: '{caminho}'")
+                
+                # Tabelas que deixaram de existir (ex.: Duplicados resolvidos): a exportação antiga é apagada
+                obsoletas = [caminho for caminho in hashes_saidas
+                             if caminho not in exportadas and caminho != caminho_excel]
+                for caminho in obsoletas:
+                    if os.path.exists(caminho):
+                        os.remove(caminho)
+                    del hashes_saidas[caminho]
+                    mensagem(f"🗑️ Removido (tabela vazia): '{caminho}'")
+            except Exception as e:
+                # Erro no ciclo (arquivo apagado no meio da leitura, saída aberta no Excel...):
+                # o estado anterior é mantido e o ciclo é refeito na próxima verificação
+                pendente = True
+                mensagem(f"⚠️ {datetime.now().strftime('%H:%M:%S')} - erro no ciclo: {e} "
+                         f"(nova tentativa em {intervalo}s)")
+    except KeyboardInterrupt:
+        mensagem("\n⏹️ Observação encerrada")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Formatador unificado de nomes e respostas")
+    parser.add_argument('--compacto', action='store_true',
+                        help="usa tipos categóricos para reduzir o uso de memória em lotes grandes")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="número de processos para ler os arquivos em paralelo (0 = todos os núcleos)")
+    parser.add_argument('--cache', nargs='?', const=PASTA_CACHE_PADRAO, default=None, metavar='PASTA',
+                        help=f"reaproveita arquivos já processados e sem alteração (padrão: {PASTA_CACHE_PADRAO})")
+    parser.add_argument('--motor-excel', choices=MOTORES_EXCEL, default='openpyxl',
+                        help="'streaming' grava o Excel linha a linha com memória constante")
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS_COLUNARES, default=[],
+                        help="exporta também os dados finais e as conferências em formatos colunares")
+    parser.add_argument('--observar', nargs='?', type=float, const=5.0, default=None, metavar='SEGUNDOS',
+                        help="modo incremental: observa a pasta e reprocessa só arquivos novos ou alterados")
+    parser.add_argument('--silencioso', action='store_true',
+                        help="não mostra mensagens de progresso no console")
+    parser.add_argument('--metricas', choices=SAIDAS_METRICAS, default='console',
+                        help="saída das métricas por etapa (duração, linhas, bytes, memória)")
+    parser.add_argument('--metricas-arquivo', default=None, metavar='ARQUIVO',
+                        help="arquivo JSON Lines para --metricas json (padrão: stderr)")
+    parser.add_argument('--metricas-memoria', action='store_true',
+                        help="mede também o pico de memória alocado em cada etapa (tracemalloc; mais lento)")
+    parser.add_argument('--gabaritos', default=None, metavar='ARQUIVO',
+                        help="JSON com o gabarito de cada série; adiciona acertos, nota e percentual")
+    parser.add_argument('--analise-itens', action='store_true',
+                        help="abas com a distribuição das alternativas por questão, série e sala "
+                             "(e dificuldade/discriminação com --gabaritos)")
+    parser.add_argument('--profundidade', type=int, default=None, metavar='N',
+                        help="profundidade máxima de subpastas na busca de arquivos (0 = só a pasta atual)")
+    parser.add_argument('--ignorar', nargs='+', default=[], metavar='PADRAO',
+                        help="padrões (ex.: 'backup*') de pastas e arquivos a ignorar na busca, além dos padrões")
+    parser.add_argument('--indice', nargs='?', const=ARQUIVO_INDICE_PADRAO, default=None, metavar='ARQUIVO',
+                        help=f"guarda o índice das pastas entre execuções (padrão: {ARQUIVO_INDICE_PADRAO})")
+    parser.add_argument('--sem-sugestoes', action='store_true',
+                        help="não procura pares prováveis (código com dígito trocado) entre as sobras")
+    parser.add_argument('--duplicados', choices=list(POLITICAS_DUPLICADOS), default=POLITICA_PADRAO,
+                        help="códigos repetidos em nomes ou cartões: " +
+                             "; ".join(f"'{nome}' {descricao}" for nome, descricao in POLITICAS_DUPLICADOS.items()))
+    parser.add_argument('--historico', nargs='?', const=ARQUIVO_HISTORICO_PADRAO, default=None, metavar='ARQUIVO',
+                        help=f"acrescenta os resultados ao histórico SQLite entre rodadas "
+                             f"(padrão: {ARQUIVO_HISTORICO_PADRAO}; consultas com historico.py)")
+    parser.add_argument('--rodada', default=None, metavar='NOME',
+                        help="nome da rodada no histórico (padrão: data e hora com um sufixo único); "
+                             "um nome já gravado é substituído")
+    parser.add_argument('--particionar', choices=list(PARTICOES), default=None,
+                        help="gera também um ZIP com um Excel por sala ou por série (em paralelo com --workers)")
+    args = parser.parse_args()
+    
+    descoberta = {
+        'profundidade_maxima': args.profundidade,
+        'podar': PODAR_PADRAO + tuple(args.ignorar),
+        'ignorar': IGNORAR_PADRAO + tuple(args.ignorar),
+        'arquivo_indice': args.indice
+    }
+    gabaritos = carregar_gabaritos(args.gabaritos) if args.gabaritos else None
+    if args.metricas == 'logging':
+        import logging
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    configurar(silencioso=args.silencioso, saida=args.metricas, arquivo_json=args.metricas_arquivo,
+               memoria_alocada=args.metricas_memoria)
+    
+    if args.observar is not None:
+        modo_observacao(intervalo=args.observar, compacto=args.compacto, workers=args.workers or None,
+                        motor_excel=args.motor_excel, formatos=args.formatos, gabaritos=gabaritos,
+                        analise_itens=args.analise_itens, descoberta=descoberta, sugestoes=not args.sem_sugestoes,
+                        politica_duplicados=args.duplicados, historico=args.historico, rodada=args.rodada)
+    else:
+        main(compacto=args.compacto, workers=args.workers or None, pasta_cache=args.cache,
+             motor_excel=args.motor_excel, formatos=args.formatos, gabaritos=gabaritos,
+             analise_itens=args.analise_itens, descoberta=descoberta, particionar=args.particionar,
+             sugestoes=not args.sem_sugestoes, politica_duplicados=args.duplicados, historico=args.historico,
+             rodada=args.rodada)
\ No newline at end of file
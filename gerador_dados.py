@@ -0,0 +1,90 @@
+# Gerador de dados sintéticos para testes de desempenho
+# Formatador de Dados Escolares - cria arquivos nomes*.txt e respostas*.txt realistas
+
+import os
+import random
+
+# Série -> (sufixo da sala, marcador usado no nome do arquivo)
+SERIES_SINTETICAS = {
+    '8º Ano': ('AM', '8°_ano'),
+    '9º Ano': ('CM', '9°_ano'),
+    '1ª Série': ('DM', '1ª_serie'),
+    '2ª Série': ('EM', '2ª_serie')
+}
+
+PRIMEIROS_NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Heitor',
+                   'Isabela', 'João', 'Larissa', 'Mateus', 'Natália', 'Otávio', 'Paula', 'Rafael',
+                   'Sofia', 'Thiago', 'Vitória', 'Yuri']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+              'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes']
+
+def gerar_dados(pasta, alunos_por_sala=35, salas_por_serie=4, series=('9º Ano', '1ª Série'),
+                questoes=45, taxa_sem_cartao=0.05, taxa_cartao_orfao=0.02, taxa_asterisco=0.03,
+                semente=42):
+    """
+    Gera um par de arquivos (nomes, respostas) por série em pasta.
+    - Salas no formato '12CM - 9º Ano', seguidas de linhas 'código<TAB>nome'.
+    - Cartões no formato 'N<código com zeros e dígito verificador><respostas>'.
+    Parte dos alunos fica sem cartão e parte dos cartões fica sem aluno, nas taxas informadas.
+    Retorna (arquivos_nomes, arquivos_respostas).
+    """
+    rng = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+
+    total_alunos = alunos_por_sala * salas_por_serie * len(series)
+    codigos = rng.sample(range(1000000, 9999999), total_alunos + int(total_alunos * taxa_cartao_orfao) + 1)
+    proximo_codigo = iter(codigos)
+
+    arquivos_nomes = []
+    arquivos_respostas = []
+    for serie in series:
+        sufixo, marcador = SERIES_SINTETICAS[serie]
+        caminho_nomes = os.path.join(pasta, f"nomes_{marcador}.txt")
+        caminho_respostas = os.path.join(pasta, f"respostas_{marcador}.txt")
+
+        with open(caminho_nomes, 'w', encoding='utf-8') as f_nomes, \
+                open(caminho_respostas, 'w', encoding='utf-8') as f_respostas:
+            for numero_sala in range(1, salas_por_serie + 1):
+                f_nomes.write(f"{numero_sala}{sufixo} - {serie}\n")
+                f_nomes.write("Código Aluno\tNome do Aluno\n")
+
+                for _ in range(alunos_por_sala):
+                    codigo = str(next(proximo_codigo))
+                    nome = f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+                    f_nomes.write(f"{codigo[:-3]}.{codigo[-3:]}\t{nome}\n")
+
+                    if rng.random() >= taxa_sem_cartao:
+                        f_respostas.write(_linha_cartao(rng, codigo, questoes, taxa_asterisco))
+
+            # Cartões sem aluno correspondente
+            for _ in range(int(alunos_por_sala * salas_por_serie * taxa_cartao_orfao)):
+                f_respostas.write(_linha_cartao(rng, str(next(proximo_codigo)), questoes, taxa_asterisco))
+
+        arquivos_nomes.append(caminho_nomes)
+        arquivos_respostas.append(caminho_respostas)
+
+    return arquivos_nomes, arquivos_respostas
+
+def _linha_cartao(rng, codigo, questoes, taxa_asterisco):
+    """Linha do arquivo de respostas: N + código com zeros à esquerda + dígito verificador + respostas."""
+    respostas = ''.join(
+        '*' if rng.random() < taxa_asterisco else rng.choice('ABCDE')
+        for _ in range(questoes)
+    )
+    return f"N{codigo.zfill(10)}{rng.randint(0, 9)}{respostas}\n"
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera arquivos sintéticos de nomes e respostas")
+    parser.add_argument('pasta', help="pasta de destino")
+    parser.add_argument('--alunos-por-sala', type=int, default=35)
+    parser.add_argument('--salas-por-serie', type=int, default=4)
+    parser.add_argument('--series', nargs='+', choices=list(SERIES_SINTETICAS), default=['9º Ano', '1ª Série'])
+    parser.add_argument('--questoes', type=int, default=45)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    nomes, respostas = gerar_dados(args.pasta, args.alunos_por_sala, args.salas_por_serie, tuple(args.series),
+                                   args.questoes, semente=args.semente)
+    print(f"✅ {len(nomes)} arquivos de nomes e {len(respostas)} de respostas gerados em '{args.pasta}'")
@@ -0,0 +1,179 @@
+# Histórico de resultados entre rodadas de prova, em um arquivo SQLite local
+# Formatador de Dados Escolares - uma rodada por execução, consultas indexadas por aluno, sala e série
+
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from importacao_tardia import ModuloTardio
+
+pd = ModuloTardio('pandas')
+
+ARQUIVO_HISTORICO_PADRAO = 'historico_resultados.sqlite'
+
+# Colunas de df_final gravadas por aluno (Acertos, Nota e Percentual só existem com gabaritos)
+COLUNAS_HISTORICO = ['ID', 'Nome', 'Sala', 'Serie', 'Respostas', 'Questoes', 'Acertos', 'Nota', 'Percentual']
+
+# Uma linha por aluno e rodada; a chave primária (ID, ID_Rodada) atende o histórico do
+# aluno e os índices atendem as consultas por série/sala (cobrindo a média por rodada,
+# sem ler a tabela), só por sala e por rodada
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS rodadas (
+    ID_Rodada INTEGER PRIMARY KEY,
+    Rodada TEXT NOT NULL UNIQUE,
+    Gravada_Em TEXT NOT NULL,
+    Origem TEXT,
+    Alunos INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resultados (
+    ID TEXT NOT NULL,
+    ID_Rodada INTEGER NOT NULL REFERENCES rodadas (ID_Rodada),
+    Nome TEXT,
+    Sala TEXT,
+    Serie TEXT,
+    Respostas TEXT,
+    Questoes INTEGER,
+    Acertos INTEGER,
+    Nota REAL,
+    Percentual REAL,
+    PRIMARY KEY (ID, ID_Rodada)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_resultados_serie_sala ON resultados (Serie, Sala, ID_Rodada, Percentual);
+CREATE INDEX IF NOT EXISTS idx_resultados_sala ON resultados (Sala, ID_Rodada);
+CREATE INDEX IF NOT EXISTS idx_resultados_rodada ON resultados (ID_Rodada);
+"""
+
+@contextmanager
+def abrir_historico(caminho=ARQUIVO_HISTORICO_PADRAO):
+    """
+    Abre (e cria, se preciso) o arquivo do histórico. Tudo o que for feito no bloco
+    é uma única transação: confirmada no final ou desfeita em caso de erro.
+    """
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    conexao = sqlite3.connect(caminho, timeout=30)
+    try:
+        conexao.executescript(ESQUEMA)
+        with conexao:
+            yield conexao
+    finally:
+        conexao.close()
+
+def _registros(df_final):
+    """Linhas de df_final no formato da tabela resultados (NaN vira NULL)."""
+    df = pd.DataFrame({
+        'ID': df_final['ID'].astype(str),
+        'Nome': df_final['Nome'],
+        'Sala': df_final['Sala'].astype(object),
+        'Serie': df_final['Serie'].astype(object),
+        'Respostas': df_final['Gabarito_Completo'],
+        'Questoes': df_final['Gabarito_Completo'].str.len()
+    })
+    for coluna in ('Acertos', 'Nota', 'Percentual'):
+        df[coluna] = df_final[coluna] if coluna in df_final.columns else None
+    df = df.astype(object).where(df.notna(), None)
+    return df[COLUNAS_HISTORICO].itertuples(index=False, name=None)
+
+def nome_rodada_padrao():
+    """Nome único para uma rodada sem nome: data e hora com segundos + sufixo aleatório."""
+    return f"{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}_{uuid.uuid4().hex[:6]}"
+
+def gravar_rodada(df_final, rodada=None, caminho=ARQUIVO_HISTORICO_PADRAO, origem=None, substituir=False):
+    """
+    Acrescenta os resultados de df_final ao histórico como a rodada `rodada`
+    (padrão: um nome único, ver nome_rodada_padrao).
+    Uma rodada que já existe só é regravada com substituir=True (os resultados
+    dela são trocados, mantendo a sua posição na ordem das rodadas); sem isso,
+    levanta ValueError e o histórico não é alterado.
+    Retorna (rodada, alunos gravados).
+    """
+    rodada = rodada or nome_rodada_padrao()
+    with abrir_historico(caminho) as conexao:
+        existente = conexao.execute("SELECT 1 FROM rodadas WHERE Rodada = ?", (rodada,)).fetchone()
+        if existente and not substituir:
+            raise ValueError(f"A rodada '{rodada}' já existe no histórico {caminho} (use outro nome ou substitua)")
+        conexao.execute(
+            "INSERT INTO rodadas (Rodada, Gravada_Em, Origem, Alunos) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (Rodada) DO UPDATE SET Gravada_Em = excluded.Gravada_Em, Origem = excluded.Origem, "
+            "Alunos = excluded.Alunos",
+            (rodada, datetime.now().isoformat(timespec='seconds'), origem, len(df_final))
+        )
+        id_rodada = conexao.execute("SELECT ID_Rodada FROM rodadas WHERE Rodada = ?", (rodada,)).fetchone()[0]
+        conexao.execute("DELETE FROM resultados WHERE ID_Rodada = ?", (id_rodada,))
+        conexao.executemany(
+            f"INSERT INTO resultados (ID_Rodada, {', '.join(COLUNAS_HISTORICO)}) "
+            f"VALUES ({id_rodada}, {', '.join('?' * len(COLUNAS_HISTORICO))})",
+            _registros(df_final)
+        )
+    return rodada, len(df_final)
+
+def listar_rodadas(caminho=ARQUIVO_HISTORICO_PADRAO):
+    """Rodadas gravadas, na ordem em que foram gravadas pela primeira vez."""
+    with abrir_historico(caminho) as conexao:
+        return pd.read_sql_query(
+            "SELECT Rodada, Gravada_Em, Origem, Alunos FROM rodadas ORDER BY ID_Rodada", conexao
+        )
+
+def historico_aluno(id_aluno, caminho=ARQUIVO_HISTORICO_PADRAO):
+    """Resultados de um aluno em cada rodada (busca pela chave primária)."""
+    with abrir_historico(caminho) as conexao:
+        return pd.read_sql_query(
+            "SELECT r.Rodada, a.ID, a.Nome, a.Sala, a.Serie, a.Questoes, a.Acertos, a.Nota, a.Percentual "
+            "FROM resultados a JOIN rodadas r ON r.ID_Rodada = a.ID_Rodada "
+            "WHERE a.ID = ? ORDER BY a.ID_Rodada",
+            conexao, params=(str(id_aluno),)
+        )
+
+def evolucao_salas(serie=None, sala=None, caminho=ARQUIVO_HISTORICO_PADRAO):
+    """
+    Alunos, corrigidos e média do percentual de cada sala em cada rodada,
+    opcionalmente filtrados por série e/ou sala (consultas pelos índices).
+    """
+    filtros, parametros = [], []
+    if serie:
+        filtros.append("a.Serie = ?")
+        parametros.append(serie)
+    if sala:
+        filtros.append("a.Sala = ?")
+        parametros.append(sala)
+    onde = f"WHERE {' AND '.join(filtros)} " if filtros else ""
+    with abrir_historico(caminho) as conexao:
+        return pd.read_sql_query(
+            "SELECT a.Serie, a.Sala, r.Rodada, COUNT(*) AS Alunos, COUNT(a.Percentual) AS Corrigidos, "
+            "ROUND(AVG(a.Percentual), 1) AS Media_Percentual "
+            "FROM resultados a JOIN rodadas r ON r.ID_Rodada = a.ID_Rodada "
+            f"{onde}GROUP BY a.Serie, a.Sala, a.ID_Rodada ORDER BY a.Serie, a.Sala, a.ID_Rodada",
+            conexao, params=parametros
+        )
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consulta o histórico de resultados entre rodadas")
+    parser.add_argument('arquivo', nargs='?', default=ARQUIVO_HISTORICO_PADRAO,
+                        help=f"arquivo do histórico (padrão: {ARQUIVO_HISTORICO_PADRAO})")
+    consulta = parser.add_mutually_exclusive_group()
+    consulta.add_argument('--aluno', metavar='ID', help="resultados de um aluno em cada rodada")
+    consulta.add_argument('--salas', action='store_true', help="média de cada sala em cada rodada")
+    parser.add_argument('--serie', default=None, help="filtra --salas por série (ex.: '9º Ano')")
+    parser.add_argument('--sala', default=None, help="filtra --salas por sala (ex.: 1CM)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.arquivo):
+        parser.error(f"histórico não encontrado: {args.arquivo} (grave uma rodada com formatador.py --historico)")
+
+    if args.aluno:
+        df = historico_aluno(args.aluno, args.arquivo)
+        titulo = f"📈 ALUNO {args.aluno}"
+    elif args.salas:
+        df = evolucao_salas(args.serie, args.sala, args.arquivo)
+        titulo = "🏫 SALAS POR RODADA"
+    else:
+        df = listar_rodadas(args.arquivo)
+        titulo = "🗂️ RODADAS GRAVADAS"
+
+    print(f"\n{titulo} ({len(df)} linhas)")
+    print(df.to_string(index=False) if not df.empty else "   Nenhum resultado")
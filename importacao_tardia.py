@@ -0,0 +1,24 @@
+# Importação tardia das dependências pesadas
+# Formatador de Dados Escolares - pandas e numpy só são carregados quando realmente usados
+
+import importlib
+
+class ModuloTardio:
+    """
+    Ocupa o lugar de um módulo e só o importa no primeiro acesso a um atributo.
+    Ex.: pd = ModuloTardio('pandas'); o pandas é carregado no primeiro pd.DataFrame(...).
+    Assim, --help, a detecção de arquivos e a abertura do dashboard não pagam o custo do import.
+    """
+
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+
+    def __getattr__(self, atributo):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome)
+        return getattr(self._modulo, atributo)
+
+    def __repr__(self):
+        estado = 'carregado' if self._modulo is not None else 'não carregado'
+        return f"<módulo tardio '{self._nome}' ({estado})>"
@@ -0,0 +1,114 @@
+# Instrumentação estruturada das etapas do pipeline
+# Formatador de Dados Escolares - spans com duração, linhas, bytes e memória
+
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAIDAS_METRICAS = ('console', 'json', 'logging')
+
+logger = logging.getLogger('formatador')
+
+_configuracao = {
+    'silencioso': False,
+    'saida': 'console',
+    'arquivo_json': None,
+    'memoria_alocada': False
+}
+
+def configurar(silencioso=False, saida='console', arquivo_json=None, memoria_alocada=False):
+    """
+    Define como mensagens e métricas são emitidas.
+    silencioso: suprime as mensagens de progresso no console.
+    saida: 'console' (linha legível), 'json' (uma linha JSON por etapa, em
+    arquivo_json ou stderr) ou 'logging' (logger 'formatador', nível INFO).
+    memoria_alocada: liga o tracemalloc para medir o pico alocado dentro de cada
+    etapa (pico_alocado_mb); deixa o processamento mais lento.
+    """
+    if saida not in SAIDAS_METRICAS:
+        raise ValueError(f"Saída de métricas inválida: {saida} (use {', '.join(SAIDAS_METRICAS)})")
+    _configuracao.update(silencioso=silencioso, saida=saida, arquivo_json=arquivo_json,
+                         memoria_alocada=memoria_alocada)
+    if memoria_alocada and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def configuracao_atual():
+    """Cópia da configuração, para repassar a processos workers."""
+    return dict(_configuracao)
+
+def mensagem(*args, **kwargs):
+    """print() que respeita o modo silencioso."""
+    if not _configuracao['silencioso']:
+        print(*args, **kwargs)
+
+def _pico_memoria_processo_mb():
+    """Pico de memória residente do processo até agora (None se indisponível)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def registrar_span(span):
+    """Emite um span já medido na saída configurada."""
+    saida = _configuracao['saida']
+    if saida == 'json':
+        linha = json.dumps(span, ensure_ascii=False, default=str)
+        if _configuracao['arquivo_json']:
+            with open(_configuracao['arquivo_json'], 'a', encoding='utf-8') as f:
+                f.write(linha + '\n')
+        else:
+            print(linha, file=sys.stderr)
+    elif saida == 'logging':
+        logger.info(json.dumps(span, ensure_ascii=False, default=str))
+    elif not _configuracao['silencioso']:
+        detalhes = [f"{span['duracao_s']:.3f}s"]
+        if span.get('linhas_entrada') is not None:
+            detalhes.append(f"{span['linhas_entrada']} linhas in")
+        if span.get('linhas_saida') is not None:
+            detalhes.append(f"{span['linhas_saida']} linhas out")
+        if span.get('bytes_lidos') is not None:
+            detalhes.append(f"{span['bytes_lidos'] / (1024 * 1024):.1f} MB lidos")
+        if span.get('pico_alocado_mb') is not None:
+            detalhes.append(f"{span['pico_alocado_mb']} MB alocados")
+        if span.get('pico_processo_mb') is not None:
+            detalhes.append(f"pico do processo {span['pico_processo_mb']} MB (+{span['aumento_pico_mb']} MB)")
+        print(f"⏱️ [{span['etapa']}] " + ' | '.join(detalhes))
+
+@contextmanager
+def etapa(nome, spans=None, **campos):
+    """
+    Mede uma etapa do pipeline. O span (dict) é entregue ao bloco para que ele
+    preencha linhas_entrada, linhas_saida, bytes_lidos etc.; no fim recebe a
+    duração e a memória, é emitido e, se informado, anexado a `spans`.
+    pico_processo_mb é o pico residente do processo desde o início (não só da etapa);
+    aumento_pico_mb é quanto a etapa o elevou (0 se ficou abaixo de um pico anterior).
+    Com tracemalloc ativo (configurar(memoria_alocada=True)), pico_alocado_mb é o pico
+    alocado dentro da etapa.
+    """
+    span = {'etapa': nome, 'linhas_entrada': None, 'linhas_saida': None, 'bytes_lidos': None}
+    span.update(campos)
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    pico_inicio = _pico_memoria_processo_mb()
+    inicio = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span['duracao_s'] = round(time.perf_counter() - inicio, 4)
+        span['pico_processo_mb'] = _pico_memoria_processo_mb()
+        span['aumento_pico_mb'] = (round(span['pico_processo_mb'] - pico_inicio, 1)
+                                   if pico_inicio is not None else None)
+        if tracemalloc.is_tracing():
+            span['pico_alocado_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+        registrar_span(span)
+        if spans is not None:
+            spans.append(span)
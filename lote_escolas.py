@@ -0,0 +1,292 @@
+# Processamento em lote de várias escolas em uma única execução
+# Formatador de Dados Escolares - uma pasta por escola, processadas em paralelo, com resumo consolidado
+
+import csv
+import fnmatch
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache_arquivos import PASTA_CACHE_PADRAO
+from correcao import carregar_gabaritos
+from descoberta_arquivos import ARQUIVO_INDICE_PADRAO, IGNORAR_PADRAO, PODAR_PADRAO
+from duplicados import POLITICA_PADRAO, POLITICAS_DUPLICADOS
+from escrita_excel import MOTORES_EXCEL
+from exportacao_colunar import FORMATOS_COLUNARES
+from exportacao_particionada import PARTICOES
+from formatador import main
+from instrumentacao import configuracao_atual, configurar, mensagem
+from processos import contexto_processos
+
+# Colunas do resumo consolidado (resumo_lote.csv)
+COLUNAS_RESUMO = ['Escola', 'Raiz', 'Destino', 'Status', 'Arquivos_Nomes', 'Arquivos_Respostas', 'Nomes',
+                  'Cartoes', 'Unificados', 'Sem_Cartao', 'Sem_Aluno', 'Sugestoes', 'Duplicados',
+                  'Taxa_Correspondencia', 'Segundos', 'Arquivo_Excel', 'Erro']
+
+def ler_manifesto(caminho):
+    """
+    Lê a lista de escolas de um manifesto:
+    - .json: lista de objetos {"raiz": ..., "destino": ..., "nome": ...} (destino e nome opcionais);
+    - .csv: colunas raiz e, opcionalmente, destino e nome;
+    - outros: uma pasta por linha (linhas vazias e iniciadas por # são ignoradas).
+    Caminhos relativos são resolvidos a partir da pasta do manifesto.
+    Retorna uma lista de dicts com raiz, destino (ou None) e nome (ou None).
+    """
+    base = os.path.dirname(os.path.abspath(caminho))
+    if caminho.endswith('.json'):
+        with open(caminho, encoding='utf-8') as f:
+            entradas = json.load(f)
+    elif caminho.endswith('.csv'):
+        with open(caminho, encoding='utf-8', newline='') as f:
+            entradas = list(csv.DictReader(f))
+    else:
+        with open(caminho, encoding='utf-8') as f:
+            entradas = [{'raiz': linha.strip()} for linha in f if linha.strip() and not linha.lstrip().startswith('#')]
+
+    escolas = []
+    for entrada in entradas:
+        if not entrada.get('raiz'):
+            raise ValueError(f"Entrada do manifesto sem 'raiz': {entrada}")
+        destino = entrada.get('destino') or None
+        escolas.append({
+            'raiz': os.path.join(base, entrada['raiz']),
+            'destino': os.path.join(base, destino) if destino else None,
+            'nome': entrada.get('nome') or None
+        })
+    return escolas
+
+def listar_subpastas(pasta, pasta_saida=None, podar=PODAR_PADRAO):
+    """
+    Uma escola por subpasta de pasta, em ordem alfabética. Ficam de fora a própria
+    pasta_saida (quando está dentro de pasta) e as pastas que casam com podar
+    (ocultas, Resultados_* etc.), para não processar de novo os resultados do lote.
+    """
+    saida = os.path.realpath(pasta_saida) if pasta_saida else None
+    with os.scandir(pasta) as it:
+        return [{'raiz': entrada.path} for entrada in sorted(it, key=lambda e: e.name)
+                if entrada.is_dir()
+                and not any(fnmatch.fnmatch(entrada.name, padrao) for padrao in podar)
+                and os.path.realpath(entrada.path) != saida]
+
+def montar_trabalhos(escolas, pasta_saida):
+    """
+    Define nome e pasta de destino de cada escola. Sem destino explícito, a saída vai
+    para pasta_saida/<nome da pasta da escola>, com sufixo se dois nomes coincidirem.
+    """
+    trabalhos = []
+    usados = set()
+    for escola in escolas:
+        nome = escola.get('nome') or os.path.basename(os.path.normpath(escola['raiz'])) or 'escola'
+        base_nome, contador = nome, 2
+        while nome in usados:
+            nome = f"{base_nome}_{contador}"
+            contador += 1
+        usados.add(nome)
+        trabalhos.append({
+            'nome': nome,
+            'raiz': escola['raiz'],
+            'destino': escola.get('destino') or os.path.join(pasta_saida, nome)
+        })
+    return trabalhos
+
+def processar_escola(trabalho, opcoes):
+    """
+    Processa uma escola em um worker: mesma rotina do formatador (main) sobre a pasta
+    da escola, sem mensagens no console. Nunca lança exceção; falhas vão para o resumo.
+    Retorna uma linha do resumo (dict com COLUNAS_RESUMO).
+    """
+    linha = dict.fromkeys(COLUNAS_RESUMO)
+    linha.update(Escola=trabalho['nome'], Raiz=trabalho['raiz'], Destino=trabalho['destino'], Segundos=0.0)
+    if not os.path.isdir(trabalho['raiz']):
+        linha.update(Status='erro', Erro=f"Pasta não encontrada: {trabalho['raiz']}")
+        return linha
+
+    descoberta = dict(opcoes.get('descoberta') or {}, raiz=trabalho['raiz'])
+    if descoberta.get('arquivo_indice'):
+        # Um índice por escola (o índice guarda só as pastas de uma raiz)
+        descoberta['arquivo_indice'] = os.path.join(trabalho['raiz'], descoberta['arquivo_indice'])
+
+    resumo = {}
+    configuracao = configuracao_atual()
+    configurar(silencioso=True)
+    inicio = time.perf_counter()
+    try:
+        resultado = main(compacto=opcoes.get('compacto', False), workers=1, pasta_cache=opcoes.get('pasta_cache'),
+                         motor_excel=opcoes.get('motor_excel', 'openpyxl'), formatos=opcoes.get('formatos', ()),
+                         gabaritos=opcoes.get('gabaritos'), analise_itens=opcoes.get('analise_itens', False),
+                         descoberta=descoberta, pasta_saida=trabalho['destino'], resumo=resumo,
+                         particionar=opcoes.get('particionar'), sugestoes=opcoes.get('sugestoes', True),
+                         politica_duplicados=opcoes.get('politica_duplicados', POLITICA_PADRAO))
+        linha['Status'] = 'ok' if resultado else 'sem dados'
+    except Exception as e:
+        linha['Status'] = 'erro'
+        linha['Erro'] = f"{type(e).__name__}: {e}"
+        if opcoes.get('detalhar_erros'):
+            linha['Erro'] += "\n" + traceback.format_exc()
+    finally:
+        configurar(**configuracao)
+    linha['Segundos'] = round(time.perf_counter() - inicio, 3)
+
+    linha.update(
+        Arquivos_Nomes=resumo.get('arquivos_nomes'),
+        Arquivos_Respostas=resumo.get('arquivos_respostas'),
+        Nomes=resumo.get('total_nomes'),
+        Cartoes=resumo.get('total_respostas'),
+        Unificados=resumo.get('unificados'),
+        Sem_Cartao=resumo.get('sem_cartao'),
+        Sem_Aluno=resumo.get('sem_aluno'),
+        Sugestoes=resumo.get('sugestoes'),
+        Duplicados=resumo.get('duplicados'),
+        Arquivo_Excel=resumo.get('arquivo_excel')
+    )
+    if resumo.get('unificados') is not None and max(resumo['total_nomes'], resumo['total_respostas']):
+        linha['Taxa_Correspondencia'] = round(
+            resumo['unificados'] / max(resumo['total_nomes'], resumo['total_respostas']) * 100, 1
+        )
+    return linha
+
+def processar_lote(trabalhos, opcoes, max_workers=None):
+    """
+    Processa as escolas em paralelo, uma por processo (None = todos os núcleos).
+    Cada escola é lida com um único worker para não disputar núcleos com as demais.
+    Retorna as linhas do resumo na ordem dos trabalhos.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(trabalhos)))
+
+    linhas = [None] * len(trabalhos)
+    if max_workers == 1:
+        for i, trabalho in enumerate(trabalhos):
+            linhas[i] = processar_escola(trabalho, opcoes)
+            _anunciar(linhas[i], i + 1, len(trabalhos))
+        return linhas
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto_processos()) as executor:
+        futuros = {executor.submit(processar_escola, trabalho, opcoes): i for i, trabalho in enumerate(trabalhos)}
+        for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+            i = futuros[futuro]
+            try:
+                linhas[i] = futuro.result()
+            except Exception as e:  # worker encerrado de forma anormal
+                linhas[i] = dict.fromkeys(COLUNAS_RESUMO)
+                linhas[i].update(Escola=trabalhos[i]['nome'], Raiz=trabalhos[i]['raiz'],
+                                 Destino=trabalhos[i]['destino'], Status='erro', Erro=f"{type(e).__name__}: {e}")
+            _anunciar(linhas[i], concluidos, len(trabalhos))
+    return linhas
+
+def _anunciar(linha, concluidos, total):
+    """Uma linha de progresso por escola concluída."""
+    icone = {'ok': '✅', 'sem dados': '⚠️'}.get(linha['Status'], '❌')
+    detalhe = linha['Erro'].splitlines()[0] if linha['Erro'] else (
+        f"{linha['Unificados']} alunos, {linha['Taxa_Correspondencia']}% de correspondência"
+        if linha['Unificados'] is not None else "nenhum arquivo de nomes/respostas"
+    )
+    mensagem(f"{icone} [{concluidos}/{total}] {linha['Escola']} ({linha['Segundos']:.2f}s): {detalhe}")
+
+def gravar_resumo(linhas, pasta_saida):
+    """Grava resumo_lote.csv e resumo_lote.json em pasta_saida e retorna os caminhos."""
+    os.makedirs(pasta_saida, exist_ok=True)
+    caminho_csv = os.path.join(pasta_saida, 'resumo_lote.csv')
+    with open(caminho_csv, 'w', encoding='utf-8-sig', newline='') as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUNAS_RESUMO)
+        escritor.writeheader()
+        escritor.writerows(linhas)
+    caminho_json = os.path.join(pasta_saida, 'resumo_lote.json')
+    with open(caminho_json, 'w', encoding='utf-8') as f:
+        json.dump(linhas, f, indent=2, ensure_ascii=False)
+    return caminho_csv, caminho_json
+
+def imprimir_resumo(linhas, segundos_totais):
+    """Resumo consolidado: situação de cada escola, totais e tempos."""
+    ok = [linha for linha in linhas if linha['Status'] == 'ok']
+    print(f"\n📊 RESUMO DO LOTE: {len(linhas)} escolas em {segundos_totais:.1f}s")
+    print(f"   {'Escola':<30} {'Status':<10} {'Alunos':>8} {'Corresp.':>9} {'Tempo':>8}")
+    for linha in linhas:
+        alunos = linha['Unificados'] if linha['Unificados'] is not None else '-'
+        taxa = f"{linha['Taxa_Correspondencia']}%" if linha['Taxa_Correspondencia'] is not None else '-'
+        print(f"   {linha['Escola'][:30]:<30} {linha['Status']:<10} {alunos:>8} {taxa:>9} {linha['Segundos']:>7.2f}s")
+
+    if ok:
+        nomes = sum(linha['Nomes'] for linha in ok)
+        cartoes = sum(linha['Cartoes'] for linha in ok)
+        unificados = sum(linha['Unificados'] for linha in ok)
+        tempos = sorted(linha['Segundos'] for linha in ok)
+        print(f"\n   ✅ {len(ok)} escolas processadas | {unificados} alunos unificados")
+        print(f"   🔗 Correspondência geral: {unificados / max(nomes, cartoes) * 100:.1f}% "
+              f"({nomes - unificados} sem cartão, {cartoes - unificados} cartões sem aluno)")
+        print(f"   ⏱️ Por escola: mediana {tempos[len(tempos) // 2]:.2f}s | máximo {tempos[-1]:.2f}s | "
+              f"soma {sum(tempos):.1f}s")
+    falhas = [linha for linha in linhas if linha['Status'] != 'ok']
+    if falhas:
+        print(f"   ⚠️ {len(falhas)} escola(s) sem resultado: {', '.join(linha['Escola'] for linha in falhas)}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Processa várias escolas (uma pasta por escola) em paralelo")
+    parser.add_argument('raizes', nargs='*', metavar='PASTA', help="pastas das escolas")
+    parser.add_argument('--manifesto', default=None, metavar='ARQUIVO',
+                        help="lista de escolas (.txt com uma pasta por linha, .csv ou .json com raiz/destino/nome)")
+    parser.add_argument('--subpastas', default=None, metavar='PASTA',
+                        help="trata cada subpasta direta de PASTA como uma escola "
+                             "(exceto a pasta de --saida, Resultados_* e os padrões de --ignorar)")
+    parser.add_argument('--saida', default='resultados_lote', metavar='PASTA',
+                        help="pasta base das saídas (uma subpasta por escola) e do resumo")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="escolas processadas ao mesmo tempo (0 = todos os núcleos)")
+    parser.add_argument('--compacto', action='store_true')
+    parser.add_argument('--cache', nargs='?', const=PASTA_CACHE_PADRAO, default=None, metavar='PASTA')
+    parser.add_argument('--motor-excel', choices=MOTORES_EXCEL, default='openpyxl')
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS_COLUNARES, default=[])
+    parser.add_argument('--gabaritos', default=None, metavar='ARQUIVO')
+    parser.add_argument('--analise-itens', action='store_true')
+    parser.add_argument('--particionar', choices=list(PARTICOES), default=None)
+    parser.add_argument('--sem-sugestoes', action='store_true')
+    parser.add_argument('--duplicados', choices=list(POLITICAS_DUPLICADOS), default=POLITICA_PADRAO)
+    parser.add_argument('--profundidade', type=int, default=None, metavar='N')
+    parser.add_argument('--ignorar', nargs='+', default=[], metavar='PADRAO')
+    parser.add_argument('--indice', nargs='?', const=ARQUIVO_INDICE_PADRAO, default=None, metavar='ARQUIVO',
+                        help="índice de pastas gravado dentro de cada escola")
+    parser.add_argument('--detalhar-erros', action='store_true', help="inclui o traceback das falhas no resumo")
+    args = parser.parse_args()
+
+    escolas = [{'raiz': raiz} for raiz in args.raizes]
+    if args.manifesto:
+        escolas += ler_manifesto(args.manifesto)
+    if args.subpastas:
+        escolas += listar_subpastas(args.subpastas, args.saida, PODAR_PADRAO + tuple(args.ignorar))
+    if not escolas:
+        parser.error("informe as pastas das escolas, --manifesto ou --subpastas")
+
+    opcoes = {
+        'compacto': args.compacto,
+        'pasta_cache': args.cache,
+        'motor_excel': args.motor_excel,
+        'formatos': args.formatos,
+        'gabaritos': carregar_gabaritos(args.gabaritos) if args.gabaritos else None,
+        'analise_itens': args.analise_itens,
+        'particionar': args.particionar,
+        'sugestoes': not args.sem_sugestoes,
+        'politica_duplicados': args.duplicados,
+        'descoberta': {
+            'profundidade_maxima': args.profundidade,
+            'podar': PODAR_PADRAO + tuple(args.ignorar),
+            'ignorar': IGNORAR_PADRAO + tuple(args.ignorar),
+            'arquivo_indice': args.indice
+        },
+        'detalhar_erros': args.detalhar_erros
+    }
+
+    trabalhos = montar_trabalhos(escolas, args.saida)
+    print(f"🏫 PROCESSAMENTO EM LOTE: {len(trabalhos)} escolas")
+    inicio = time.perf_counter()
+    linhas = processar_lote(trabalhos, opcoes, args.workers or None)
+    imprimir_resumo(linhas, time.perf_counter() - inicio)
+    caminho_csv, _ = gravar_resumo(linhas, args.saida)
+    print(f"\n💾 Resumo salvo em '{caminho_csv}'")
+
+    sys.exit(0 if all(linha['Status'] == 'ok' for linha in linhas) else 1)
@@ -0,0 +1,72 @@
+# Matriz compacta de respostas (cartões x questões)
+# Formatador de Dados Escolares - base da exportação das questões, correção e análises
+
+from functools import lru_cache
+
+from importacao_tardia import ModuloTardio
+
+np = ModuloTardio('numpy')
+pd = ModuloTardio('pandas')
+
+@lru_cache(maxsize=None)
+def _tabelas():
+    """
+    Matriz compacta de respostas: cada alternativa vira um código uint8 (0 = questão em branco).
+    Retorna (ALTERNATIVAS, _TABELA_CODIGOS), montadas no primeiro uso para não importar o numpy antes.
+    """
+    alternativas = np.array(['', 'A', 'B', 'C', 'D', 'E', '*'], dtype=object)
+    tabela_codigos = np.zeros(256, dtype=np.uint8)
+    for codigo, alternativa in enumerate('ABCDE*', start=1):
+        tabela_codigos[ord(alternativa)] = codigo
+    return alternativas, tabela_codigos
+
+def __getattr__(nome):
+    # ALTERNATIVAS e _TABELA_CODIGOS continuam acessíveis como constantes do módulo
+    if nome == 'ALTERNATIVAS':
+        return _tabelas()[0]
+    if nome == '_TABELA_CODIGOS':
+        return _tabelas()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+def largura_respostas(respostas):
+    """Questões do maior cartão real: a largura padrão da matriz e das colunas Q001, Q002, ..."""
+    return max((len(r) for r in respostas if isinstance(r, str)), default=0)
+
+def montar_matriz_respostas(respostas, largura=None):
+    """
+    Converte as strings de respostas em uma matriz uint8 (cartões x questões) de uma só vez.
+    Códigos: 0 = em branco, 1-5 = A-E, 6 = asterisco (ver ALTERNATIVAS).
+    A largura padrão é a do maior cartão real (largura_respostas).
+    """
+    respostas = [r if isinstance(r, str) else '' for r in respostas]
+    if largura is None:
+        largura = largura_respostas(respostas)
+    if not respostas or largura == 0:
+        return np.zeros((len(respostas), largura), dtype=np.uint8)
+
+    # Concatena tudo em um único buffer de largura fixa (espaço = em branco)
+    bloco = ''.join(r[:largura].ljust(largura) for r in respostas).encode('ascii', errors='replace')
+    brutos = np.frombuffer(bloco, dtype=np.uint8).reshape(len(respostas), largura)
+    return _tabelas()[1][brutos]
+
+def nomes_colunas_questoes(largura):
+    """Nomes das colunas de questões: Q001, Q002, ..."""
+    return [f'Q{i:03d}' for i in range(1, largura + 1)]
+
+def expandir_questoes(df, coluna='Gabarito_Completo', largura=None, compacto=False):
+    """
+    Gera as colunas Q001, Q002, ... a partir da coluna com a string de respostas.
+    Usado apenas na exportação, PRESERVANDO ASTERISCOS nas posições exatas.
+    No modo compacto cada coluna é um Categorical sobre os próprios códigos da matriz.
+    """
+    matriz = montar_matriz_respostas(df[coluna], largura)
+    colunas = nomes_colunas_questoes(matriz.shape[1])
+    alternativas = _tabelas()[0]
+    if compacto:
+        df_questoes = pd.DataFrame({
+            nome: pd.Categorical.from_codes(matriz[:, i], categories=alternativas)
+            for i, nome in enumerate(colunas)
+        }, index=df.index)
+    else:
+        df_questoes = pd.DataFrame(alternativas[matriz], columns=colunas, index=df.index)
+    return pd.concat([df, df_questoes], axis=1)
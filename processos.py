@@ -0,0 +1,13 @@
+# Processos workers compartilhados pelos módulos que paralelizam com ProcessPoolExecutor
+# Formatador de Dados Escolares - workers iniciados sem fork, seguros dentro do servidor do dashboard
+
+import multiprocessing
+
+def contexto_processos():
+    """
+    Contexto de multiprocessing dos workers: forkserver onde existe (Linux, macOS), senão spawn.
+    Um fork copiaria as threads do servidor do dashboard (e as travas que elas seguram) para os workers.
+    """
+    return multiprocessing.get_context(
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    )
@@ -0,0 +1,208 @@
+# Sugestões de pareamento para alunos sem cartão e cartões sem aluno
+# Formatador de Dados Escolares - índice de vizinhança por deleções (códigos a até 2 edições de distância)
+
+from importacao_tardia import ModuloTardio
+
+pd = ModuloTardio('pandas')
+
+# Diferença máxima entre os códigos (dígito trocado, faltando, sobrando ou invertido)
+DISTANCIA_MAXIMA = 2
+
+# Sugestões mantidas por cartão, da melhor para a pior
+MAX_SUGESTOES_POR_CARTAO = 3
+
+COLUNAS_SUGESTOES = ['ID_Cartao', 'ID_Aluno', 'Nome', 'Sala', 'Serie_Aluno', 'Serie_Cartao', 'Distancia',
+                     'Codigo_Comparado', 'Mesma_Serie', 'Mesma_Sala', 'Ordem', 'Par_Mutuo']
+
+def _variantes_codigo(codigo, codigo_completo=None):
+    """
+    Formas do código comparadas: o ID normalizado, o mesmo sem zeros à esquerda e,
+    para cartões, o código completo (com o dígito verificador) sem zeros à esquerda.
+    Retorna dict variante -> rótulo de onde ela veio.
+    """
+    variantes = {}
+    if codigo_completo:
+        variantes[codigo_completo.lstrip('0')] = 'Codigo_Completo'
+    variantes[codigo.lstrip('0')] = 'ID_Normalizado'
+    variantes[codigo] = 'ID_Normalizado'
+    variantes.pop('', None)
+    return variantes
+
+def _delecoes(codigo, distancia_maxima=DISTANCIA_MAXIMA):
+    """Todas as formas do código com até distancia_maxima caracteres removidos (incluindo ele mesmo)."""
+    resultado = {codigo}
+    camada = {codigo}
+    for _ in range(distancia_maxima):
+        camada = {forma[:i] + forma[i + 1:] for forma in camada for i in range(len(forma))}
+        resultado |= camada
+    return resultado
+
+def distancia_edicao(a, b, limite=DISTANCIA_MAXIMA):
+    """
+    Distância de edição com transposição de vizinhos (optimal string alignment):
+    troca, inserção, remoção ou inversão de dois dígitos contam 1.
+    Os casos comuns (só trocas, uma inversão, só remoções) são resolvidos sem a
+    tabela de programação dinâmica. Retorna no máximo limite + 1.
+    """
+    if a == b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a
+    diferenca = len(b) - len(a)
+    if diferenca > limite:
+        return limite + 1
+    if diferenca == 0:
+        posicoes = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(posicoes) == 1:
+            return 1
+        if len(posicoes) == 2:
+            i, j = posicoes
+            return 1 if j == i + 1 and a[i] == b[j] and a[j] == b[i] else 2
+    else:
+        # a é subsequência de b: bastam as remoções
+        restante = iter(b)
+        if all(caractere in restante for caractere in a):
+            return diferenca
+
+    # Prefixo e sufixo comuns não mudam a distância
+    inicio = 0
+    while inicio < len(a) and a[inicio] == b[inicio]:
+        inicio += 1
+    fim = 0
+    while fim < len(a) - inicio and a[-1 - fim] == b[-1 - fim]:
+        fim += 1
+    a, b = a[inicio:len(a) - fim], b[inicio:len(b) - fim]
+
+    if not a:
+        return min(len(b), limite + 1)
+
+    # Versão paralela em bits da programação dinâmica (Hyyrö, 2003): as colunas da
+    # tabela viram máscaras de bits de a, uma iteração por caractere de b
+    posicoes = {}
+    for i, caractere in enumerate(a):
+        posicoes[caractere] = posicoes.get(caractere, 0) | (1 << i)
+    ultimo_bit = 1 << (len(a) - 1)
+    vp, vn, d0, pm_anterior = -1, 0, 0, 0
+    distancia = len(a)
+    for caractere in b:
+        pm = posicoes.get(caractere, 0)
+        transposicao = ((~d0 & pm) << 1) & pm_anterior
+        d0 = (((pm & vp) + vp) ^ vp) | pm | vn | transposicao
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & ultimo_bit:
+            distancia += 1
+        elif hn & ultimo_bit:
+            distancia -= 1
+        hp = (hp << 1) | 1
+        vp = (hn << 1) | ~(d0 | hp)
+        vn = hp & d0
+        pm_anterior = pm
+    return min(distancia, limite + 1)
+
+class IndiceDelecoes:
+    """
+    Índice de vizinhança por deleções: cada código é guardado sob todas as suas formas
+    com até distancia_maxima caracteres removidos. Dois códigos a até k edições
+    (inclusive inversões) têm alguma forma em comum, então a busca consulta apenas as
+    formas do código procurado, sem comparar todos os pares; os candidatos são
+    confirmados com distancia_edicao.
+    """
+
+    def __init__(self, distancia_maxima=DISTANCIA_MAXIMA):
+        self.distancia_maxima = distancia_maxima
+        self._formas = {}
+        self._codigos = {}
+
+    def adicionar(self, codigo, valor):
+        """Associa valor (ex.: linha do aluno) ao código."""
+        if codigo not in self._codigos:
+            self._codigos[codigo] = []
+            for forma in _delecoes(codigo, self.distancia_maxima):
+                self._formas.setdefault(forma, []).append(codigo)
+        self._codigos[codigo].append(valor)
+
+    def buscar(self, codigo):
+        """Gera (codigo_indexado, distancia, valor) para os códigos a até distancia_maxima."""
+        candidatos = set()
+        for forma in _delecoes(codigo, self.distancia_maxima):
+            candidatos.update(self._formas.get(forma, ()))
+        for candidato in candidatos:
+            distancia = distancia_edicao(codigo, candidato, self.distancia_maxima)
+            if distancia <= self.distancia_maxima:
+                for valor in self._codigos[candidato]:
+                    yield candidato, distancia, valor
+
+def _texto(valor):
+    return '' if pd.isna(valor) else str(valor)
+
+def sugerir_pareamentos(df_sem_cartao, df_sem_aluno, distancia_maxima=DISTANCIA_MAXIMA,
+                        max_sugestoes=MAX_SUGESTOES_POR_CARTAO):
+    """
+    Sugere, para cada cartão sem aluno, os alunos sem cartão com código parecido
+    (até distancia_maxima edições, comparando também o código completo do cartão,
+    para erros no tratamento do dígito verificador).
+    Ordem de preferência: menor distância, mesma série, mesma sala (quando os dois
+    lados têm sala) e código do aluno.
+    Par_Mutuo marca a sugestão que é a melhor tanto para o cartão quanto para o aluno.
+    Retorna um DataFrame com COLUNAS_SUGESTOES (vazio se não houver sugestões).
+    """
+    if df_sem_cartao.empty or df_sem_aluno.empty:
+        return pd.DataFrame(columns=COLUNAS_SUGESTOES)
+
+    indice = IndiceDelecoes(distancia_maxima)
+    # Colunas em listas: o laço abaixo acessa os alunos por posição
+    ids_alunos = [_texto(codigo) for codigo in df_sem_cartao['ID_Normalizado']]
+    alunos = {coluna: df_sem_cartao[coluna].tolist() for coluna in ('ID_Nome', 'Nome', 'Sala', 'Serie')}
+    series_alunos = [_texto(serie) for serie in alunos['Serie']]
+    salas_alunos = [_texto(sala) for sala in alunos['Sala']]
+    for linha, codigo in enumerate(ids_alunos):
+        for variante in _variantes_codigo(codigo):
+            indice.adicionar(variante, linha)
+
+    salas_cartoes = df_sem_aluno['Sala'] if 'Sala' in df_sem_aluno.columns else [None] * len(df_sem_aluno)
+    sugestoes = []
+    for cartao in zip(df_sem_aluno['ID_Resposta'], df_sem_aluno['ID_Normalizado'], df_sem_aluno['Serie'],
+                      salas_cartoes):
+        id_cartao, id_normalizado, serie_cartao, sala_cartao = cartao
+        # Melhor comparação de cada aluno candidato: (distancia, rótulo da variante)
+        melhores = {}
+        for variante, origem in _variantes_codigo(_texto(id_normalizado), _texto(id_cartao)).items():
+            for _, distancia, linha in indice.buscar(variante):
+                if linha not in melhores or distancia < melhores[linha][0]:
+                    melhores[linha] = (distancia, origem)
+
+        candidatos = []
+        for linha, (distancia, origem) in melhores.items():
+            mesma_serie = series_alunos[linha] == _texto(serie_cartao)
+            mesma_sala = None if _texto(sala_cartao) == '' else salas_alunos[linha] == _texto(sala_cartao)
+            candidatos.append(((distancia, not mesma_serie, mesma_sala is False, ids_alunos[linha]),
+                               linha, distancia, origem, mesma_serie, mesma_sala))
+        candidatos.sort(key=lambda candidato: candidato[0])
+
+        for ordem, (prioridade, linha, distancia, origem, mesma_serie, mesma_sala) in enumerate(
+                candidatos[:max_sugestoes], start=1):
+            sugestoes.append({
+                'ID_Cartao': id_cartao,
+                'ID_Aluno': alunos['ID_Nome'][linha],
+                'Nome': alunos['Nome'][linha],
+                'Sala': alunos['Sala'][linha],
+                'Serie_Aluno': alunos['Serie'][linha],
+                'Serie_Cartao': serie_cartao,
+                'Distancia': distancia,
+                'Codigo_Comparado': origem,
+                'Mesma_Serie': mesma_serie,
+                'Mesma_Sala': mesma_sala,
+                'Ordem': ordem,
+                '_prioridade': prioridade,
+                '_linha_aluno': linha
+            })
+
+    if not sugestoes:
+        return pd.DataFrame(columns=COLUNAS_SUGESTOES)
+
+    df_sugestoes = pd.DataFrame(sugestoes)
+    # Par mútuo: melhor sugestão do cartão e, entre todos os cartões, a melhor do aluno
+    melhor_do_aluno = df_sugestoes.sort_values('_prioridade', kind='stable').drop_duplicates('_linha_aluno').index
+    df_sugestoes['Par_Mutuo'] = (df_sugestoes['Ordem'] == 1) & df_sugestoes.index.isin(melhor_do_aluno)
+    return df_sugestoes[COLUNAS_SUGESTOES]
@@ -7,7 +7,9 @@ import os
 # Adiciona o diretório atual ao path para importar módulos locais
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# Importa e executa o dashboard principal
+# Importa o dashboard uma única vez (o Streamlit mantém o módulo entre reexecuções)
+# em vez de ler e executar o código-fonte de novo a cada interação
+from dashboard import main
+
 if __name__ == "__main__":
-    # Executa o dashboard principal
-    exec(open('dashboard.py').read())
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,165 @@
+# Execução de processamentos em segundo plano para o dashboard
+# Formatador de Dados Escolares - tarefas com progresso, cancelamento e resultado consultável sem bloquear
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from formatador import ProcessamentoCancelado
+
+# Tarefas executadas ao mesmo tempo no servidor (as demais aguardam na fila)
+MAX_TAREFAS_SIMULTANEAS = 4
+
+# Tarefas concluídas ficam disponíveis por este tempo (segundos) antes de serem descartadas
+TEMPO_RETENCAO = 2 * 60 * 60
+
+ESTADOS_FINAIS = ('concluida', 'cancelada', 'erro')
+
+class Tarefa:
+    """
+    Um processamento submetido ao gerenciador. A função da tarefa recebe a própria
+    tarefa para informar o andamento (avancar/registrar) e consultar o cancelamento.
+    Todos os campos são atualizados pela thread da tarefa e lidos pela interface via resumo().
+    """
+
+    def __init__(self, descricao, total_passos):
+        self.id = uuid.uuid4().hex
+        self.descricao = descricao
+        self.estado = 'na_fila'
+        self.total_passos = max(total_passos, 1)
+        self.passos_concluidos = 0
+        self.etapa = 'Aguardando na fila'
+        self.eventos = []
+        self.resultado = None
+        self.erro = None
+        self.criada_em = time.time()
+        self.iniciada_em = None
+        self.finalizada_em = None
+        self.cancelamento = threading.Event()
+        self._trava = threading.Lock()
+
+    def avancar(self, etapa=None, passos=1):
+        """Conta passos concluídos (ex.: um arquivo lido) e, opcionalmente, muda a etapa atual."""
+        with self._trava:
+            self.passos_concluidos = min(self.passos_concluidos + passos, self.total_passos)
+            if etapa:
+                self.etapa = etapa
+
+    def registrar(self, texto):
+        """Acrescenta uma linha ao histórico exibido na interface."""
+        with self._trava:
+            self.eventos.append(f"{time.strftime('%H:%M:%S')} {texto}")
+
+    def verificar_cancelamento(self):
+        """Interrompe a função da tarefa entre etapas, se o cancelamento foi pedido."""
+        if self.cancelamento.is_set():
+            raise ProcessamentoCancelado("Processamento cancelado")
+
+    def finalizar(self, estado, texto=None):
+        """
+        Passa a tarefa para um estado final. finalizada_em é preenchido antes do estado,
+        sob a trava: quem vê finalizada == True (de outra thread) já encontra o horário.
+        """
+        with self._trava:
+            self.finalizada_em = time.time()
+            if texto:
+                self.eventos.append(f"{time.strftime('%H:%M:%S')} {texto}")
+            self.estado = estado
+
+    def cancelar(self):
+        """Pede o cancelamento; tarefas na fila nem chegam a começar."""
+        self.cancelamento.set()
+
+    @property
+    def finalizada(self):
+        return self.estado in ESTADOS_FINAIS
+
+    def resumo(self):
+        """Cópia consistente do andamento, para exibição."""
+        with self._trava:
+            fim = self.finalizada_em or time.time()
+            return {
+                'id': self.id,
+                'descricao': self.descricao,
+                'estado': self.estado,
+                'progresso': self.passos_concluidos / self.total_passos,
+                'etapa': self.etapa,
+                'eventos': list(self.eventos),
+                'erro': self.erro,
+                'segundos': round(fim - self.iniciada_em, 1) if self.iniciada_em else 0.0,
+                'cancelamento_pedido': self.cancelamento.is_set()
+            }
+
+class GerenciadorTarefas:
+    """
+    Fila de tarefas compartilhada por todas as sessões do servidor. Cada tarefa roda
+    em uma thread do pool; o trabalho pesado (parsers) continua podendo usar processos.
+    """
+
+    def __init__(self, max_tarefas=MAX_TAREFAS_SIMULTANEAS):
+        self._executor = ThreadPoolExecutor(max_workers=max_tarefas, thread_name_prefix='tarefa')
+        self._tarefas = {}
+        self._trava = threading.Lock()
+
+    def submeter(self, funcao, *args, descricao='Processamento', total_passos=1, **kwargs):
+        """Coloca funcao(tarefa, *args, **kwargs) na fila e retorna a Tarefa imediatamente."""
+        self.descartar_antigas()
+        tarefa = Tarefa(descricao, total_passos)
+        with self._trava:
+            self._tarefas[tarefa.id] = tarefa
+        self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        if tarefa.cancelamento.is_set():
+            tarefa.finalizar('cancelada')
+            return
+        tarefa.iniciada_em = time.time()
+        tarefa.estado = 'executando'
+        try:
+            tarefa.resultado = funcao(tarefa, *args, **kwargs)
+            tarefa.passos_concluidos = tarefa.total_passos
+            tarefa.finalizar('concluida')
+        except ProcessamentoCancelado:
+            tarefa.finalizar('cancelada', "⏹️ Cancelado")
+        except Exception as e:
+            tarefa.erro = f"{e}\n{traceback.format_exc()}"
+            tarefa.finalizar('erro', f"❌ Erro: {e}")
+
+    def obter(self, tarefa_id):
+        """A tarefa com este id, ou None se não existe mais."""
+        with self._trava:
+            return self._tarefas.get(tarefa_id)
+
+    def ativas(self):
+        """Quantidade de tarefas na fila ou executando."""
+        with self._trava:
+            return sum(not tarefa.finalizada for tarefa in self._tarefas.values())
+
+    def descartar(self, tarefa_id):
+        """Libera o resultado de uma tarefa já finalizada."""
+        with self._trava:
+            tarefa = self._tarefas.get(tarefa_id)
+            if tarefa is not None and tarefa.finalizada:
+                del self._tarefas[tarefa_id]
+
+    def descartar_antigas(self, tempo_retencao=TEMPO_RETENCAO):
+        """Remove tarefas finalizadas há mais de tempo_retencao segundos (resultados esquecidos)."""
+        limite = time.time() - tempo_retencao
+        with self._trava:
+            for tarefa_id in [tarefa_id for tarefa_id, tarefa in self._tarefas.items()
+                              if tarefa.finalizada and tarefa.finalizada_em < limite]:
+                del self._tarefas[tarefa_id]
+
+_gerenciador = None
+_trava_gerenciador = threading.Lock()
+
+def gerenciador():
+    """Gerenciador único do processo (o Streamlit reexecuta o script, mas não reimporta este módulo)."""
+    global _gerenciador
+    with _trava_gerenciador:
+        if _gerenciador is None:
+            _gerenciador = GerenciadorTarefas()
+        return _gerenciador
@@ -0,0 +1,51 @@
+# Testes do gerenciador de tarefas em segundo plano
+# Formatador de Dados Escolares - estado final sempre acompanhado do horário de finalização
+
+import time
+
+import tarefas
+from formatador import ProcessamentoCancelado
+from tarefas import ESTADOS_FINAIS, GerenciadorTarefas, Tarefa
+
+class TarefaVigiada(Tarefa):
+    """Anota toda passagem para um estado final feita com finalizada_em ainda vazio."""
+    violacoes = []
+
+    def __setattr__(self, nome, valor):
+        if nome == 'estado' and valor in ESTADOS_FINAIS and getattr(self, 'finalizada_em', None) is None:
+            TarefaVigiada.violacoes.append(valor)
+        super().__setattr__(nome, valor)
+
+def _concluir(tarefa):
+    return 'ok'
+
+def _falhar(tarefa):
+    raise ValueError("falha de teste")
+
+def _cancelar(tarefa):
+    raise ProcessamentoCancelado("Processamento cancelado")
+
+def _esperar(tarefa):
+    time.sleep(0.05)
+
+def test_finalizada_em_preenchido_antes_do_estado_final(monkeypatch):
+    """Quem vê finalizada == True (de outra thread) já encontra finalizada_em."""
+    monkeypatch.setattr(tarefas, 'Tarefa', TarefaVigiada)
+    TarefaVigiada.violacoes.clear()
+    gerenciador = GerenciadorTarefas(max_tarefas=1)
+    ocupada = gerenciador.submeter(_esperar)
+    na_fila = gerenciador.submeter(_concluir)
+    na_fila.cancelar()
+    submetidas = [ocupada, na_fila] + [gerenciador.submeter(funcao) for funcao in (_concluir, _falhar, _cancelar)]
+
+    limite = time.time() + 30
+    while not all(tarefa.finalizada for tarefa in submetidas):
+        assert time.time() < limite, "tarefas não terminaram"
+        for tarefa in submetidas:
+            if tarefa.finalizada:
+                assert tarefa.finalizada_em is not None
+        gerenciador.descartar_antigas()
+        time.sleep(0.001)
+
+    assert [tarefa.estado for tarefa in submetidas] == ['concluida', 'cancelada', 'concluida', 'erro', 'cancelada']
+    assert TarefaVigiada.violacoes == []